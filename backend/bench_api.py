@@ -0,0 +1,255 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import contextlib
+from datetime import datetime, timezone
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# The payment scenario signs callbacks itself, so it needs known PayU credentials
+os.environ.setdefault("PAYU_KEY", "bench-key")
+os.environ.setdefault("PAYU_SALT", "bench-salt")
+# Every simulated user shares one client address, which the rate limiter would throttle
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+import httpx
+from testing_utils import payu_callback_form
+
+# One INFO line per request would drown the report
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Weighted mix of user journeys; each scenario issues one or more requests
+SCENARIO_WEIGHTS = {
+    "browse": 40,
+    "search": 20,
+    "detail": 25,
+    "checkout": 5,
+    "payment": 5,
+    "admin": 5,
+}
+SEARCH_TERMS = ["arduino", "sensor", "motor", "lcd", "relay", "battery", "esp32", "module", "led", "servo"]
+SORTS = [None, "price_asc", "price_desc", "name_asc"]
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile on an already sorted list
+    if not sorted_values:
+        return None
+    rank = max(1, min(len(sorted_values), round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+class Recorder:
+    """
+    Latencies and status codes per endpoint label (method + route template).
+    """
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, label, seconds, ok):
+        self.latencies.setdefault(label, []).append(seconds * 1000)
+        if not ok:
+            self.errors[label] = self.errors.get(label, 0) + 1
+
+    def summary(self, duration):
+        endpoints = {}
+        for label, values in sorted(self.latencies.items()):
+            values.sort()
+            endpoints[label] = {
+                "requests": len(values),
+                "errors": self.errors.get(label, 0),
+                "throughput_rps": round(len(values) / duration, 2),
+                "p50_ms": round(percentile(values, 50), 3),
+                "p95_ms": round(percentile(values, 95), 3),
+                "p99_ms": round(percentile(values, 99), 3),
+                "max_ms": round(values[-1], 3),
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        return {"total_requests": total, "throughput_rps": round(total / duration, 2), "endpoints": endpoints}
+
+class VirtualUser:
+    def __init__(self, client, recorder, rng, fixtures):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.fixtures = fixtures
+
+    async def request(self, label, method, url, expect=(200,), **kwargs):
+        start = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        self.recorder.add(label, time.perf_counter() - start, response.status_code in expect)
+        return response
+
+    def product_id(self):
+        return self.rng.choice(self.fixtures["product_ids"])
+
+    async def browse(self):
+        params = {"skip": self.rng.randrange(0, 200, 20), "limit": 20}
+        if self.rng.random() < 0.5:
+            params["category"] = self.rng.choice(self.fixtures["categories"])
+        sort_by = self.rng.choice(SORTS)
+        if sort_by:
+            params["sort_by"] = sort_by
+        await self.request("GET /products", "GET", "/products", params=params)
+
+    async def search(self):
+        await self.request("GET /products?search", "GET", "/products", params={"search": self.rng.choice(SEARCH_TERMS), "limit": 20})
+
+    async def detail(self):
+        product_id = self.product_id()
+        await self.request("GET /products/{id}", "GET", f"/products/{product_id}")
+        await self.request("GET /products/{id}/reviews", "GET", f"/products/{product_id}/reviews")
+
+    def cart(self):
+        return [{"product_id": self.product_id(), "quantity": 1} for _ in range(self.rng.randint(1, 3))]
+
+    async def checkout(self):
+        body = {"customer_email": f"bench{self.rng.randrange(10 ** 6)}@example.com", "total_amount": 100.0, "items": self.cart()}
+        await self.request("POST /orders", "POST", "/orders", expect=(201,), json=body)
+
+    async def payment(self):
+        # Checkout flow: price the cart once, then pay with the quote token
+        response = await self.request("POST /cart/quote", "POST", "/cart/quote", json={"items": self.cart()})
+        if response.status_code != 200 or not response.json()["quote_token"]:
+            return
+        email = f"bench{self.rng.randrange(10 ** 6)}@example.com"
+        body = {
+            "firstname": "Bench", "email": email, "productinfo": "Bench order",
+            "quote_token": response.json()["quote_token"], "phone": "9999999999", "address_line": "1 Bench Road",
+            "city": "Pune", "state": "Maharashtra", "pincode": "411001"
+        }
+        response = await self.request("POST /payment/initiate", "POST", "/payment/initiate", json=body)
+        if response.status_code != 200:
+            return
+        # Sign the callback exactly as PayU (or /payment/mock-process) would
+        form = payu_callback_form(response.json())
+        await self.request("POST /payment/callback", "POST", "/payment/callback", expect=(303,), data=form)
+
+    async def admin(self):
+        await self.request("GET /admin/stats", "GET", "/admin/stats")
+        granularity = self.rng.choice(["day", "week", "month"])
+        await self.request("GET /admin/stats/timeseries", "GET", "/admin/stats/timeseries", params={"granularity": granularity})
+
+    async def run(self, deadline, scenarios, weights):
+        while time.perf_counter() < deadline:
+            scenario = self.rng.choices(scenarios, weights)[0]
+            await getattr(self, scenario)()
+
+def load_fixtures():
+    # Ids and categories to request, read once so virtual users never hit 404s
+    from database import SessionLocal
+    from models import ProductDB
+
+    db = SessionLocal()
+    try:
+        product_ids = [row.id for row in db.query(ProductDB.id).filter(ProductDB.stock > 0).order_by(ProductDB.id).limit(5000)]
+        categories = [row.category for row in db.query(ProductDB.category).distinct().limit(50) if row.category]
+    finally:
+        db.close()
+    if not product_ids:
+        raise SystemExit("No products with stock in this database. Seed one first, e.g. generate_data.py.")
+    return {"product_ids": product_ids, "categories": categories or ["All"]}
+
+async def run_benchmark(users=20, duration=10.0, warmup=2.0, seed=1, scenarios=None, quiet=True):
+    """
+    Drives main.app in-process through httpx's ASGI transport: no server, no
+    network, so the numbers are the application's own cost.
+    """
+    from main import app
+
+    weights = {name: SCENARIO_WEIGHTS[name] for name in (scenarios or SCENARIO_WEIGHTS)}
+    fixtures = load_fixtures()
+    transport = httpx.ASGITransport(app=app)
+
+    # ASGITransport doesn't send lifespan events, so run startup/shutdown ourselves
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Endpoints print per request; keep that out of the report
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull if quiet else sys.stdout):
+            if warmup > 0:
+                warm = [VirtualUser(client, Recorder(), random.Random(f"{seed}-warm-{i}"), fixtures) for i in range(users)]
+                deadline = time.perf_counter() + warmup
+                await asyncio.gather(*(vu.run(deadline, list(weights), list(weights.values())) for vu in warm))
+
+            recorder = Recorder()
+            vus = [VirtualUser(client, recorder, random.Random(f"{seed}-{i}"), fixtures) for i in range(users)]
+            started = time.perf_counter()
+            deadline = started + duration
+            await asyncio.gather(*(vu.run(deadline, list(weights), list(weights.values())) for vu in vus))
+            elapsed = time.perf_counter() - started
+
+    from database import engine
+    result = recorder.summary(elapsed)
+    result["config"] = {
+        "users": users, "duration_s": duration, "seed": seed, "scenarios": weights,
+        "database": engine.dialect.name, "products_sampled": len(fixtures["product_ids"])
+    }
+    result["recorded_at"] = datetime.now(timezone.utc).isoformat()
+    return result
+
+def print_report(result):
+    print(f"\n{'endpoint':<30} {'reqs':>7} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, s in result["endpoints"].items():
+        print(f"{label:<30} {s['requests']:>7} {s['errors']:>5} {s['throughput_rps']:>9.1f} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f}")
+    print(f"\nTotal: {result['total_requests']} requests, {result['throughput_rps']:.1f} req/s")
+
+def compare(result, baseline, threshold=0.10):
+    """
+    Prints per-endpoint changes against a saved baseline. Returns the endpoints
+    whose p95 got slower, or throughput lower, by more than `threshold`.
+    """
+    if baseline.get("config", {}).get("scenarios") != result["config"]["scenarios"] or \
+            baseline.get("config", {}).get("users") != result["config"]["users"]:
+        print("Warning: baseline was recorded with different users/scenarios; deltas are not comparable.")
+
+    regressions = []
+    print(f"\n{'endpoint':<30} {'p50':>9} {'p95':>9} {'p99':>9} {'rps':>9}")
+    for label, current in result["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(label)
+        if not before:
+            print(f"{label:<30} {'(new)':>9}")
+            continue
+
+        def delta(key):
+            return (current[key] - before[key]) / before[key] if before[key] else 0.0
+
+        print(f"{label:<30} {delta('p50_ms'):>+9.1%} {delta('p95_ms'):>+9.1%} {delta('p99_ms'):>+9.1%} {delta('throughput_rps'):>+9.1%}")
+        if delta("p95_ms") > threshold or -delta("throughput_rps") > threshold:
+            regressions.append(label)
+    return regressions
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the API in-process with concurrent virtual users. "
+                                                 "Checkout and payment scenarios write orders: point DATABASE_URL at a load-test database.")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before measuring")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for each virtual user's choices")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIO_WEIGHTS), help="Only run these scenarios")
+    parser.add_argument("--save", help="Write the results to this JSON file as a new baseline")
+    parser.add_argument("--compare", help="Compare against a baseline JSON file; exits 1 on regression")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed p95/throughput regression, as a fraction")
+    parser.add_argument("--verbose", action="store_true", help="Let endpoint prints through")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args.users, args.duration, args.warmup, args.seed, args.scenarios, quiet=not args.verbose))
+    print_report(result)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions beyond threshold.")
@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+from types import SimpleNamespace
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from invoice_templates import compute_invoice, render_order_confirmation, get_invoice_html, clear_invoice_cache
+
+FRONTEND_URL = "http://localhost:5173"
+
+def make_order(lines: int = 100, order_id: int = 1):
+    # Plain objects shaped like OrderDB / OrderItemDB / ProductDB; no database needed
+    items = []
+    for i in range(lines):
+        product = SimpleNamespace(title=f"Sensor Module {i}", image=f"/uploads/sensor_{i}.jpg")
+        items.append(SimpleNamespace(product_id=i + 1, product=product, quantity=(i % 5) + 1, price_at_purchase=99.0 + i))
+    return SimpleNamespace(
+        id=order_id, full_name="Bench Customer", status="confirmed",
+        created_at=datetime(2026, 1, 15, 10, 30), customer_email="bench@example.com", items=items,
+        address_line="1 Bench Road", city="Pune", state="Maharashtra", pincode="411001", phone="9999999999", txnid="TXNBENCH"
+    )
+
+def bench(label, fn, repeat: int = 200):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed / repeat * 1000:8.3f} ms/render")
+    return elapsed / repeat
+
+def run_benchmark(lines: int = 100, repeat: int = 200):
+    order = make_order(lines)
+    print(f"Invoice benchmark: {lines} lines, {repeat} renders each")
+
+    bench("compute figures", lambda: compute_invoice(order), repeat)
+    invoice = compute_invoice(order)
+    cold = bench("render (templates, uncached)", lambda: render_order_confirmation(invoice, FRONTEND_URL), repeat)
+
+    def full_cold():
+        clear_invoice_cache()
+        get_invoice_html(order, FRONTEND_URL)
+    bench("compute + render (cache miss)", full_cold, repeat)
+
+    clear_invoice_cache()
+    get_invoice_html(order, FRONTEND_URL)
+    hot = bench("cached (resend / invoice view)", lambda: get_invoice_html(order, FRONTEND_URL), repeat)
+
+    html = get_invoice_html(order, FRONTEND_URL)
+    print(f"HTML size: {len(html) / 1024:.1f} KiB, cache speedup: {cold / hot:.0f}x")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark invoice email rendering.")
+    parser.add_argument("--lines", type=int, default=100, help="Order lines per invoice")
+    parser.add_argument("--repeat", type=int, default=200, help="Renders per measurement")
+    args = parser.parse_args()
+    run_benchmark(args.lines, args.repeat)
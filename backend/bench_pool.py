@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import time
+import threading
+from datetime import datetime, timezone
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from bench_api import percentile
+from database import create_db_engine, engine_options, POOL_PROFILES, SQLALCHEMY_DATABASE_URL
+from metrics import POOL_WAIT, POOL_TIMEOUTS
+
+def summarize(values):
+    values = sorted(values)
+    return {f"p{pct}_ms": percentile(values, pct) for pct in (50, 95, 99)}
+
+def run_profile(url, profile, threads=40, duration=10.0, hold_ms=2.0, sql="SELECT 1"):
+    """
+    `threads` workers check out a connection, run `sql`, hold it for `hold_ms`
+    (the rest of a request) and return it, until `duration` seconds pass. More
+    threads than pool_size + max_overflow makes them queue for connections, as
+    uvicorn's 40 threadpool workers do under load.
+    """
+    name = f"bench_{profile}"
+    engine = create_db_engine(url, profile, name=name)
+    checkouts, totals = [], []
+    lock = threading.Lock()
+
+    def worker(deadline):
+        mine_checkout, mine_total = [], []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    checked_out = time.perf_counter() # Includes the pre-ping, if any
+                    conn.execute(text(sql)).fetchall()
+                    time.sleep(hold_ms / 1000)
+            except PoolTimeoutError:
+                continue # Counted by the pool (db_pool_checkout_timeouts_total)
+            mine_checkout.append((checked_out - start) * 1000)
+            mine_total.append((time.perf_counter() - start) * 1000)
+        with lock:
+            checkouts.extend(mine_checkout)
+            totals.extend(mine_total)
+
+    try:
+        # Open the pool's connections before measuring
+        warm = [threading.Thread(target=worker, args=(time.perf_counter() + 0.5,)) for _ in range(threads)]
+        for t in warm:
+            t.start()
+        for t in warm:
+            t.join()
+        checkouts.clear()
+        totals.clear()
+        waits_before, timeouts_before = POOL_WAIT.snapshot(name), POOL_TIMEOUTS.value(name)
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker, args=(started + duration,)) for _ in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        wait_count, wait_sum = (after - before for after, before in zip(POOL_WAIT.snapshot(name), waits_before))
+        return {
+            "operations": len(totals),
+            "throughput_ops": round(len(totals) / elapsed, 1),
+            "latency": summarize(totals),
+            "checkout": summarize(checkouts),
+            "pool_wait_avg_ms": round(wait_sum / wait_count * 1000, 3) if wait_count else 0.0,
+            "timeouts": POOL_TIMEOUTS.value(name) - timeouts_before,
+            "settings": {k: v for k, v in engine_options(url, profile, name).items() if k.startswith(("pool_", "max_")) and k != "pool_logging_name"},
+        }
+    finally:
+        engine.dispose()
+
+def print_report(results):
+    print(f"\n{'profile':<10} {'ops':>8} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'checkout p95':>13} {'wait avg':>9} {'timeouts':>9}")
+    for profile, r in results["profiles"].items():
+        lat, co = r["latency"], r["checkout"]
+        print(f"{profile:<10} {r['operations']:>8} {r['throughput_ops']:>9.1f} {lat['p50_ms'] or 0:>8.2f} {lat['p95_ms'] or 0:>8.2f} "
+              f"{lat['p99_ms'] or 0:>8.2f} {co['p95_ms'] or 0:>13.2f} {r['pool_wait_avg_ms']:>9.3f} {r['timeouts']:>9}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare connection-pool profiles under concurrent checkouts. "
+                                                 "Point --url (or DATABASE_URL) at a local PostgreSQL; behind PgBouncer for the pooler profile.")
+    parser.add_argument("--url", default=SQLALCHEMY_DATABASE_URL, help="Database to benchmark (default: DATABASE_URL)")
+    parser.add_argument("--profiles", nargs="+", choices=list(POOL_PROFILES), default=list(POOL_PROFILES), help="Profiles to compare")
+    parser.add_argument("--threads", type=int, default=40, help="Concurrent workers (uvicorn's threadpool has 40)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per profile")
+    parser.add_argument("--hold-ms", type=float, default=2.0, help="How long each worker keeps its connection after the query")
+    parser.add_argument("--sql", default="SELECT 1", help="Statement run on every checkout")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    if not args.url.startswith(("postgresql", "postgres://")):
+        print("Warning: not PostgreSQL; pre-ping and prepared statements cost nothing here, so only pool queueing is compared.")
+
+    results = {"profiles": {}, "config": {"threads": args.threads, "duration_s": args.duration, "hold_ms": args.hold_ms, "sql": args.sql},
+               "recorded_at": datetime.now(timezone.utc).isoformat()}
+    for profile in args.profiles:
+        print(f"Running {profile}...")
+        results["profiles"][profile] = run_profile(args.url, profile, args.threads, args.duration, args.hold_ms, args.sql)
+    print_report(results)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.save}")
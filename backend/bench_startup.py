@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Cold start as an autoscaled instance sees it: a fresh interpreter imports the app,
+# runs lifespan startup and serves its first request. Each run is a new process.
+
+def measure_once():
+    started = time.perf_counter()
+    sys.path.insert(0, BACKEND_DIR)
+    from main import app
+    imported = time.perf_counter()
+
+    import httpx
+
+    async def boot_and_serve():
+        async with app.router.lifespan_context(app):
+            ready = time.perf_counter()
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                response = await client.get("/products", params={"limit": 20})
+            return ready, time.perf_counter(), response.status_code
+
+    ready, served, status = asyncio.run(boot_and_serve())
+    return {
+        "import_ms": (imported - started) * 1000,
+        "startup_ms": (ready - imported) * 1000,
+        "first_request_ms": (served - ready) * 1000,
+        "total_ms": (served - started) * 1000,
+        "status": status,
+    }
+
+def run(runs=5):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"],
+                             capture_output=True, text=True, check=True)
+        # Endpoints print; the timings are the last line
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    summary = {}
+    for key in ("import_ms", "startup_ms", "first_request_ms", "total_ms"):
+        values = sorted(s[key] for s in samples)
+        summary[key] = {"median": round(statistics.median(values), 1), "min": round(values[0], 1), "max": round(values[-1], 1)}
+    summary["runs"] = runs
+    summary["statuses"] = sorted({s["status"] for s in samples})
+    return summary
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure cold start: import, lifespan startup and first request, each in a fresh process.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes to start")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_once()))
+        sys.exit(0)
+
+    summary = run(args.runs)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"{'phase':<18} {'median ms':>10} {'min':>8} {'max':>8}")
+        for key in ("import_ms", "startup_ms", "first_request_ms", "total_ms"):
+            s = summary[key]
+            print(f"{key[:-3]:<18} {s['median']:>10.1f} {s['min']:>8.1f} {s['max']:>8.1f}")
+        print(f"\n{summary['runs']} runs, first request status {summary['statuses']}")
@@ -0,0 +1,109 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+from auth import SECRET_KEY
+from invoice_templates import GST_RATE
+from models import CartQuote, CartQuoteLine
+
+# Checkout prices a cart once with POST /cart/quote. The quote is returned with a
+# signed token holding the priced lines and total, so /payment/initiate can create
+# the order from the token instead of trusting a client-sent amount or re-reading
+# every product. Each token carries a random nonce that becomes the order's txnid,
+# so the unique txnid column lets a token place one order only.
+QUOTE_TTL_SECONDS = int(os.getenv("CART_QUOTE_TTL_SECONDS", "900"))
+SHIPPING = 0.0 # Free shipping
+
+class InvalidQuote(ValueError):
+    pass
+
+def unit_price(product):
+    # Same rule as create_order: sale price when set, else list price
+    return product.sale_price if product.sale_price else (product.price if product.price else 0.0)
+
+def merge_lines(items):
+    """
+    (product_id, quantity) pairs with repeated products summed, in first-seen order.
+    """
+    quantities = {}
+    for item in items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    return list(quantities.items())
+
+def build_quote(products, lines):
+    """
+    Prices `lines` against `products` (id -> ProductDB, already loaded in one query).
+    Raises KeyError with the product id when a product does not exist. The caller
+    signs the quote once it has decided the cart can be bought.
+    """
+    quote_lines = []
+    for product_id, quantity in lines:
+        product = products.get(product_id)
+        if product is None:
+            raise KeyError(product_id)
+        price = unit_price(product)
+        quote_lines.append(CartQuoteLine(
+            product_id=product_id,
+            title=product.title,
+            image=product.image,
+            quantity=quantity,
+            unit_price=price,
+            line_total=round(price * quantity, 2),
+            stock=product.stock or 0,
+            available=(product.stock or 0) >= quantity,
+        ))
+
+    subtotal = round(sum(line.line_total for line in quote_lines), 2)
+    gst = round(subtotal * GST_RATE, 2)
+    return CartQuote(
+        lines=quote_lines,
+        subtotal=subtotal,
+        gst=gst,
+        shipping=SHIPPING,
+        grand_total=round(subtotal + gst + SHIPPING, 2),
+        expires_in=QUOTE_TTL_SECONDS,
+    )
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _signature(body: str) -> str:
+    return _b64(hmac.new(SECRET_KEY.encode(), b"cart-quote." + body.encode(), hashlib.sha256).digest())
+
+def sign_quote(quote: CartQuote, now: float = None) -> str:
+    payload = {
+        "lines": [[line.product_id, line.quantity, line.unit_price] for line in quote.lines],
+        "total": quote.grand_total,
+        "exp": int((now or time.time()) + QUOTE_TTL_SECONDS),
+        "n": os.urandom(6).hex(),
+    }
+    body = _b64(json.dumps(payload, separators=(",", ":")).encode())
+    return f"{body}.{_signature(body)}"
+
+def verify_quote(token: str, now: float = None):
+    """
+    Returns ([(product_id, quantity, unit_price), ...], grand_total, nonce) from a
+    token made by sign_quote. Raises InvalidQuote when it is forged, malformed or expired.
+    """
+    body, _, signature = token.partition(".")
+    # Bytes: compare_digest refuses str with non-ASCII characters
+    if not hmac.compare_digest(signature.encode(), _signature(body).encode()):
+        raise InvalidQuote("Invalid quote token")
+    try:
+        payload = json.loads(_unb64(body))
+        lines = [(int(pid), int(quantity), float(price)) for pid, quantity, price in payload["lines"]]
+        total, expires, nonce = float(payload["total"]), payload["exp"], str(payload["n"])
+    except (ValueError, KeyError, TypeError):
+        raise InvalidQuote("Invalid quote token")
+    if (now or time.time()) > expires:
+        raise InvalidQuote("Quote expired, please review your cart again")
+    return lines, total, nonce
+
+def quote_txnid(amount: float, nonce: str) -> str:
+    # Same shape as other txnids; the same token always maps to the same one
+    return f"TXN{int(amount)}{nonce}"
@@ -0,0 +1,569 @@
+import os
+import mmap
+import time
+import glob
+import json
+import shutil
+import struct
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+
+# Read-only catalog snapshot shared by every worker through a memory-mapped file.
+#
+# The catalog (pre-serialised product JSON, sort orders, categories and a
+# lower-cased search text blob) is written once to catalog-<generation>.snap and
+# published by atomically replacing the small CURRENT pointer file. Workers mmap
+# the file, so its pages live once in the OS page cache however many processes
+# serve from it. Per-worker memory stays flat as workers are added. Catalog
+# edits (products created, updated, deleted or imported) mark the catalog dirty;
+# a debounced background rebuild in one worker publishes a new generation, and
+# readers pick it up on their next request.
+#
+# Stock and review aggregates change with every order and review, so they are
+# not in the snapshot: each response reads them for its page of products by
+# primary key (live_fields) and appends them to the stored JSON.
+#
+# Enabled by CATALOG_SNAPSHOT_DIR. Without it the endpoints query the database.
+
+CATALOG_SNAPSHOT_DIR = os.getenv("CATALOG_SNAPSHOT_DIR")
+# Seconds to wait after a write before rebuilding, so bursts coalesce into one build
+REBUILD_DEBOUNCE = float(os.getenv("CATALOG_REBUILD_DEBOUNCE", "1.0"))
+
+MAGIC = b"TXCAT03\0" # Bump whenever the layout or the product JSON changes
+SECTIONS = (
+    ("ids", "q"),              # product id per record, ascending
+    ("prices", "d"),           # effective price per record, NaN for NULL
+    ("categories", "i"),       # index into category_names per record
+    ("order_price", "i"),      # record indices by price ascending, ties by id
+    ("order_price_desc", "i"), # record indices by price descending, ties by id descending
+    ("order_discount", "i"),   # record indices by discount descending, ties by id descending
+    ("order_name", "i"),       # record indices by title ascending
+    ("rank_price", "i"),       # inverse of order_price
+    ("rank_price_desc", "i"),  # inverse of order_price_desc
+    ("rank_discount", "i"),    # inverse of order_discount
+    ("rank_name", "i"),        # inverse of order_name
+    ("cat_members", "i"),      # record indices grouped by category
+    ("cat_starts", "Q"),       # category c owns cat_members[cat_starts[c]:cat_starts[c + 1]]
+    ("data_offsets", "Q"),     # record i's JSON is data[data_offsets[i]:data_offsets[i + 1]]
+    ("search_offsets", "Q"),   # record i's search text starts at search[search_offsets[i]]
+    ("category_names", None),  # JSON list
+    ("search", None),          # "title\x01description\x01category\x00" per record, lower-cased
+    ("data", None),            # product JSON as the API returns it, minus LIVE_FIELDS
+)
+HEADER = struct.Struct("<8sQII" + "QQ" * len(SECTIONS))
+POINTER = "CURRENT"
+# Stamp files: the latest request for a rebuild, and the request the published generation covers
+REQUESTED = "REQUESTED"
+BUILT = "BUILT"
+
+# Product fields read from the database per response instead of the snapshot
+LIVE_FIELDS = ("stock", "review_count", "average_rating", "rating_histogram")
+
+# SQLite puts NULL (NaN here) prices first in ascending sorts and last in descending ones
+def _price_key(value):
+    return (value == value, value if value == value else 0.0)
+
+def _price_desc_key(value):
+    return (value != value, -value if value == value else 0.0)
+
+def _take(indices, keep, skip, limit):
+    # The page of `indices` passing `keep`, consuming no more than needed
+    page, seen = [], 0
+    for i in indices:
+        if keep(i):
+            seen += 1
+            if seen > skip:
+                page.append(i)
+                if len(page) >= limit:
+                    break
+    return page
+
+def live_fields(db, ids):
+    """
+    {product id: LIVE_FIELDS as a JSON object} for the products in `ids` that
+    still exist. One primary-key query per response.
+    """
+    from models import ProductDB, Product
+
+    if not ids:
+        return {}
+    columns = ("review_count", "rating_sum", "rating_1", "rating_2", "rating_3", "rating_4", "rating_5")
+    rows = db.query(ProductDB.id, ProductDB.stock, *(getattr(ProductDB, c) for c in columns)).filter(ProductDB.id.in_(ids))
+    fields = {}
+    for row in rows:
+        # Computed fields come from the model so they match the database path
+        product = Product.model_construct(**{c: getattr(row, c) or 0 for c in columns})
+        fields[row.id] = json.dumps({"stock": row.stock, "review_count": product.review_count,
+                                     "average_rating": product.average_rating,
+                                     "rating_histogram": product.rating_histogram}, separators=(",", ":")).encode("utf-8")
+    return fields
+
+class CatalogSnapshot:
+    """
+    One mapped snapshot file. Arrays are memoryviews over the mapping, so
+    attaching copies nothing; only category names are parsed into a dict.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.generation, self.count, _, *bounds = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+
+        view = memoryview(self._mm)
+        self._bounds = {}
+        for (name, typecode), offset, length in zip(SECTIONS, bounds[0::2], bounds[1::2]):
+            self._bounds[name] = (offset, offset + length)
+            if typecode:
+                setattr(self, name, view[offset:offset + length].cast(typecode))
+        start, end = self._bounds["category_names"]
+        self.category_names = json.loads(bytes(self._mm[start:end]))
+        self.category_ids = {name: i for i, name in enumerate(self.category_names)}
+
+    def product_json(self, product_id, live):
+        """
+        The /products/{id} body, or None if there is no such product. `live` is
+        called with the id list and returns live_fields for them.
+        """
+        i = bisect_left(self.ids, product_id)
+        if i == self.count or self.ids[i] != product_id:
+            return None
+        fields = live([product_id]).get(product_id)
+        if fields is None:
+            return None # Deleted since this generation was built
+        return self._record(i, fields)
+
+    def _record(self, i, fields):
+        base = self._bounds["data"][0]
+        record = self._mm[base + self.data_offsets[i]:base + self.data_offsets[i + 1]]
+        return record[:-1] + b"," + fields[1:]
+
+    def _search(self, term):
+        # Matching records in id order. mmap.find scans the mapped blob in C and
+        # each hit jumps to the next record; lazy, so a page can stop early.
+        needle = term.lower().replace("\x00", "").replace("\x01", "").encode("utf-8")
+        base, end = self._bounds["search"]
+        pos = self._mm.find(needle, base, end)
+        while pos != -1:
+            i = bisect_right(self.search_offsets, pos - base) - 1
+            yield i
+            pos = self._mm.find(needle, base + self.search_offsets[i + 1], end)
+
+    def _order(self, sort_by, min_price=None, max_price=None):
+        # (records in output order, sort key for a subset); None key means record order
+        if sort_by in ("price_asc", "price_desc"):
+            if sort_by == "price_asc":
+                order, rank, key = self.order_price, self.rank_price, _price_key
+            else:
+                order, rank, key = self.order_price_desc, self.rank_price_desc, _price_desc_key
+            if min_price is not None or max_price is not None:
+                # A price range is a contiguous slice of the price order (NULLs match no bound)
+                low = key(min_price if min_price is not None else float("-inf"))
+                high = key(max_price if max_price is not None else float("inf"))
+                if sort_by == "price_desc":
+                    low, high = high, low
+                prices = self.prices
+                lo = bisect_left(order, low, key=lambda i: key(prices[i]))
+                hi = bisect_right(order, high, key=lambda i: key(prices[i]))
+                order = order[lo:max(lo, hi)]
+            return order, rank.__getitem__
+        if sort_by == "discount_desc":
+            return self.order_discount, self.rank_discount.__getitem__
+        if sort_by == "name_asc":
+            return self.order_name, self.rank_name.__getitem__
+        return range(self.count), None
+
+    def list_json(self, live, skip=0, limit=20, category=None, min_price=None, max_price=None, sort_by=None, search=None):
+        """
+        The /products response body for these parameters, matching the database
+        path's filters and orderings. `live` is as for product_json.
+        """
+        skip = max(skip, 0)
+        if limit <= 0:
+            return b"[]"
+        category_id = None
+        if category and category != "All":
+            category_id = self.category_ids.get(category)
+            if category_id is None:
+                return b"[]"
+
+        prices, categories = self.prices, self.categories
+        def keep(i):
+            if category_id is not None and categories[i] != category_id:
+                return False
+            price = prices[i]
+            if min_price is not None and not price >= min_price:
+                return False
+            if max_price is not None and not price <= max_price:
+                return False
+            return True
+
+        ordered, rank = self._order(sort_by, min_price, max_price)
+        candidates = None
+        if search:
+            matches = self._search(search)
+            if rank is None:
+                # Record order is the output order: take matches until the page is full
+                return self._page_json(_take(matches, keep, skip, limit), live)
+            candidates = list(matches)
+        elif category_id is not None:
+            candidates = self.cat_members[self.cat_starts[category_id]:self.cat_starts[category_id + 1]]
+
+        if candidates is not None and len(candidates) * 8 <= self.count:
+            # Few candidates: filter them and sort by precomputed rank
+            selected = [i for i in candidates if keep(i)]
+            if rank is not None:
+                selected.sort(key=rank)
+            page = selected[skip:skip + limit]
+        else:
+            # Most of the catalog qualifies: walk the sort order and stop once the page is full
+            if search:
+                members = set(candidates)
+                ordered = (i for i in ordered if i in members)
+            page = _take(ordered, keep, skip, limit)
+        return self._page_json(page, live)
+
+    def _page_json(self, page, live):
+        fields = live([self.ids[i] for i in page])
+        # Products deleted since the build drop out until the next generation
+        return b"[" + b",".join(self._record(i, fields[self.ids[i]]) for i in page if self.ids[i] in fields) + b"]"
+
+# --- Building and publishing ----------------------------------------------------
+
+def _write_section(f, payload):
+    # 8-byte alignment keeps every typed array castable in place
+    f.write(b"\0" * (-f.tell() % 8))
+    offset = f.tell()
+    if hasattr(payload, "read"):
+        payload.seek(0)
+        shutil.copyfileobj(payload, f, 1024 * 1024)
+    else:
+        f.write(payload)
+    return offset, f.tell() - offset
+
+def _inverse(order):
+    rank = array("i", bytes(4 * len(order)))
+    for position, i in enumerate(order):
+        rank[i] = position
+    return rank
+
+def build_snapshot(db, path, batch_size=2000):
+    """
+    Streams every product into a snapshot file at `path`. Records that the API
+    could not serialise (e.g. a NULL title) are left out, as the database path
+    would fail on them. Returns (records written, records skipped).
+    """
+    from pydantic import ValidationError
+    from models import ProductDB, Product
+
+    ids, prices, discounts, titles = array("q"), array("d"), array("d"), []
+    categories, category_ids = array("i"), {}
+    data_offsets, search_offsets = array("Q", [0]), array("Q", [0])
+    skipped = 0
+
+    with tempfile.TemporaryFile() as data_f, tempfile.TemporaryFile() as search_f:
+        for product in db.query(ProductDB).order_by(ProductDB.id).yield_per(batch_size):
+            try:
+                record = Product.model_validate(product).model_dump_json(exclude=set(LIVE_FIELDS)).encode("utf-8")
+            except ValidationError:
+                skipped += 1
+                continue
+            ids.append(product.id)
+            prices.append(product.effective_price if product.effective_price is not None else float("nan"))
+            discounts.append(product.discount_pct if product.discount_pct is not None else float("nan"))
+            titles.append(product.title)
+            categories.append(category_ids.setdefault(product.category, len(category_ids)))
+            data_offsets.append(data_offsets[-1] + data_f.write(record))
+            text = "\x01".join((product.title or "", product.description or "", product.category or "")).lower()
+            search_offsets.append(search_offsets[-1] + search_f.write(text.encode("utf-8") + b"\0"))
+
+        count = len(ids)
+        # Python's sort is stable and records are in id order, so ties stay in id order;
+        # the descending orders (ties by id descending, NULLs last) are exact reversals
+        order_price = array("i", sorted(range(count), key=lambda i: _price_key(prices[i])))
+        order_price_desc = array("i", reversed(order_price))
+        order_discount = array("i", reversed(sorted(range(count), key=lambda i: _price_key(discounts[i]))))
+        order_name = array("i", sorted(range(count), key=lambda i: titles[i]))
+        rank_price, rank_price_desc, rank_name = _inverse(order_price), _inverse(order_price_desc), _inverse(order_name)
+        rank_discount = _inverse(order_discount)
+        # A stable sort keeps members in id order within each category
+        cat_members = array("i", sorted(range(count), key=lambda i: categories[i]))
+        sizes = [0] * len(category_ids)
+        for c in categories:
+            sizes[c] += 1
+        cat_starts = array("Q", [0])
+        for size in sizes:
+            cat_starts.append(cat_starts[-1] + size)
+        names = sorted(category_ids, key=category_ids.get)
+
+        payloads = {
+            "ids": ids, "prices": prices, "categories": categories,
+            "order_price": order_price, "order_price_desc": order_price_desc, "order_discount": order_discount,
+            "order_name": order_name, "rank_price": rank_price, "rank_price_desc": rank_price_desc,
+            "rank_discount": rank_discount, "rank_name": rank_name,
+            "cat_members": cat_members, "cat_starts": cat_starts,
+            "data_offsets": data_offsets, "search_offsets": search_offsets,
+            "category_names": json.dumps(names).encode("utf-8"),
+            "search": search_f, "data": data_f,
+        }
+        generation = time.time_ns()
+        with open(path, "wb") as f:
+            f.write(b"\0" * HEADER.size)
+            bounds = []
+            for name, _ in SECTIONS:
+                payload = payloads[name]
+                bounds.extend(_write_section(f, payload.tobytes() if isinstance(payload, array) else payload))
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, generation, count, len(names), *bounds))
+            f.flush()
+            os.fsync(f.fileno())
+    return count, skipped
+
+@contextmanager
+def _build_lock(directory, blocking=True):
+    # Serialises builds across workers so a slow, older build can't publish over
+    # a newer one. Yields False when not `blocking` and another worker holds it.
+    with open(os.path.join(directory, "build.lock"), "a+b") as f:
+        try:
+            import fcntl
+        except ImportError:
+            yield True # Windows: development runs a single worker
+            return
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _read_stamp(directory, name):
+    try:
+        with open(os.path.join(directory, name)) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def _write_stamp(directory, name, stamp):
+    # Replaced, not rewritten, so a reader never sees a half-written stamp
+    tmp = os.path.join(directory, f"{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w") as f:
+        f.write(str(stamp))
+    os.replace(tmp, os.path.join(directory, name))
+
+def _published_magic(directory):
+    # Format of the published snapshot; None when there is none (or it is unreadable)
+    try:
+        with open(os.path.join(directory, POINTER)) as f:
+            name = f.read().strip()
+        with open(os.path.join(directory, name), "rb") as f:
+            return f.read(len(MAGIC))
+    except OSError:
+        return None
+
+def publish_snapshot(db, directory, only_if_missing=False):
+    """
+    Builds a new generation and points CURRENT at it. Returns the file name, or
+    None when `only_if_missing` and a snapshot in the current format already exists.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with _build_lock(directory):
+        if only_if_missing and _published_magic(directory) == MAGIC:
+            return None
+        return _publish_locked(db, directory)
+
+def _publish_locked(db, directory):
+    # Caller holds the build lock
+    pointer = os.path.join(directory, POINTER)
+    name = f"catalog-{time.time_ns()}.snap"
+    tmp = os.path.join(directory, name + ".tmp")
+    count, skipped = build_snapshot(db, tmp)
+    os.replace(tmp, os.path.join(directory, name))
+
+    # The pointer is tiny and never mapped, so replacing it is atomic everywhere
+    with open(pointer + ".tmp", "w") as f:
+        f.write(name)
+    os.replace(pointer + ".tmp", pointer)
+
+    # Keep the previous generation for readers still attaching to it
+    for old in sorted(glob.glob(os.path.join(directory, "catalog-*.snap")))[:-2]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass # Still mapped on Windows; removed by a later build
+    print(f"Catalog snapshot {name}: {count} products" + (f", {skipped} skipped" if skipped else ""))
+    return name
+
+class SnapshotReader:
+    """
+    Per-worker handle on the published snapshot. A stat of the pointer file per
+    call notices new generations; the old mapping is released once no request
+    is still using it.
+    """
+    def __init__(self, directory):
+        self.pointer = os.path.join(directory, POINTER)
+        self.directory = directory
+        self._key = None
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        key = self._pointer_key()
+        if key is None:
+            return self._snapshot
+        if key != self._key:
+            with self._lock:
+                # Builds delete all but the last two generations, so the file
+                # CURRENT names can be gone by the time we open it when builds
+                # run back to back. Re-read the pointer; if it keeps moving, keep
+                # serving the mapping we have and try again on the next request.
+                for _ in range(3):
+                    if key == self._key:
+                        break
+                    try:
+                        with open(self.pointer) as f:
+                            name = f.read().strip()
+                        self._snapshot = CatalogSnapshot(os.path.join(self.directory, name))
+                        self._key = key
+                    except FileNotFoundError:
+                        key = self._pointer_key()
+                        if key is None:
+                            break
+        return self._snapshot
+
+    def _pointer_key(self):
+        try:
+            st = os.stat(self.pointer)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+class SnapshotPublisher:
+    """
+    Rebuilds in a background thread after catalog edits, waiting `debounce`
+    seconds so a burst of edits costs one build. Requests are stamped in the
+    snapshot directory, so whichever worker holds the build lock covers edits
+    made through the others too: one builder at a time, however many workers.
+    """
+    def __init__(self, directory, session_factory, debounce=REBUILD_DEBOUNCE):
+        self.directory = directory
+        self.session_factory = session_factory
+        self.debounce = debounce
+        self._dirty = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def rebuild(self, only_if_missing=False):
+        db = self.session_factory()
+        try:
+            return publish_snapshot(db, self.directory, only_if_missing)
+        finally:
+            db.close()
+
+    def rebuild_requested(self):
+        """
+        Builds until the published generation covers the latest request. Returns
+        False without building when another worker holds the build lock.
+        """
+        with _build_lock(self.directory, blocking=False) as acquired:
+            if not acquired:
+                return False
+            while True:
+                requested = _read_stamp(self.directory, REQUESTED)
+                if requested <= _read_stamp(self.directory, BUILT):
+                    return True
+                db = self.session_factory()
+                try:
+                    _publish_locked(db, self.directory)
+                finally:
+                    db.close()
+                _write_stamp(self.directory, BUILT, requested)
+
+    def mark_dirty(self):
+        _write_stamp(self.directory, REQUESTED, time.time_ns())
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="catalog-snapshot", daemon=True)
+                    self._thread.start()
+        self._dirty.set()
+
+    def stop(self):
+        self._stopped = True
+        self._dirty.set() # Wakes the thread so it can exit
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(self.debounce)
+            if self._stopped:
+                return
+            self._dirty.clear() # Writes from here on trigger another build
+            try:
+                if not self.rebuild_requested():
+                    # The build in progress may have read the catalog before our
+                    # request; check again once it is done
+                    self._dirty.set()
+            except Exception as e:
+                print(f"Catalog snapshot rebuild failed: {e}")
+
+_reader = None
+_publisher = None
+
+def start_catalog_snapshot(session_factory, directory=None):
+    """
+    Called from the app's lifespan. Publishes a first snapshot if there is none,
+    or only one in an older format (one worker builds it, the others wait on the
+    lock), and attaches to it.
+    """
+    global _reader, _publisher
+    directory = directory or CATALOG_SNAPSHOT_DIR
+    if not directory:
+        return False
+    _publisher = SnapshotPublisher(directory, session_factory)
+    _publisher.rebuild(only_if_missing=True)
+    _reader = SnapshotReader(directory)
+    return True
+
+def stop_catalog_snapshot():
+    """
+    Called when the app shuts down: detaches and stops scheduling rebuilds.
+    """
+    global _reader, _publisher
+    if _publisher is not None:
+        _publisher.stop()
+    _reader = _publisher = None
+
+def current_snapshot():
+    return _reader.current() if _reader is not None else None
+
+def mark_catalog_dirty():
+    """
+    Call after committing a catalog edit. Stock and review changes need not
+    call it; they are read live (LIVE_FIELDS).
+    """
+    if _publisher is not None:
+        _publisher.mark_dirty()
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Build and publish the shared catalog snapshot, e.g. after imports or manual DB edits.")
+    parser.add_argument("--dir", default=CATALOG_SNAPSHOT_DIR, help="Snapshot directory (default: CATALOG_SNAPSHOT_DIR)")
+    args = parser.parse_args()
+    if not args.dir:
+        parser.error("set CATALOG_SNAPSHOT_DIR or pass --dir")
+
+    db = SessionLocal()
+    try:
+        publish_snapshot(db, args.dir)
+    finally:
+        db.close()
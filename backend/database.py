@@ -1,7 +1,16 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url, inspect, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError, DBAPIError
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
+from fastapi import Request
 import os
+import time
+import logging
 from dotenv import load_dotenv
+from metrics import POOL_WAIT, POOL_TIMEOUTS
+from slow_queries import install_slow_query_log
+from read_replicas import RoutingSession, ReplicaSet, RecentWrites, install_read_routing, REPLICA_URLS
 
 load_dotenv()
 
@@ -10,28 +19,184 @@ load_dotenv()
 # Default to SQLite for local development
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./tronix365.db")
 
-if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
-    SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
-
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    # pool_pre_ping checks if connection is alive before using it
-    # pool_recycle refreshes connections every 5 minutes to prevent idle timeouts
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, 
-        pool_pre_ping=True, 
-        pool_recycle=300,
-        pool_size=10,
-        max_overflow=20
-    )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Pool settings for PostgreSQL, picked with DB_POOL_PROFILE:
+#   default - pings every connection on checkout (one extra round trip each time)
+#   lean    - no ping; a query that hits a dead connection fails once and SQLAlchemy
+#             drops the stale connections. LIFO lets surplus connections idle out.
+#   pooler  - behind an external transaction pooler (PgBouncer transaction mode, the
+#             Neon/Supabase pooled endpoints): no ping, no prepared statements, since
+#             consecutive transactions may run on different server connections
+# DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE and DB_POOL_PRE_PING
+# override single settings of the chosen profile.
+POOL_PROFILES = {
+    "default": {"pool_pre_ping": True, "pool_recycle": 300, "pool_size": 10, "max_overflow": 20, "pool_timeout": 30},
+    "lean": {"pool_pre_ping": False, "pool_recycle": 300, "pool_size": 10, "max_overflow": 20, "pool_timeout": 30, "pool_use_lifo": True},
+    "pooler": {"pool_pre_ping": False, "pool_recycle": 300, "pool_size": 10, "max_overflow": 20, "pool_timeout": 30, "prepared_statements": False},
+}
+POOL_PROFILE = os.getenv("DB_POOL_PROFILE", "default")
+POOL_OVERRIDES = {
+    "pool_size": ("DB_POOL_SIZE", int),
+    "max_overflow": ("DB_MAX_OVERFLOW", int),
+    "pool_timeout": ("DB_POOL_TIMEOUT", float),
+    "pool_recycle": ("DB_POOL_RECYCLE", int),
+    "pool_pre_ping": ("DB_POOL_PRE_PING", lambda value: value.lower() not in ("0", "false", "no")),
+}
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited for a free connection,
+    and how many gave up at pool_timeout, exposed as db_pool_checkout_wait_seconds
+    and db_pool_checkout_timeouts_total on /metrics, labelled with the pool's name.
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            POOL_TIMEOUTS.inc(self.logging_name or "primary")
+            raise
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start, self.logging_name or "primary")
+
+# Pools log under their class's module; keep ours as quiet as SQLAlchemy's own
+logging.getLogger(f"{__name__}.TimedQueuePool").setLevel(logging.WARNING)
+
+def engine_options(url, profile=None, name="primary"):
+    """
+    create_engine() keyword arguments for `url` under a pool profile. SQLite keeps
+    SQLAlchemy's pool defaults unless a profile is passed explicitly (bench_pool.py).
+    """
+    if url.startswith("sqlite"):
+        options = {"connect_args": {"check_same_thread": False}}
+        if profile is None:
+            return options # SQLAlchemy picks the pool (a single shared connection for sqlite://)
+    else:
+        options = {}
+    options.update({"poolclass": TimedQueuePool, "pool_logging_name": name})
+
+    profile = profile or POOL_PROFILE
+    if profile not in POOL_PROFILES:
+        raise ValueError(f"Unknown pool profile {profile!r}; choose one of: {', '.join(POOL_PROFILES)}")
+    settings = dict(POOL_PROFILES[profile])
+    for option, (variable, parse) in POOL_OVERRIDES.items():
+        if os.getenv(variable):
+            settings[option] = parse(os.getenv(variable))
+    # psycopg2 never prepares server-side; psycopg 3 does after 5 runs of a statement
+    if not settings.pop("prepared_statements", True) and make_url(url).drivername == "postgresql+psycopg":
+        options.setdefault("connect_args", {})["prepare_threshold"] = None
+    options.update(settings)
+    return options
+
+def create_db_engine(url, profile=None, name="primary"):
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return create_engine(url, **engine_options(url, profile, name))
+
+# Read replicas for GET requests (DATABASE_REPLICA_URLS); see read_replicas.py
+replicas = ReplicaSet()
+recent_writes = RecentWrites()
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, replicas=replicas)
+route_request = install_read_routing(SessionLocal, replicas, recent_writes)
+
+engine = None
+slow_query_log = None
+
+def connect_database(url, replica_urls=()):
+    """
+    Builds the engines for `url` and `replica_urls` and binds SessionLocal to them,
+    disposing the ones they replace. Runs once at import from DATABASE_URL; tests
+    call it for each throwaway database (testing_utils.throwaway_app).
+    """
+    global engine, slow_query_log
+    if engine is not None:
+        if slow_query_log is not None:
+            slow_query_log.uninstall(engine)
+        engine.dispose()
+    engine = create_db_engine(url)
+    # Statements over SLOW_QUERY_MS go to slow_queries.log with their plan (off by default)
+    slow_query_log = install_slow_query_log(engine)
+    replicas.replace([create_db_engine(replica_url, name=f"replica{i}") for i, replica_url in enumerate(replica_urls, 1)])
+    for replica in replicas.replicas:
+        install_slow_query_log(replica.engine)
+    recent_writes.clear()
+    SessionLocal.configure(bind=engine)
+    return engine
+
+connect_database(SQLALCHEMY_DATABASE_URL, REPLICA_URLS)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request = None):
+    # GET/HEAD requests read from a replica when one is configured and healthy
+    db = SessionLocal(info=route_request(request))
     try:
         yield db
     finally:
         db.close()
+
+def dialect_insert(bind):
+    """
+    The dialect-specific insert() for `bind`, which supports ON CONFLICT DO UPDATE
+    on both SQLite and PostgreSQL.
+    """
+    if bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+def _add_column(bind, table, column):
+    # SQLite only adds columns with constant defaults; existing rows then start NULL
+    if bind.dialect.name == "sqlite" and column.server_default is not None and not isinstance(column.server_default.arg, str):
+        spec = f"{column.name} {column.type.compile(dialect=bind.dialect)}"
+    else:
+        spec = str(CreateColumn(column).compile(dialect=bind.dialect))
+    with bind.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {spec}"))
+
+def upgrade_schema(bind, metadata):
+    """
+    Adds the columns and indexes that create_all skips on tables that already
+    exist. Returns the "table.column" names it added. Data backfills for new
+    columns stay with their features (migrate_pricing.py, review_stats.py, ...).
+    """
+    existing = set(inspect(bind).get_table_names())
+    added = []
+    for table in metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        present = {column["name"] for column in inspect(bind).get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            try:
+                _add_column(bind, table, column)
+            except DBAPIError:
+                # Another worker added it first
+                if column.name not in {c["name"] for c in inspect(bind).get_columns(table.name)}:
+                    raise
+                continue
+            added.append(f"{table.name}.{column.name}")
+        for index in table.indexes:
+            index.create(bind, checkfirst=True)
+    return added
+
+def init_schema(bind=None):
+    """
+    Creates any missing tables, then adds missing columns and indexes to the
+    existing ones. Run once per deploy (`python database.py`) or let the app's
+    lifespan do it; importing the app never touches the schema. Returns the
+    columns it added.
+    """
+    import models  # Registers every table on Base.metadata
+    bind = bind or engine
+    # models.Base, not Base: run as a script this module is __main__, a second copy
+    models.Base.metadata.create_all(bind=bind)
+    return upgrade_schema(bind, models.Base.metadata)
+
+if __name__ == "__main__":
+    added = init_schema()
+    if added:
+        print(f"Added columns: {', '.join(added)}")
+    print(f"Schema is up to date on {engine.url.render_as_string(hide_password=True)}")
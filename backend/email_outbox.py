@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, or_, and_
+from sqlalchemy.orm import Session, joinedload
+from models import EmailOutboxDB, OrderDB, OrderItemDB
+from email_utils import build_order_confirmation, build_contact_form_notification
+
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+# A 'sending' row older than this belongs to a worker that died mid-batch
+STALE_LOCK_SECONDS = 300
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+def enqueue_email(db: Session, kind: str, payload: dict):
+    """
+    Adds a message to the outbox inside the caller's transaction.
+    Nothing is sent until the caller commits and a worker claims the row.
+    """
+    message = EmailOutboxDB(kind=kind, payload=payload, status="pending", attempts=0)
+    db.add(message)
+    return message
+
+def enqueue_order_confirmation(db: Session, order: OrderDB):
+    if order.id is None:
+        db.flush() # Need the order id for the payload
+    return enqueue_email(db, "order_confirmation", {"order_id": order.id})
+
+def enqueue_contact_notification(db: Session, name: str, email: str, message: str):
+    return enqueue_email(db, "contact_notification", {"name": name, "email": email, "message": message})
+
+def build_message(db: Session, message: EmailOutboxDB):
+    """
+    Renders an outbox row into send_email_via_brevo keyword arguments.
+    Returns None when the message can never be sent (e.g. its order was deleted).
+    """
+    payload = message.payload or {}
+    if message.kind == "order_confirmation":
+        order = db.query(OrderDB).options(
+            joinedload(OrderDB.items).joinedload(OrderItemDB.product)
+        ).filter(OrderDB.id == payload.get("order_id")).first()
+        if not order:
+            return None
+        return build_order_confirmation(order)
+    if message.kind == "contact_notification":
+        return build_contact_form_notification(payload.get("name"), payload.get("email"), payload.get("message"))
+    return None
+
+def claim_batch(db: Session, batch_size: int = 50):
+    """
+    Claims up to `batch_size` due messages and marks them 'sending'.
+    On PostgreSQL the SELECT uses FOR UPDATE SKIP LOCKED so concurrent workers
+    never claim the same row; SQLite runs a single writer anyway.
+    """
+    now = _utcnow()
+    stale_before = now - timedelta(seconds=STALE_LOCK_SECONDS)
+
+    messages = db.query(EmailOutboxDB).filter(
+        or_(
+            and_(EmailOutboxDB.status == "pending", EmailOutboxDB.next_attempt_at <= func.now()),
+            and_(EmailOutboxDB.status == "sending", EmailOutboxDB.locked_at < stale_before)
+        )
+    ).order_by(EmailOutboxDB.id).limit(batch_size).with_for_update(skip_locked=True).all()
+
+    for message in messages:
+        message.status = "sending"
+        message.locked_at = now
+    db.commit()
+    return messages
+
+def mark_sent(message: EmailOutboxDB):
+    message.status = "sent"
+    message.sent_at = _utcnow()
+    message.locked_at = None
+    message.last_error = None
+
+def mark_failed(message: EmailOutboxDB, error: str, retryable: bool = True):
+    """
+    Records a failed attempt and schedules the next one with exponential backoff.
+    Gives up after MAX_ATTEMPTS or immediately for non-retryable errors.
+    """
+    message.attempts = (message.attempts or 0) + 1
+    message.last_error = error[:500]
+    message.locked_at = None
+    if not retryable or message.attempts >= MAX_ATTEMPTS:
+        message.status = "failed"
+        return
+    delay = min(BACKOFF_BASE_SECONDS * (2 ** (message.attempts - 1)), BACKOFF_MAX_SECONDS)
+    message.status = "pending"
+    message.next_attempt_at = _utcnow() + timedelta(seconds=delay)
+
+def outbox_stats(db: Session):
+    """
+    Queue depth by status plus the age of the oldest pending message.
+    """
+    counts = dict(db.query(EmailOutboxDB.status, func.count(EmailOutboxDB.id)).group_by(EmailOutboxDB.status).all())
+    oldest = db.query(func.min(EmailOutboxDB.created_at)).filter(EmailOutboxDB.status == "pending").scalar()
+    oldest_age = None
+    if oldest is not None:
+        if oldest.tzinfo is None:
+            oldest = oldest.replace(tzinfo=timezone.utc) # SQLite stores naive UTC
+        oldest_age = round((_utcnow() - oldest).total_seconds(), 1)
+    return {
+        "pending": counts.get("pending", 0),
+        "sending": counts.get("sending", 0),
+        "sent": counts.get("sent", 0),
+        "failed": counts.get("failed", 0),
+        "oldest_pending_age_seconds": oldest_age
+    }
@@ -1,37 +1,44 @@
 import os
-import requests
 import logging
 from dotenv import load_dotenv
+from invoice_templates import get_invoice_html
 
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Log levels are configured by the entry point (the app's lifespan, email_worker.py)
 logger = logging.getLogger(__name__)
 
 BREVO_API_KEY = os.getenv("BREVO_API_KEY")
-BREVO_API_URL = "https://api.brevo.com/v3/smtp/email"
+BREVO_API_URL = os.getenv("BREVO_API_URL", "https://api.brevo.com/v3/smtp/email")
 SENDER_EMAIL = os.getenv("CONTACT_EMAIL", "support@tronix365.com") 
 
-def send_email_via_brevo(to_email: str, subject: str, html_content: str, sender_name: str = "Tronix365", sender_email: str = None, reply_to: dict = None):
-    """
-    Sends an email using the Brevo API.
-    """
-    if not sender_email:
-        sender_email = SENDER_EMAIL
-    
-    if not BREVO_API_KEY:
-        logger.warning("BREVO_API_KEY not set. Skipping email.")
-        return False
+# Shared keep-alive session so consecutive sends reuse the TLS connection to Brevo
+_http_session = None
 
-    headers = {
-        "accept": "application/json",
-        "api-key": BREVO_API_KEY,
-        "content-type": "application/json"
-    }
+def get_http_session(pool_size: int = 10):
+    global _http_session
+    if _http_session is None:
+        # Imported here so loading this module (and the app) doesn't pay for requests
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({
+            "accept": "application/json",
+            "content-type": "application/json"
+        })
+        _http_session = session
+    return _http_session
 
+def deliver_via_brevo(to_email: str, subject: str, html_content: str, sender_name: str = "Tronix365", sender_email: str = None, reply_to: dict = None, timeout: float = 10):
+    """
+    Posts one email to Brevo over the pooled session and returns the message id.
+    Raises requests.exceptions.RequestException on failure so callers can decide to retry.
+    """
     payload = {
-        "sender": {"name": sender_name, "email": sender_email},
+        "sender": {"name": sender_name, "email": sender_email or SENDER_EMAIL},
         "to": [{"email": to_email}],
         "subject": subject,
         "htmlContent": html_content
@@ -40,26 +47,40 @@ def send_email_via_brevo(to_email: str, subject: str, html_content: str, sender_
     if reply_to:
         payload["replyTo"] = reply_to
 
+    response = get_http_session().post(BREVO_API_URL, json=payload, headers={"api-key": BREVO_API_KEY}, timeout=timeout)
+    response.raise_for_status()
+    return response.json().get("messageId")
+
+def send_email_via_brevo(to_email: str, subject: str, html_content: str, sender_name: str = "Tronix365", sender_email: str = None, reply_to: dict = None):
+    """
+    Sends an email using the Brevo API.
+    """
+    if not BREVO_API_KEY:
+        logger.warning("BREVO_API_KEY not set. Skipping email.")
+        return False
+
+    import requests
+
     try:
-        response = requests.post(BREVO_API_URL, json=payload, headers=headers, timeout=10)
-        response.raise_for_status()
-        logger.info(f"Email sent successfully to {to_email}. Message ID: {response.json().get('messageId')}")
+        message_id = deliver_via_brevo(to_email, subject, html_content, sender_name, sender_email, reply_to)
+        logger.info(f"Email sent successfully to {to_email}. Message ID: {message_id}")
         return True
     except requests.exceptions.RequestException as e:
         logger.error(f"Failed to send email via Brevo: {e}")
-        if e.response:
+        if e.response is not None:
             logger.error(f"Brevo Response: {e.response.text}")
         return False
 
-def send_contact_form_notification(name: str, email: str, message: str):
+def build_contact_form_notification(name: str, email: str, message: str):
     """
-    Sends a notification to the admin/support email when a contact form is submitted.
+    Builds the admin notification for a contact form submission.
+    Returns the send_email_via_brevo keyword arguments, or None if CONTACT_EMAIL is not set.
     """
     # Send to the configured generic contact email
     to_email = os.getenv("CONTACT_EMAIL")
     if not to_email:
         logger.warning("CONTACT_EMAIL not set. Cannot send notification.")
-        return False
+        return None
 
     subject = f"New Contact Message from {name}"
     
@@ -82,189 +103,69 @@ def send_contact_form_notification(name: str, email: str, message: str):
     
     # We send FROM the system address (SENDER_EMAIL) TO the admin address (to_email)
     # We set 'reply-to' as the user's email so the admin can reply directly.
-    return send_email_via_brevo(
-        to_email, 
-        subject, 
-        html_body, 
-        sender_name="Tronix365 Contact Form",
-        reply_to={"name": name, "email": email}
-    )
+    return {
+        "to_email": to_email,
+        "subject": subject,
+        "html_content": html_body,
+        "sender_name": "Tronix365 Contact Form",
+        "reply_to": {"name": name, "email": email}
+    }
+
+def send_contact_form_notification(name: str, email: str, message: str):
+    """
+    Sends a notification to the admin/support email when a contact form is submitted.
+    """
+    message_args = build_contact_form_notification(name, email, message)
+    if not message_args:
+        return False
+    return send_email_via_brevo(**message_args)
 
 def generate_order_confirmation_html(order, frontend_url: str):
     """
     Generates a premium Amazon-style HTML invoice for the order confirmation email.
     Assumes `order` is a SQLAlchemy OrderDB instance with a joined `.items` relationship
-    where each item has a `.product` relationship.
+    where each item has a `.product` relationship. Rendering and caching live in invoice_templates.py.
     """
-    date_str = order.created_at.strftime("%B %d, %Y") if hasattr(order.created_at, 'strftime') else str(order.created_at).split("T")[0]
-    
-    # Calculate totals
-    subtotal = sum(item.price_at_purchase * item.quantity for item in order.items)
-    gst = subtotal * 0.18
-    grand_total = subtotal + gst
-
-    # Generate item rows
-    item_rows = ""
-    for item in order.items:
-        # Fallback to a placeholder if image is missing
-        img_url = item.product.image if getattr(item.product, 'image', None) else "https://via.placeholder.com/80?text=TRONIX365"
-        # Ensure image is absolute URL if it's relative
-        if img_url.startswith('/'):
-            img_url = f"{frontend_url}{img_url}"
-            
-        item_rows += f"""
-        <tr>
-            <td style="padding: 15px; border-bottom: 1px solid #eee;">
-                <img src="{img_url}" alt="Product" style="width: 60px; height: 60px; object-fit: cover; border-radius: 8px; border: 1px solid #eee;" />
-            </td>
-            <td style="padding: 15px; border-bottom: 1px solid #eee; text-align: left;">
-                <p style="margin: 0; font-weight: bold; color: #333;">{item.product.title}</p>
-                <p style="margin: 5px 0 0; font-size: 13px; color: #666;">Qty: {item.quantity}</p>
-            </td>
-            <td style="padding: 15px; border-bottom: 1px solid #eee; text-align: right;">
-                <p style="margin: 0; font-weight: bold; color: #333;">₹{(item.price_at_purchase * item.quantity):,.2f}</p>
-            </td>
-        </tr>
-        """
+    return get_invoice_html(order, frontend_url)
 
-    order_url = f"{frontend_url}/order/{order.id}"
+def get_frontend_url():
+    frontend_url = os.getenv("FRONTEND_URL", "http://localhost:5173").rstrip('/')
+    if "tronix365.in" in frontend_url and "/e-commerse" not in frontend_url:
+        frontend_url = f"{frontend_url}/e-commerse"
+    return frontend_url
 
-    html_template = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    </head>
-    <body style="font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif; background-color: #f4f4f5; margin: 0; padding: 40px 20px; color: #333;">
-        
-        <table width="100%" cellpadding="0" cellspacing="0" style="max-width: 600px; margin: 0 auto; background-color: #ffffff; border-radius: 12px; overflow: hidden; box-shadow: 0 4px 6px rgba(0,0,0,0.05);">
-            <!-- Header -->
-            <tr>
-                <td style="background-color: #8b5cf6; padding: 40px 30px; text-align: center;">
-                    <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 800; letter-spacing: 1px;">TRONIX365</h1>
-                    <p style="color: #eaddff; margin: 10px 0 0; font-size: 16px;">Order Confirmation</p>
-                </td>
-            </tr>
-            
-            <!-- Welcome Message -->
-            <tr>
-                <td style="padding: 40px 30px 20px;">
-                    <h2 style="margin: 0 0 15px; font-size: 22px; color: #111827;">Hello {order.full_name},</h2>
-                    <p style="margin: 0; font-size: 16px; color: #4b5563; line-height: 1.5;">
-                        Thank you for shopping with Tronix365! We've received your order and are currently processing it. 
-                        Below are the details of your purchase.
-                    </p>
-                </td>
-            </tr>
-            
-            <!-- Order Details Box -->
-            <tr>
-                <td style="padding: 0 30px 20px;">
-                    <div style="background-color: #f8fafc; padding: 20px; border-radius: 8px; border: 1px solid #e2e8f0;">
-                        <table width="100%" cellpadding="0" cellspacing="0">
-                            <tr>
-                                <td style="padding-bottom: 10px;">
-                                    <span style="font-size: 13px; color: #64748b; text-transform: uppercase; font-weight: bold;">Order ID</span><br>
-                                    <span style="font-size: 16px; color: #0f172a; font-weight: bold;">#order_tronix_{order.id:04d}</span>
-                                </td>
-                                <td style="padding-bottom: 10px; text-align: right;">
-                                    <span style="font-size: 13px; color: #64748b; text-transform: uppercase; font-weight: bold;">Order Date</span><br>
-                                    <span style="font-size: 16px; color: #0f172a; font-weight: bold;">{date_str}</span>
-                                </td>
-                            </tr>
-                            <tr>
-                                <td colspan="2" style="padding-top: 10px; border-top: 1px solid #e2e8f0;">
-                                    <span style="font-size: 13px; color: #64748b; text-transform: uppercase; font-weight: bold;">Status</span><br>
-                                    <span style="display: inline-block; background-color: #dbeafe; color: #1e40af; padding: 4px 12px; border-radius: 9999px; font-size: 14px; font-weight: bold; margin-top: 4px; text-transform: capitalize;">{order.status}</span>
-                                </td>
-                            </tr>
-                        </table>
-                    </div>
-                </td>
-            </tr>
-            
-            <!-- Items Table -->
-            <tr>
-                <td style="padding: 0 30px;">
-                    <h3 style="margin: 0 0 15px; font-size: 18px; color: #111827; border-bottom: 2px solid #f1f5f9; padding-bottom: 10px;">Items Ordered</h3>
-                    <table width="100%" cellpadding="0" cellspacing="0" style="border-collapse: collapse;">
-                        {item_rows}
-                    </table>
-                </td>
-            </tr>
-            
-            <!-- Financial Summary -->
-            <tr>
-                <td style="padding: 30px;">
-                    <table width="100%" cellpadding="0" cellspacing="0">
-                        <tr>
-                            <td width="50%"></td>
-                            <td width="50%">
-                                <table width="100%" cellpadding="0" cellspacing="0" style="font-size: 15px; color: #4b5563;">
-                                    <tr>
-                                        <td style="padding-bottom: 10px;">Subtotal</td>
-                                        <td style="padding-bottom: 10px; text-align: right; color: #111827;">₹{subtotal:,.2f}</td>
-                                    </tr>
-                                    <tr>
-                                        <td style="padding-bottom: 10px;">Estimated GST (18%)</td>
-                                        <td style="padding-bottom: 10px; text-align: right; color: #111827;">₹{gst:,.2f}</td>
-                                    </tr>
-                                    <tr>
-                                        <td style="padding-top: 15px; padding-bottom: 5px; border-top: 2px solid #e2e8f0; font-weight: bold; font-size: 18px; color: #111827;">Grand Total</td>
-                                        <td style="padding-top: 15px; padding-bottom: 5px; border-top: 2px solid #e2e8f0; font-weight: bold; font-size: 18px; text-align: right; color: #8b5cf6;">₹{grand_total:,.2f}</td>
-                                    </tr>
-                                </table>
-                            </td>
-                        </tr>
-                    </table>
-                </td>
-            </tr>
-            
-            <!-- Call to Action -->
-            <tr>
-                <td style="padding: 10px 30px 40px; text-align: center;">
-                    <a href="{order_url}" style="display: inline-block; background-color: #8b5cf6; color: #ffffff; text-decoration: none; padding: 14px 32px; font-size: 16px; font-weight: bold; border-radius: 8px; box-shadow: 0 4px 6px rgba(139, 92, 246, 0.25);">Manage Your Order</a>
-                </td>
-            </tr>
-            
-            <!-- Footer -->
-            <tr>
-                <td style="background-color: #f8fafc; padding: 30px; text-align: center; border-top: 1px solid #e2e8f0;">
-                    <p style="margin: 0 0 10px; font-size: 14px; color: #64748b;">
-                        Need help? Reply to this email or contact our support team.
-                    </p>
-                    <p style="margin: 0; font-size: 12px; color: #94a3b8;">
-                        &copy; 2026 Tronix365. All rights reserved.<br>
-                        123 Innovation Park, Silicon Valley, India
-                    </p>
-                </td>
-            </tr>
-        </table>
-        
-    </body>
-    </html>
+def build_order_confirmation(order):
     """
-    return html_template
-
-def send_order_confirmation_email(order):
-    """
-    Orchestrates the HTML generation and email dispatch for a successful order.
-    Designed to be called via FastAPI BackgroundTasks.
+    Builds the HTML invoice email for an order.
+    Returns the send_email_via_brevo keyword arguments, or None if the order has no email.
     """
     to_email = order.customer_email
     if not to_email:
         logger.error("Order has no customer_email. Cannot send confirmation.")
-        return False
+        return None
         
-    frontend_url = os.getenv("FRONTEND_URL", "http://localhost:5173").rstrip('/')
-    if "tronix365.in" in frontend_url and "/e-commerse" not in frontend_url:
-        frontend_url = f"{frontend_url}/e-commerse"
+    frontend_url = get_frontend_url()
     
     subject = f"Order Confirmation - #order_tronix_{order.id:04d} from Tronix365"
     
     # Generate the pristine HTML payload
     html_content = generate_order_confirmation_html(order, frontend_url)
     
+    return {
+        "to_email": to_email,
+        "subject": subject,
+        "html_content": html_content,
+        "sender_name": "Tronix365 Orders"
+    }
+
+def send_order_confirmation_email(order):
+    """
+    Orchestrates the HTML generation and email dispatch for a successful order.
+    Sends immediately; the API enqueues through email_outbox.py instead.
+    """
+    message_args = build_order_confirmation(order)
+    if not message_args:
+        return False
+        
     # Dispatch using the Brevo hook
-    return send_email_via_brevo(to_email, subject, html_content, sender_name="Tronix365 Orders")
+    return send_email_via_brevo(**message_args)
@@ -0,0 +1,156 @@
+import time
+import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from database import SessionLocal
+from email_utils import deliver_via_brevo, get_http_session, BREVO_API_KEY
+from email_outbox import claim_batch, build_message, mark_sent, mark_failed, outbox_stats
+from metrics import EMAILS_PROCESSED, EMAIL_BATCH, serve as serve_metrics
+
+logger = logging.getLogger("email_worker")
+
+class WorkerMetrics:
+    """
+    Running totals for one worker process, logged after every batch. The same
+    counts are exported as email_worker_messages_total (see --metrics-port).
+    """
+    def __init__(self):
+        self.started = time.monotonic()
+        self.sent = 0
+        self.failed = 0
+        self.batches = 0
+
+    def throughput(self):
+        elapsed = time.monotonic() - self.started
+        return self.sent / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "batches": self.batches,
+            "throughput_per_second": round(self.throughput(), 2)
+        }
+
+def _is_retryable(error: requests.exceptions.RequestException):
+    # Client errors other than throttling will fail the same way on every retry
+    response = error.response
+    if response is None:
+        return True
+    return response.status_code == 429 or response.status_code >= 500
+
+def _deliver(message_args):
+    try:
+        deliver_via_brevo(**message_args)
+        return None
+    except requests.exceptions.RequestException as e:
+        detail = e.response.text if e.response is not None else ""
+        return (f"{e} {detail}".strip(), _is_retryable(e))
+    except Exception as e:
+        # Anything else (a bad payload, a bug) is retried with backoff until
+        # MAX_ATTEMPTS rather than losing the result for the whole batch
+        logger.exception("Unexpected error sending email")
+        return (f"{type(e).__name__}: {e}", True)
+
+def _record_failure(message, error, retryable, metrics):
+    mark_failed(message, error, retryable)
+    EMAILS_PROCESSED.inc(message.kind, "failed" if message.status == "failed" else "retry")
+    if metrics: metrics.failed += 1
+    logger.warning(f"Email {message.id} ({message.kind}) failed, attempt {message.attempts}: {error}")
+
+def process_batch(batch_size: int = 50, concurrency: int = 4, metrics: WorkerMetrics = None):
+    """
+    Claims one batch, sends it over the pooled session and records the outcome.
+    Returns the number of messages claimed.
+    """
+    db = SessionLocal()
+    try:
+        messages = claim_batch(db, batch_size)
+        if not messages:
+            return 0
+        started = time.perf_counter()
+
+        # Render in this thread (it needs the session), send in parallel. One
+        # message that cannot be rendered must not leave the rest in 'sending'.
+        prepared = []
+        for message in messages:
+            try:
+                message_args = build_message(db, message)
+            except Exception as e:
+                logger.exception(f"Email {message.id} could not be rendered")
+                _record_failure(message, f"{type(e).__name__}: {e}", True, metrics)
+                continue
+            if message_args is None:
+                _record_failure(message, "Message could not be rendered", False, metrics)
+            else:
+                prepared.append((message, message_args))
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(_deliver, [args for _, args in prepared]))
+
+        for (message, _), result in zip(prepared, results):
+            if result is None:
+                mark_sent(message)
+                EMAILS_PROCESSED.inc(message.kind, "sent")
+                if metrics: metrics.sent += 1
+            else:
+                _record_failure(message, *result, metrics)
+        db.commit()
+        EMAIL_BATCH.observe(time.perf_counter() - started)
+
+        if metrics:
+            metrics.batches += 1
+        return len(messages)
+    finally:
+        db.close()
+
+def run_worker(batch_size: int = 50, concurrency: int = 4, poll_interval: float = 2.0, once: bool = False, metrics_port: int = None):
+    if not BREVO_API_KEY:
+        logger.error("BREVO_API_KEY not set. Leaving messages queued.")
+        return None
+    if metrics_port:
+        serve_metrics(metrics_port)
+        logger.info(f"Metrics at http://0.0.0.0:{metrics_port}/metrics")
+
+    get_http_session(pool_size=concurrency)
+    metrics = WorkerMetrics()
+    logger.info(f"Email worker started (batch={batch_size}, concurrency={concurrency})")
+
+    while True:
+        try:
+            claimed = process_batch(batch_size, concurrency, metrics)
+        except Exception:
+            # E.g. the database is unreachable. Claimed rows stay 'sending' and are
+            # picked up again after STALE_LOCK_SECONDS; keep the worker alive.
+            logger.exception("Email batch failed")
+            time.sleep(poll_interval)
+            continue
+        if claimed:
+            db = SessionLocal()
+            try:
+                depth = outbox_stats(db)
+            finally:
+                db.close()
+            logger.info(f"Batch of {claimed}: {metrics.as_dict()} | queue: {depth}")
+        if once and not claimed:
+            return metrics
+        if not claimed:
+            time.sleep(poll_interval)
+
+if __name__ == "__main__":
+    import argparse
+    from database import engine, Base
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Deliver queued emails from the email_outbox table.")
+    parser.add_argument("--batch-size", type=int, default=50, help="Messages claimed per batch")
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel sends over the shared HTTP pool")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds to sleep when the queue is empty")
+    parser.add_argument("--once", action="store_true", help="Drain the queue and exit")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics (email_worker_messages_total, queue depth) on this port")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    metrics = run_worker(args.batch_size, args.concurrency, args.poll_interval, args.once, args.metrics_port)
+    if metrics:
+        print(f"Done: {metrics.as_dict()}")
@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, date
+from database import SessionLocal
+from models import OrderDB, OrderItemDB, ProductDB
+
+# Rows fetched per round trip from the server-side cursor
+FETCH_SIZE = 1000
+# Rows serialized before a chunk is handed to the response
+CHUNK_ROWS = 500
+
+ORDER_COLUMNS = [
+    "order_id", "created_at", "status", "customer_email", "full_name", "phone",
+    "address_line", "city", "state", "pincode", "txnid", "total_amount",
+    "product_id", "quantity", "price_at_purchase"
+]
+
+PRODUCT_COLUMNS = [
+    "id", "skv", "title", "category", "price", "mrp", "sale_price", "stock",
+    "image", "description", "features", "specs"
+]
+
+def _order_rows(db, start: date = None, end: date = None, status: str = None):
+    # One row per order line; column tuples skip the ORM identity map entirely
+    query = db.query(
+        OrderDB.id, OrderDB.created_at, OrderDB.status, OrderDB.customer_email,
+        OrderDB.full_name, OrderDB.phone, OrderDB.address_line, OrderDB.city,
+        OrderDB.state, OrderDB.pincode, OrderDB.txnid, OrderDB.total_amount,
+        OrderItemDB.product_id, OrderItemDB.quantity, OrderItemDB.price_at_purchase
+    ).outerjoin(OrderItemDB, OrderItemDB.order_id == OrderDB.id)
+
+    if start:
+        query = query.filter(OrderDB.created_at >= datetime.combine(start, datetime.min.time()))
+    if end:
+        query = query.filter(OrderDB.created_at <= datetime.combine(end, datetime.max.time()))
+    if status:
+        query = query.filter(OrderDB.status == status)
+
+    return query.order_by(OrderDB.id, OrderItemDB.id).yield_per(FETCH_SIZE)
+
+def _product_rows(db, category: str = None):
+    query = db.query(
+        ProductDB.id, ProductDB.skv, ProductDB.title, ProductDB.category,
+        ProductDB.price, ProductDB.mrp, ProductDB.sale_price, ProductDB.stock,
+        ProductDB.image, ProductDB.description, ProductDB.features, ProductDB.specs
+    )
+    if category and category != "All":
+        query = query.filter(ProductDB.category == category)
+    return query.order_by(ProductDB.id).yield_per(FETCH_SIZE)
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def _csv_value(value):
+    # Nested JSON (specs/features) is written as a JSON string cell
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return _plain(value)
+
+def _serialize(rows, columns, fmt: str):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+
+    if writer:
+        writer.writerow(columns)
+
+    pending = 0
+    for row in rows:
+        if writer:
+            writer.writerow([_csv_value(v) for v in row])
+        else:
+            buffer.write(json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False))
+            buffer.write("\n")
+        pending += 1
+        if pending >= CHUNK_ROWS:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+
+    tail = buffer.getvalue()
+    if tail:
+        yield tail.encode("utf-8")
+
+def _gzip(chunks):
+    # wbits=31 produces a gzip container rather than a raw zlib stream
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_export(kind: str, fmt: str = "csv", gzip: bool = False, **filters):
+    """
+    Generator of encoded export chunks for `kind` ('orders' or 'products').
+    Owns its session because it keeps running after the endpoint has returned;
+    the long scan reads from a replica when one is configured.
+    """
+    db = SessionLocal(info={"read_only": True})
+    try:
+        if kind == "orders":
+            rows, columns = _order_rows(db, **filters), ORDER_COLUMNS
+        else:
+            rows, columns = _product_rows(db, **filters), PRODUCT_COLUMNS
+
+        chunks = _serialize(rows, columns, fmt)
+        if gzip:
+            chunks = _gzip(chunks)
+        for chunk in chunks:
+            yield chunk
+    finally:
+        db.close()
+
+def export_headers(kind: str, fmt: str, gzip: bool):
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    filename = f"{kind}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{fmt}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+    return media_type, {"Content-Disposition": f'attachment; filename="{filename}"'}
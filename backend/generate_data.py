@@ -0,0 +1,336 @@
+import csv
+import io
+import json
+import random
+import time
+from array import array
+from bisect import bisect
+from itertools import accumulate
+from datetime import datetime, date, timedelta, timezone
+from sqlalchemy import func, text
+from database import SessionLocal, engine, Base
+from models import ProductDB, UserDB, OrderDB, OrderItemDB, ReviewDB, pricing_columns
+from rollups import backfill_rollups
+from review_stats import backfill_review_stats
+
+# Synthetic data for load testing. Every table draws from its own seeded RNG, so
+# the same --seed and counts always produce the same rows, and changing one count
+# does not reshuffle the others.
+
+IMAGES = [
+    "https://images.unsplash.com/photo-1553406830-ef2513450d76?auto=format&fit=crop&q=80&w=1000",
+    "https://images.unsplash.com/photo-1555617981-d52f6f55c2d7?auto=format&fit=crop&q=80&w=1000",
+    "https://images.unsplash.com/photo-1581092160562-40aa08e78837?auto=format&fit=crop&q=80&w=1000",
+    "https://images.unsplash.com/photo-1517077304055-6e89abbf09b0?auto=format&fit=crop&q=80&w=1000",
+]
+
+# category -> (product names, spec name -> possible values, typical price range)
+CATALOG = {
+    "Development Boards": (
+        ["Arduino Nano", "Arduino Mega 2560", "ESP32 DevKit", "STM32 Blue Pill", "Raspberry Pi Pico", "NodeMCU"],
+        {"Microcontroller": ["ATmega328P", "ATmega2560", "ESP32-WROOM", "STM32F103", "RP2040"], "Operating Voltage": ["3.3V", "5V"],
+         "Flash": ["32KB", "256KB", "2MB", "4MB", "16MB"], "Clock Speed": ["16MHz", "72MHz", "133MHz", "240MHz"]},
+        (150, 6000)),
+    "Sensors": (
+        ["Ultrasonic Sensor", "PIR Motion Sensor", "Soil Moisture Sensor", "DHT22 Humidity Sensor", "IR Obstacle Sensor", "Gas Sensor"],
+        {"Range": ["2cm - 400cm", "0 - 7m", "20% - 90% RH", "300 - 10000ppm"], "Voltage": ["3.3V", "5V", "3.3V - 5V"],
+         "Output": ["Digital", "Analog", "I2C", "PWM"]},
+        (40, 900)),
+    "Modules": (
+        ["Relay Module", "Bluetooth Module", "WiFi Module", "Motor Driver", "RTC Module", "SD Card Module"],
+        {"Channels": ["1", "2", "4", "8"], "Interface": ["UART", "SPI", "I2C", "GPIO"], "Voltage": ["3.3V", "5V", "12V"]},
+        (60, 1200)),
+    "Motors": (
+        ["DC Gear Motor", "Servo Motor", "Stepper Motor", "Vibration Motor", "BLDC Motor"],
+        {"Speed": ["10 RPM", "60 RPM", "100 RPM", "300 RPM", "1000 RPM"], "Voltage": ["3V", "6V", "12V", "24V"],
+         "Torque": ["1.5 kg-cm", "2.5 kg-cm", "10 kg-cm"]},
+        (50, 2500)),
+    "Displays": (
+        ["16x2 LCD", "20x4 LCD", "OLED Display", "TFT Touch Display", "7 Segment Display"],
+        {"Size": ["0.96 inch", "1.3 inch", "2.4 inch", "3.5 inch"], "Interface": ["I2C", "SPI", "Parallel"], "Color": ["Blue", "Green", "White", "RGB"]},
+        (80, 2200)),
+    "Battery": (
+        ["Li-Po Battery", "18650 Cell", "9V Battery", "Battery Holder", "Li-ion Pack"],
+        {"Capacity": ["500mAh", "1000mAh", "2200mAh", "5000mAh"], "Voltage": ["3.7V", "7.4V", "9V", "11.1V"], "Chemistry": ["Li-Po", "Li-ion", "NiMH"]},
+        (30, 3000)),
+    "Components": (
+        ["Resistor Kit", "Capacitor Kit", "LED Pack", "IC Socket", "Jumper Wires", "Breadboard"],
+        {"Pieces": ["10", "40", "100", "500"], "Tolerance": ["1%", "5%", "10%"], "Package": ["THT", "SMD"]},
+        (10, 600)),
+}
+CATEGORIES = list(CATALOG)
+VARIANTS = ["", "Pro", "Mini", "V2", "Plus", "Lite", "HD", "Max"]
+FIRST_NAMES = ["Aarav", "Vivaan", "Aditya", "Diya", "Ananya", "Ishaan", "Kavya", "Rohan", "Sneha", "Priya", "Arjun", "Meera", "Kabir", "Nisha", "Rahul", "Pooja"]
+LAST_NAMES = ["Sharma", "Patel", "Reddy", "Iyer", "Khan", "Gupta", "Nair", "Das", "Joshi", "Mehta", "Rao", "Singh"]
+CITIES = [("Mumbai", "Maharashtra", "400001"), ("Pune", "Maharashtra", "411001"), ("Bengaluru", "Karnataka", "560001"),
+          ("Chennai", "Tamil Nadu", "600001"), ("Delhi", "Delhi", "110001"), ("Hyderabad", "Telangana", "500001")]
+ORDER_STATUSES = ["confirmed", "pending", "failed"]
+ORDER_STATUS_WEIGHTS = [70, 20, 10]
+RATING_WEIGHTS = [5, 7, 13, 30, 45] # 1..5 stars, skewed positive like real shops
+REVIEW_COMMENTS = ["Works as expected.", "Good quality for the price.", "Fast delivery, well packed.", "Stopped working after a week.",
+                   "Exactly as described.", "Documentation could be better.", "Great for beginners.", "Would buy again."]
+
+def user_name(i):
+    return f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]}"
+
+def user_email(i):
+    return f"loaduser{i}@example.com"
+
+def zipf_cum_weights(n, s=1.1):
+    # Rank 1 is bought/reviewed most; a handful of products dominate like a real catalog
+    return list(accumulate(1.0 / (rank ** s) for rank in range(1, n + 1)))
+
+class BulkWriter:
+    """
+    Writes row dicts with COPY on PostgreSQL and executemany on SQLite.
+    """
+    def __init__(self, engine):
+        self.engine = engine
+        self.is_postgres = engine.dialect.name == "postgresql"
+
+    def write(self, table, rows):
+        if not rows:
+            return
+        if self.is_postgres:
+            self._copy(table, rows)
+        else:
+            with self.engine.begin() as conn:
+                conn.execute(table.insert(), rows)
+
+    def _copy(self, table, rows):
+        columns = list(rows[0])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            # Empty unquoted CSV fields are NULL to COPY; the generator never emits ''
+            writer.writerow([
+                json.dumps(v) if isinstance(v, (dict, list)) else (v.isoformat() if isinstance(v, datetime) else ("" if v is None else v))
+                for v in (row[c] for c in columns)
+            ])
+        buffer.seek(0)
+        raw = self.engine.raw_connection()
+        try:
+            with raw.cursor() as cur:
+                cur.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+            raw.commit()
+        finally:
+            raw.close()
+
+    def reset_sequences(self, tables):
+        # Rows were written with explicit ids, so move each SERIAL past them
+        if not self.is_postgres:
+            return
+        with self.engine.begin() as conn:
+            for table in tables:
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), COALESCE((SELECT MAX(id) FROM {table.name}), 1))"
+                ))
+
+def next_id(db, model):
+    return (db.query(func.max(model.id)).scalar() or 0) + 1
+
+def generate_products(writer, rng, count, start_id, batch_size):
+    """
+    Writes `count` products and returns their (ids, prices) for the order
+    generator; the price is sale_price falling back to price, as in create_order.
+    """
+    ids = array("l")
+    prices = array("d")
+    batch = []
+    for n in range(count):
+        product_id = start_id + n
+        category = rng.choice(CATEGORIES)
+        names, spec_values, (low, high) = CATALOG[category]
+        name = f"{rng.choice(names)} {rng.choice(VARIANTS)}".strip()
+        specs = {key: rng.choice(values) for key, values in spec_values.items() if rng.random() < 0.85}
+        features = [f"{key}: {value}" for key, value in specs.items()] + rng.sample(
+            ["Breadboard friendly", "Tested before dispatch", "Arduino compatible", "RoHS compliant", "Onboard LED indicator"], 2)
+
+        mrp = round(rng.uniform(low, high), 0)
+        discount = rng.choice([0, 0, 0.05, 0.1, 0.15, 0.2, 0.3, 0.5])
+        # Same shape as seed.py: price is what the shop charges, mrp is the struck-through price
+        sale_price = round(mrp * (1 - discount), 0)
+        price = sale_price
+        row = {
+            "id": product_id,
+            "skv": f"SYN-{product_id:08d}",
+            "title": f"{name} #{product_id}",
+            "description": f"{name} for {category.lower()} projects. Synthetic load-test item.",
+            "price": price,
+            "mrp": mrp,
+            "sale_price": sale_price,
+            "category": category,
+            "image": rng.choice(IMAGES),
+            "specs": specs,
+            "features": features,
+            "stock": rng.randint(0, 500),
+        }
+        row.update(pricing_columns(row)) # COPY/executemany bypass the ORM hook
+        batch.append(row)
+        ids.append(product_id)
+        prices.append(sale_price or price)
+        if len(batch) >= batch_size:
+            writer.write(ProductDB.__table__, batch)
+            batch = []
+    writer.write(ProductDB.__table__, batch)
+    return ids, prices
+
+def generate_users(writer, count, start_id, batch_size):
+    from auth import get_password_hash
+
+    # One hash for every synthetic user: hashing a million passwords would take hours.
+    # They all log in with "password"; only this salted hash differs between runs.
+    hashed_password = get_password_hash("password")
+    batch = []
+    for n in range(count):
+        batch.append({
+            "id": start_id + n,
+            "email": user_email(start_id + n),
+            "hashed_password": hashed_password,
+            "full_name": user_name(start_id + n),
+            "role": "user",
+            "is_active": True,
+            "is_2fa_enabled": False,
+        })
+        if len(batch) >= batch_size:
+            writer.write(UserDB.__table__, batch)
+            batch = []
+    writer.write(UserDB.__table__, batch)
+
+def generate_orders(writer, rng, count, start_id, item_start_id, product_ids, prices, user_ids, end, days, batch_size, seed):
+    cum_weights = zipf_cum_weights(len(product_ids))
+    total_weight = cum_weights[-1]
+    # Popularity rank -> product, so the best sellers are spread over the id range
+    ranked = list(range(len(product_ids)))
+    rng.shuffle(ranked)
+    item_id = item_start_id
+    orders, items = [], []
+
+    for n in range(count):
+        order_id = start_id + n
+        if user_ids:
+            uid = user_ids[rng.randrange(len(user_ids))]
+            email, full_name = user_email(uid), user_name(uid)
+        else:
+            email, full_name = f"guest{order_id}@example.com", user_name(order_id)
+        city, state, pincode = rng.choice(CITIES)
+
+        total = 0.0
+        for _ in range(rng.choices([1, 2, 3, 4], [50, 30, 15, 5])[0]):
+            index = ranked[bisect(cum_weights, rng.random() * total_weight)]
+            quantity = rng.choices([1, 2, 3], [75, 20, 5])[0]
+            items.append({"id": item_id, "order_id": order_id, "product_id": product_ids[index],
+                          "quantity": quantity, "price_at_purchase": prices[index]})
+            total += prices[index] * quantity
+            item_id += 1
+
+        orders.append({
+            "id": order_id,
+            "customer_email": email,
+            "total_amount": round(total, 2),
+            "status": rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0],
+            "created_at": end - timedelta(seconds=rng.randrange(days * 86400)),
+            "txnid": f"SYN{seed}-{order_id}",
+            "full_name": full_name,
+            "phone": f"9{rng.randrange(10 ** 9):09d}",
+            "address_line": f"{rng.randint(1, 999)} Main Road",
+            "city": city,
+            "state": state,
+            "pincode": pincode,
+        })
+        if len(orders) >= batch_size:
+            writer.write(OrderDB.__table__, orders)
+            writer.write(OrderItemDB.__table__, items)
+            orders, items = [], []
+    writer.write(OrderDB.__table__, orders)
+    writer.write(OrderItemDB.__table__, items)
+    return item_id - item_start_id
+
+def generate_reviews(writer, rng, count, start_id, product_ids, user_ids, end, days, batch_size):
+    cum_weights = zipf_cum_weights(len(product_ids))
+    total_weight = cum_weights[-1]
+    ranked = list(range(len(product_ids)))
+    rng.shuffle(ranked)
+    batch = []
+    for n in range(count):
+        uid = user_ids[rng.randrange(len(user_ids))]
+        batch.append({
+            "id": start_id + n,
+            "product_id": product_ids[ranked[bisect(cum_weights, rng.random() * total_weight)]],
+            "user_id": uid,
+            "user_email": user_email(uid),
+            "user_name": user_name(uid),
+            "rating": rng.choices([1, 2, 3, 4, 5], RATING_WEIGHTS)[0],
+            "comment": rng.choice(REVIEW_COMMENTS),
+            "created_at": (end - timedelta(seconds=rng.randrange(days * 86400))).isoformat(),
+        })
+        if len(batch) >= batch_size:
+            writer.write(ReviewDB.__table__, batch)
+            batch = []
+    writer.write(ReviewDB.__table__, batch)
+
+def generate(products=1000, users=100, orders=1000, reviews=1000, seed=42, days=365, batch_size=5000, end=None):
+    """
+    Appends synthetic rows after whatever is already in the database.
+    Orders and reviews pick from the products generated in this run, or from
+    the existing catalog when products=0. Dates are spread over the `days` before
+    `end` (default: today at midnight UTC), so a run is reproducible within a day.
+    """
+    end = end or datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    Base.metadata.create_all(bind=engine)
+    writer = BulkWriter(engine)
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        if products:
+            product_ids, prices = generate_products(writer, random.Random(f"{seed}-products"), products, next_id(db, ProductDB), batch_size)
+        else:
+            rows = db.query(ProductDB.id, ProductDB.sale_price, ProductDB.price).order_by(ProductDB.id).all()
+            product_ids = array("l", (row.id for row in rows))
+            prices = array("d", (row.sale_price or row.price or 0.0 for row in rows))
+        print(f"Products: {products} written ({time.perf_counter() - started:.1f}s)")
+
+        user_ids = []
+        if users:
+            start = next_id(db, UserDB)
+            generate_users(writer, users, start, batch_size)
+            user_ids = range(start, start + users)
+        print(f"Users: {users} written ({time.perf_counter() - started:.1f}s)")
+
+        if orders and product_ids:
+            item_count = generate_orders(writer, random.Random(f"{seed}-orders"), orders, next_id(db, OrderDB), next_id(db, OrderItemDB),
+                                         product_ids, prices, user_ids, end, days, batch_size, seed)
+            print(f"Orders: {orders} written with {item_count} items ({time.perf_counter() - started:.1f}s)")
+
+        if reviews and product_ids and user_ids:
+            generate_reviews(writer, random.Random(f"{seed}-reviews"), reviews, next_id(db, ReviewDB), product_ids, user_ids, end, days, batch_size)
+            print(f"Reviews: {reviews} written ({time.perf_counter() - started:.1f}s)")
+        elif reviews:
+            print("Reviews skipped: they need generated users (--users) and at least one product.")
+
+        writer.reset_sequences([ProductDB.__table__, UserDB.__table__, OrderDB.__table__, OrderItemDB.__table__, ReviewDB.__table__])
+        # Rows bypassed the ORM hooks, so rebuild the dashboard rollups from scratch
+        backfill_rollups(db)
+        if reviews:
+            backfill_review_stats(db)
+        print(f"Done in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate synthetic products, users, orders and reviews for load testing.")
+    parser.add_argument("--products", type=int, default=1000000, help="Products to generate (0 reuses the existing catalog)")
+    parser.add_argument("--users", type=int, default=50000, help="Users to generate")
+    parser.add_argument("--orders", type=int, default=200000, help="Orders to generate, 1-4 items each")
+    parser.add_argument("--reviews", type=int, default=300000, help="Reviews to generate")
+    parser.add_argument("--seed", type=int, default=42, help="Same seed and counts give the same rows")
+    parser.add_argument("--days", type=int, default=365, help="Spread order and review dates over this many past days")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=None, help="Latest order/review date, YYYY-MM-DD (default today)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per INSERT/COPY batch")
+    args = parser.parse_args()
+
+    print(f"Generating into {engine.url.render_as_string(hide_password=True)}...")
+    end = datetime.combine(args.end_date, datetime.min.time(), tzinfo=timezone.utc) if args.end_date else None
+    generate(args.products, args.users, args.orders, args.reviews, args.seed, args.days, args.batch_size, end)
@@ -0,0 +1,119 @@
+import os
+import asyncio
+import logging
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+
+UPLOAD_DIR = "uploads"
+VARIANT_DIR = os.path.join(UPLOAD_DIR, "variants")
+
+# Fixed widths served to the frontend; never upscaled past the original
+VARIANT_WIDTHS = {"thumb": 160, "card": 400, "detail": 800}
+VARIANT_FORMATS = {"webp": {"format": "WEBP", "quality": 80, "method": 4}, "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True}}
+RASTER_EXTENSIONS = {"jpg", "jpeg", "png", "webp", "gif", "bmp"}
+
+logger = logging.getLogger(__name__)
+
+# Pillow releases the GIL while decoding, resizing and encoding, so threads scale across cores
+_pool = None
+
+def get_image_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 2), thread_name_prefix="image")
+    return _pool
+
+def is_raster(filename: str):
+    return filename.rsplit(".", 1)[-1].lower() in RASTER_EXTENSIONS
+
+def variant_path(stem: str, name: str, fmt: str):
+    return os.path.join(VARIANT_DIR, f"{stem}-{name}.{fmt}")
+
+def variant_url(stem: str, name: str, fmt: str):
+    return f"/uploads/variants/{stem}-{name}.{fmt}"
+
+def _render_size(source_path: str, stem: str, name: str, width: int):
+    """
+    Decodes the source once and writes one width in every variant format.
+    Runs on the image pool.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as im:
+        # Let the JPEG decoder downscale by a power of two before we resample
+        im.draft("RGB", (width, width * 4))
+        im = ImageOps.exif_transpose(im)
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if "transparency" in im.info else "RGB")
+        if im.width > width:
+            height = max(1, round(im.height * width / im.width))
+            im = im.resize((width, height), Image.LANCZOS)
+
+        urls = {}
+        for fmt, options in VARIANT_FORMATS.items():
+            out = im
+            if fmt == "jpeg" and out.mode != "RGB":
+                # JPEG has no alpha channel; flatten onto white
+                background = Image.new("RGB", out.size, (255, 255, 255))
+                background.paste(out, mask=out.getchannel("A") if out.mode == "RGBA" else None)
+                out = background
+            out.save(variant_path(stem, name, fmt), **options)
+            urls[fmt] = variant_url(stem, name, fmt)
+        return name, {"width": im.width, **urls}
+
+def generate_variants(source_path: str, stem: str):
+    """
+    Generates every configured width in WebP and JPEG for an uploaded image.
+    Returns {"thumb": {"width": 160, "webp": url, "jpeg": url}, ...}, or None for
+    files Pillow cannot handle (e.g. SVG).
+    """
+    if not is_raster(source_path):
+        return None
+    os.makedirs(VARIANT_DIR, exist_ok=True)
+    pool = get_image_pool()
+    futures = [pool.submit(_render_size, source_path, stem, name, width) for name, width in VARIANT_WIDTHS.items()]
+    try:
+        return dict(f.result() for f in futures)
+    except Exception as e:
+        logger.warning("Image variant generation failed for %s: %s", source_path, e)
+        return None
+
+async def generate_variants_async(source_path: str, stem: str):
+    if not is_raster(source_path):
+        return None
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, generate_variants, source_path, stem)
+
+def variants_for_url(url: str):
+    """
+    Finds previously generated variants for an /uploads/ URL, so products
+    pointing at an uploaded image pick them up without a second request.
+    """
+    if not url or not url.startswith("/uploads/") or url.startswith("/uploads/variants/"):
+        return None
+    from PIL import Image
+
+    stem = os.path.splitext(os.path.basename(url))[0]
+    variants = {}
+    for name in VARIANT_WIDTHS:
+        if not all(os.path.exists(variant_path(stem, name, fmt)) for fmt in VARIANT_FORMATS):
+            return None
+        # Opening only parses the header, so this is cheap
+        with Image.open(variant_path(stem, name, "webp")) as im:
+            width = im.width
+        variants[name] = {"width": width, **{fmt: variant_url(stem, name, fmt) for fmt in VARIANT_FORMATS}}
+    return variants
+
+def build_srcset(variants: dict, fmt: str = "webp"):
+    """
+    'url 160w, url 400w, url 800w' for an <img srcset>, smallest first.
+    """
+    if not variants:
+        return None
+    entries = []
+    for name, width in VARIANT_WIDTHS.items():
+        variant = variants.get(name)
+        if variant and variant.get(fmt):
+            # srcset is whitespace/comma separated, so names with spaces must be escaped
+            entries.append(f"{quote(variant[fmt])} {variant.get('width', width)}w")
+    return ", ".join(entries) or None
@@ -1,21 +1,30 @@
 import csv
 import sys
 import os
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine, Base
-from models import ProductDB
+from sqlalchemy import update
+from database import SessionLocal, engine, Base, dialect_insert
+from models import ProductDB, PRICING_COLUMNS, pricing_columns
+from rollups import bump_counter, backfill_rollups
+from storage_utils import ComponentImages
 
 # Ensure tables exist
 Base.metadata.create_all(bind=engine)
 
-def import_products(csv_file_path, reset=False):
+# Rows written per transaction
+CHUNK_SIZE = 500
+PLACEHOLDER_IMAGE = "https://via.placeholder.com/400x400?text=No+Image"
+IMPORT_COLUMNS = ("id", "skv", "title", "category", "description", "image", "price", "mrp", "sale_price", "stock", "features", "specs")
+
+def import_products(csv_file_path, reset=False, chunk_size=CHUNK_SIZE, dry_run=False):
     db = SessionLocal()
     try:
         if not os.path.exists(csv_file_path):
             print(f"Error: File not found at {csv_file_path}")
             return
 
-        if reset:
+        if reset and dry_run:
+            print("Dry run with --reset: diffing against an empty catalog, nothing is wiped.")
+        elif reset:
             print("Reset mode enabled. Wiping products table...")
             # Check for existing orders
             from models import OrderItemDB, OrderDB, ReviewDB
@@ -39,160 +48,366 @@ def import_products(csv_file_path, reset=False):
                 db.execute(text("TRUNCATE TABLE order_items, orders, reviews, products RESTART IDENTITY CASCADE"))
             
             db.commit()
+            # Orders are gone too, so rebuild the dashboard rollups from scratch
+            backfill_rollups(db)
             print("Products and associated data wiped successfully. IDs reset to 1.\n")
 
-        # Try common encodings to handle different CSV sources (Excel/Windows)
-        encodings = ['utf-8-sig', 'cp1252', 'latin-1']
-        csvfile = None
-        
-        for encoding in encodings:
-            try:
-                # Open with the current encoding trial
-                temp_file = open(csv_file_path, mode='r', encoding=encoding)
-                # Try reading a few lines to verify encoding
-                temp_file.read(1024)
-                temp_file.seek(0)
-                csvfile = temp_file
-                print(f"Detected encoding: {encoding}")
-                break
-            except (UnicodeDecodeError, PermissionError):
-                if 'temp_file' in locals() and temp_file:
-                    temp_file.close()
-                continue
-        
+        csvfile = open_csv(csv_file_path)
         if not csvfile:
             print(f"Error: Could not decode the file with any common encoding (UTF-8, CP1252). Please ensure it is saved as a standard CSV.")
             return
 
-        with csvfile:
-            reader = csv.DictReader(csvfile)
-            
-            count = 0
-            updated = 0
-            
-            rows = list(reader)
-            print(f"Total rows to process: {len(rows)}")
-
-            for row in rows:
-                # Clean row: lower case keys, strip values
-                row = {str(k).strip().lower(): str(v).strip() for k, v in row.items() if k}
-                
-                # 1. Identity Fields
-                row_id = row.get('id', '')
-                skv = row.get('skv', '')
-                title = row.get('title', '')
-                
-                if not any([row_id, skv, title]):
-                    continue
-
-                try:
-                    # 2. Find Existing Product (ID > SKV > Title)
-                    existing_product = None
-                    if row_id and row_id.isdigit():
-                        existing_product = db.get(ProductDB, int(row_id))
-                    
-                    if not existing_product and skv:
-                        existing_product = db.query(ProductDB).filter(ProductDB.skv == skv).first()
-                    
-                    if not existing_product and title:
-                        existing_product = db.query(ProductDB).filter(ProductDB.title == title).first()
-
-                    # 3. Process Image
-                    image_val = row.get('image', '')
-                    final_image_path = "https://via.placeholder.com/400x400?text=No+Image"
-                    
-                    if image_val:
-                        if image_val.startswith('http'):
-                            final_image_path = image_val
-                        else:
-                            # Search in components folder
-                            import shutil
-                            source_path = None
-                            # Possible extensions in components folder
-                            for ext in ['', '.jpeg', '.jpg', '.png']:
-                                test_path = os.path.join("components", image_val + ext)
-                                if os.path.exists(test_path) and os.path.isfile(test_path):
-                                    source_path = test_path
-                                    break
-                            
-                            if source_path:
-                                filename = os.path.basename(source_path)
-                                dest_path = os.path.join("uploads", filename)
-                                os.makedirs("uploads", exist_ok=True)
-                                shutil.copy2(source_path, dest_path)
-                                final_image_path = f"/uploads/{filename}"
-                            else:
-                                if existing_product:
-                                    final_image_path = existing_product.image
-                                else:
-                                    final_image_path = "https://via.placeholder.com/400x400?text=No+Image"
-
-                    # 4. Handle Updates or Creation
-                    if existing_product:
-                        # Only update if field is provided and NOT empty
-                        if title: existing_product.title = title
-                        if row.get('category'): existing_product.category = row['category']
-                        if row.get('description'): existing_product.description = row['description']
-                        if final_image_path: existing_product.image = final_image_path
-                        if skv: existing_product.skv = skv
-                        
-                        # Resilient Numeric Parsing
-                        if row.get('price'): existing_product.price = clean_float(row['price'], existing_product.price)
-                        if row.get('mrp'): existing_product.mrp = clean_float(row['mrp'], existing_product.mrp)
-                        if row.get('sale_price'): 
-                            existing_product.sale_price = clean_float(row['sale_price'], existing_product.sale_price)
-
-                        # Default Sale Price to 200 if it's missing/0 OR if main Price is missing/0
-                        if (not existing_product.sale_price or existing_product.sale_price == 0 or 
-                            not existing_product.price or existing_product.price == 0):
-                            existing_product.sale_price = 200.0
-                        # Force Stock to 100 regardless of CSV
-                        existing_product.stock = 100
-                        
-                        # Complex fields
-                        features_raw = row.get('features')
-                        if features_raw: existing_product.features = parse_list(features_raw)
-                        
-                        specs_raw = row.get('specs')
-                        if specs_raw: existing_product.specs = parse_dict(specs_raw)
-                        
-                        db.commit()
-                        updated += 1
-                    else:
-                        new_product = ProductDB(
-                            skv=skv or None,
-                            title=title or "Unnamed Product",
-                            category=row.get('category', 'Uncategorized'),
-                            price=clean_float(row.get('price'), 0.0),
-                            mrp=clean_float(row.get('mrp'), None),
-                            sale_price=clean_float(row.get('sale_price'), 0.0), # Temporary parse
-                            stock=100,
-                            description=row.get('description', ''),
-                            image=final_image_path,
-                            features=parse_list(row.get('features', '')),
-                            specs=parse_dict(row.get('specs', ''))
-                        )
-                        # Post-init fallback check
-                        if not new_product.sale_price or new_product.sale_price == 0 or not new_product.price or new_product.price == 0:
-                            new_product.sale_price = 200.0
-                            
-                        db.add(new_product)
-                        db.commit()
-                        count += 1
-                        print(f"  + Created: {new_product.title}")
-
-                except Exception as row_error:
-                    db.rollback()
-                    error_msg = str(row_error).split('\n')[0] # Get first line of error
-                    print(f"  ! Error on row '{title or skv}': {error_msg}")
-            
-            print(f"\nFinished! Created {count} new products and updated {updated} existing products.")
+        with csvfile, ComponentImages(db, dry_run=dry_run) as images:
+            index = CatalogIndex([]) if reset and dry_run else CatalogIndex.load(db)
+            print(f"Loaded {len(index.by_id)} existing products into the import index.")
+            batch = (DryRunBatch if dry_run else ImportBatch)(db, index)
+
+            for chunk in read_chunks(csvfile, chunk_size):
+                # Hash/copy every image the chunk needs in parallel, before any row is matched
+                urls = images.resolve(row.get('image', '') for _, row in chunk)
+                db.commit()
+
+                for line_no, row in chunk:
+                    row_id = row.get('id', '')
+                    skv = row.get('skv', '')
+                    title = row.get('title', '')
+
+                    if not any([row_id, skv, title]):
+                        continue
+
+                    try:
+                        # Find Existing Product (ID > SKV > Title) without touching the database
+                        existing_product = index.find(row_id, skv, title)
+                        final_image_path = resolve_image(row.get('image', ''), urls, existing_product)
+                        batch.add(line_no, row, existing_product, final_image_path)
+                    except Exception as row_error:
+                        batch.errors.append((line_no, title or skv, str(row_error).split('\n')[0]))
+
+                batch.flush()
+
+            if dry_run:
+                diff = batch.report()
+                print("Dry run, nothing written. Would create {created}, update {updated}, leave {unchanged} unchanged; {errors} errors.".format(**diff["summary"]))
+                return diff
+
+            for line_no, label, error_msg in batch.errors:
+                print(f"  ! Error on line {line_no} '{label}': {error_msg}")
+            print(f"\nFinished! Created {batch.created} new products, updated {batch.updated} existing products "
+                  f"and left {batch.unchanged} unchanged ({len(batch.errors)} errors).")
+            print(f"Images: {images.hashed} hashed, {images.copied} copied into uploads/.")
+            return batch
 
     except Exception as e:
         print(f"A critical error occurred: {e}")
     finally:
         db.close()
 
+def open_csv(csv_file_path):
+    # Try common encodings to handle different CSV sources (Excel/Windows)
+    for encoding in ['utf-8-sig', 'cp1252', 'latin-1']:
+        temp_file = None
+        try:
+            temp_file = open(csv_file_path, mode='r', encoding=encoding, newline='')
+            # Try reading a few lines to verify encoding
+            temp_file.read(1024)
+            temp_file.seek(0)
+            print(f"Detected encoding: {encoding}")
+            return temp_file
+        except (UnicodeDecodeError, PermissionError):
+            if temp_file:
+                temp_file.close()
+    return None
+
+def read_rows(csvfile):
+    """
+    Streams (line number, cleaned row) pairs; the file is never held in memory.
+    """
+    reader = csv.DictReader(csvfile)
+    for row in reader:
+        # Clean row: lower case keys, strip values
+        yield reader.line_num, {str(k).strip().lower(): str(v).strip() for k, v in row.items() if k and v is not None}
+
+def read_chunks(csvfile, chunk_size):
+    chunk = []
+    for item in read_rows(csvfile):
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def resolve_image(image_val, urls, existing_product):
+    """
+    `urls` maps image names already stored from components/ (see ComponentImages).
+    """
+    if not image_val:
+        return PLACEHOLDER_IMAGE
+    if image_val.startswith('http'):
+        return image_val
+    if image_val in urls:
+        return urls[image_val]
+    if existing_product:
+        return existing_product["image"]
+    return PLACEHOLDER_IMAGE
+
+def build_product_values(row, existing_product, final_image_path):
+    """
+    The full column values a CSV row leaves a product with. Existing products only
+    take fields that are provided and non-empty; new products get the defaults.
+    """
+    skv = row.get('skv', '')
+    title = row.get('title', '')
+
+    if existing_product:
+        values = {column: existing_product[column] for column in IMPORT_COLUMNS}
+        if title: values["title"] = title
+        if row.get('category'): values["category"] = row['category']
+        if row.get('description'): values["description"] = row['description']
+        if final_image_path: values["image"] = final_image_path
+        if skv: values["skv"] = skv
+
+        # Resilient Numeric Parsing
+        if row.get('price'): values["price"] = clean_float(row['price'], values["price"])
+        if row.get('mrp'): values["mrp"] = clean_float(row['mrp'], values["mrp"])
+        if row.get('sale_price'): values["sale_price"] = clean_float(row['sale_price'], values["sale_price"])
+
+        # Complex fields
+        if row.get('features'): values["features"] = parse_list(row['features'])
+        if row.get('specs'): values["specs"] = parse_dict(row['specs'])
+    else:
+        values = {
+            "id": None,
+            "skv": skv or None,
+            "title": title or "Unnamed Product",
+            "category": row.get('category', 'Uncategorized'),
+            "price": clean_float(row.get('price'), 0.0),
+            "mrp": clean_float(row.get('mrp'), None),
+            "sale_price": clean_float(row.get('sale_price'), 0.0),
+            "description": row.get('description', ''),
+            "image": final_image_path,
+            "features": parse_list(row.get('features', '')),
+            "specs": parse_dict(row.get('specs', ''))
+        }
+
+    # Default Sale Price to 200 if it's missing/0 OR if main Price is missing/0
+    if not values["sale_price"] or not values["price"]:
+        values["sale_price"] = 200.0
+    # Force Stock to 100 regardless of CSV
+    values["stock"] = 100
+    return values
+
+class CatalogIndex:
+    """
+    Import-relevant columns of every product, keyed by id, skv and title.
+    Loaded with a single query so matching rows never goes back to the database.
+    """
+    def __init__(self, products):
+        self.by_id, self.by_skv, self.by_title = {}, {}, {}
+        for product in products:
+            self.add(product)
+
+    @classmethod
+    def load(cls, db):
+        columns = [getattr(ProductDB, column) for column in IMPORT_COLUMNS]
+        return cls(dict(zip(IMPORT_COLUMNS, row)) for row in db.query(*columns).order_by(ProductDB.id))
+
+    def find(self, row_id, skv, title):
+        product = None
+        if row_id and row_id.isdigit():
+            product = self.by_id.get(int(row_id))
+        if not product and skv:
+            product = self.by_skv.get(skv)
+        if not product and title:
+            product = self.by_title.get(title)
+        return product
+
+    def add(self, product):
+        if product["id"] is not None:
+            self.by_id[product["id"]] = product
+        if product["skv"]:
+            self.by_skv[product["skv"]] = product
+        # First product with a title wins, like the old .first() lookup
+        if product["title"]:
+            self.by_title.setdefault(product["title"], product)
+
+    def remove(self, product):
+        for mapping, key in ((self.by_id, product["id"]), (self.by_skv, product["skv"]), (self.by_title, product["title"])):
+            if key is not None and mapping.get(key) is product:
+                del mapping[key]
+
+    def replace(self, product, values):
+        self.remove(product)
+        product.update(values)
+        self.add(product)
+
+class ImportBatch:
+    """
+    Collects a chunk of creates and updates and writes it in one transaction:
+    one multi-row INSERT ... ON CONFLICT (skv) DO UPDATE plus one executemany UPDATE.
+    If the chunk fails, it is replayed row by row under savepoints so a single bad
+    row is reported instead of losing its neighbours.
+    """
+    def __init__(self, db, index):
+        self.db = db
+        self.index = index
+        self.creates = []  # index entries without an id yet
+        self.updates = {}  # id -> index entry
+        self.snapshots = {}  # id -> committed values, for undoing a failed row
+        self.lines = {}  # id(entry) -> CSV line numbers that touched it
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []
+
+    def add(self, line_no, row, existing_product, final_image_path):
+        values = build_product_values(row, existing_product, final_image_path)
+        owner = self.index.by_skv.get(values["skv"]) if values["skv"] else None
+        if owner is not None and owner is not existing_product:
+            # Would hit the unique constraint; reject it here so the rest of the chunk stays valid
+            raise ValueError(f"SKV '{values['skv']}' already belongs to product {owner['id'] or owner['title']}")
+        if existing_product is None:
+            self.index.add(values)
+            self.creates.append(values)
+        elif existing_product["id"] is None:
+            # Same product appeared earlier in this chunk; merge into the pending insert
+            self.index.replace(existing_product, values)
+        elif all(existing_product[column] == values[column] for column in IMPORT_COLUMNS):
+            if existing_product["id"] not in self.updates:
+                self.unchanged += 1
+            return
+        else:
+            self.snapshots.setdefault(existing_product["id"], dict(existing_product))
+            self.index.replace(existing_product, values)
+            self.updates[existing_product["id"]] = existing_product
+        self.lines.setdefault(id(values if existing_product is None else existing_product), []).append(line_no)
+
+    def _insert(self, entries):
+        insert = dialect_insert(self.db.bind)
+        columns = [column for column in IMPORT_COLUMNS if column != "id"]
+        stmt = insert(ProductDB)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ProductDB.skv],
+            set_={column: stmt.excluded[column] for column in columns + list(PRICING_COLUMNS) if column != "skv"}
+        ).returning(ProductDB.id, sort_by_parameter_order=True)
+        # Core statements skip the ORM hooks, so derive the pricing columns here
+        result = self.db.execute(stmt, [{**{column: entry[column] for column in columns}, **pricing_columns(entry)} for entry in entries])
+        return [row.id for row in result]
+
+    def _update(self, entries):
+        self.db.execute(update(ProductDB), [{**{column: entry[column] for column in IMPORT_COLUMNS}, **pricing_columns(entry)} for entry in entries])
+
+    def _write(self, creates, updates):
+        # Updates first: they may free an SKV that a new row in this chunk takes over
+        if updates:
+            self._update(updates)
+        return self._insert(creates) if creates else []
+
+    def _count_new(self, ids):
+        # Ids already in the index hit ON CONFLICT and updated a product with the same SKV
+        return sum(1 for new_id in ids if new_id not in self.index.by_id)
+
+    def _apply_ids(self, creates, ids):
+        for entry, new_id in zip(creates, ids):
+            if new_id in self.index.by_id:
+                self.index.remove(self.index.by_id[new_id])
+            self.index.remove(entry)
+            entry["id"] = new_id
+            self.index.add(entry)
+
+    def _fail(self, entry, error):
+        lines = self.lines.get(id(entry), [])
+        error_msg = str(error).split('\n')[0]
+        self.errors.append((lines[0] if lines else "?", entry["title"] or entry["skv"], error_msg))
+        if entry["id"] is None:
+            self.index.remove(entry)
+        else:
+            self.index.replace(entry, self.snapshots[entry["id"]])
+
+    def flush(self):
+        creates, updates = self.creates, list(self.updates.values())
+        if not creates and not updates:
+            return
+        try:
+            ids = self._write(creates, updates)
+            new = self._count_new(ids)
+            bump_counter(self.db, "products", new)
+            self.db.commit()
+            self._apply_ids(creates, ids)
+            self.created += new
+            self.updated += len(updates) + len(creates) - new
+        except Exception:
+            self.db.rollback()
+            self._replay(creates, updates)
+        for entry in creates:
+            print(f"  + Created: {entry['title']}")
+        self.creates, self.updates, self.snapshots, self.lines = [], {}, {}, {}
+
+    def _replay(self, creates, updates):
+        # Slow path for a chunk that failed as a whole: isolate the bad rows
+        created = 0
+        for entry in creates + updates:
+            is_new = entry["id"] is None
+            try:
+                with self.db.begin_nested():
+                    ids = self._write([entry], []) if is_new else self._write([], [entry])
+            except Exception as row_error:
+                self._fail(entry, row_error)
+                continue
+            if is_new and self._count_new(ids):
+                self.created += 1
+                created += 1
+            else:
+                self.updated += 1
+            if is_new:
+                self._apply_ids([entry], ids)
+        bump_counter(self.db, "products", created)
+        self.db.commit()
+        creates[:] = [entry for entry in creates if entry["id"] is not None]
+
+class DryRunBatch(ImportBatch):
+    """
+    Runs the same matching and value rules as ImportBatch but never writes.
+    Pending products stay in the index between chunks, so later rows see the
+    catalog as the real import would leave it.
+    """
+    def __init__(self, db, index):
+        super().__init__(db, index)
+        self.created_entries = []  # (line, entry); entries keep absorbing later duplicate rows
+        self.originals = {}  # id -> (first line, values before the import)
+        self.changed = {}  # id -> entry
+
+    def flush(self):
+        for entry in self.creates:
+            self.created_entries.append((self.lines[id(entry)][0], entry))
+        for product_id, entry in self.updates.items():
+            self.originals.setdefault(product_id, (self.lines[id(entry)][0], self.snapshots[product_id]))
+            self.changed[product_id] = entry
+        self.creates, self.updates, self.snapshots, self.lines = [], {}, {}, {}
+
+    def report(self):
+        """
+        The diff as a JSON-ready dict: created rows, changed fields as [old, new]
+        per updated product, the unchanged count and per-row errors.
+        """
+        created = [
+            {"line": line, **{column: entry[column] for column in IMPORT_COLUMNS if column != "id"}}
+            for line, entry in self.created_entries
+        ]
+        updated = []
+        for product_id, entry in self.changed.items():
+            line, before = self.originals[product_id]
+            fields = {column: [before[column], entry[column]] for column in IMPORT_COLUMNS if before[column] != entry[column]}
+            if fields:
+                updated.append({"id": product_id, "line": line, "fields": fields})
+        errors = [{"line": line, "row": label, "error": error_msg} for line, label, error_msg in self.errors]
+        return {
+            "summary": {"created": len(created), "updated": len(updated), "unchanged": self.unchanged, "errors": len(errors)},
+            "created": created,
+            "updated": updated,
+            "errors": errors
+        }
+
 def clean_float(val, default):
     if not val or val == '-': return default
     try:
@@ -216,7 +431,8 @@ def parse_list(raw_str):
     if not raw_str: return []
     import json
     try:
-        decoded = json.loads(raw_str)
+        # Only a JSON array can pass the check below, so skip the parse for plain text
+        decoded = json.loads(raw_str) if raw_str.lstrip().startswith('[') else None
         if isinstance(decoded, list):
             return [str(item).strip() for item in decoded if str(item).strip()]
     except:
@@ -232,7 +448,7 @@ def parse_dict(raw_str):
     if not raw_str: return {}
     import json
     try:
-        decoded = json.loads(raw_str)
+        decoded = json.loads(raw_str) if raw_str.lstrip().startswith('{') else None
         if isinstance(decoded, dict):
             return decoded
     except:
@@ -251,8 +467,30 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Import products from a CSV file.")
     parser.add_argument("csv_file", help="Path to the CSV file")
     parser.add_argument("--reset", action="store_true", help="Wipe the database before importing")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows written per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Print a JSON diff of what the import would change without writing anything")
     
     args = parser.parse_args()
     
-    print(f"Importing from {args.csv_file}...")
-    import_products(args.csv_file, reset=args.reset)
+    if args.dry_run:
+        import json
+        from contextlib import redirect_stdout
+        # Progress goes to stderr so stdout is just the JSON diff
+        with redirect_stdout(sys.stderr):
+            diff = import_products(args.csv_file, reset=args.reset, chunk_size=args.chunk_size, dry_run=True)
+        if diff is None:
+            sys.exit(1)
+        json.dump(diff, sys.stdout, ensure_ascii=False, indent=1)
+        print()
+    else:
+        print(f"Importing from {args.csv_file}...")
+        import_products(args.csv_file, reset=args.reset, chunk_size=args.chunk_size)
+
+        # Running servers only rebuild after their own writes; publish the imported catalog
+        from catalog_snapshot import CATALOG_SNAPSHOT_DIR, publish_snapshot
+        if CATALOG_SNAPSHOT_DIR:
+            db = SessionLocal()
+            try:
+                publish_snapshot(db, CATALOG_SNAPSHOT_DIR)
+            finally:
+                db.close()
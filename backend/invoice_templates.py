@@ -0,0 +1,283 @@
+import re
+import html
+from collections import OrderedDict
+from threading import Lock
+from metrics import CACHE_REQUESTS
+
+class CompiledTemplate:
+    """
+    A template with $name placeholders, split into literal chunks once at import.
+    Rendering appends chunks and values to a list that is joined a single time.
+    Values are HTML-escaped, except for the placeholders named in `raw`, which
+    take markup this module rendered itself.
+    """
+    def __init__(self, source: str, raw=()):
+        pieces = re.split(r"\$(\w+)", source)
+        self.literals = pieces[0::2]
+        self.names = pieces[1::2]
+        self.escape = [name not in raw for name in self.names]
+
+    def render_into(self, out: list, values: dict):
+        literals = self.literals
+        escape = self.escape
+        out.append(literals[0])
+        for i, name in enumerate(self.names):
+            value = str(values[name])
+            # Names, addresses and titles come from customers and admins
+            out.append(html.escape(value) if escape[i] else value)
+            out.append(literals[i + 1])
+
+    def render(self, values: dict):
+        out = []
+        self.render_into(out, values)
+        return "".join(out)
+
+GST_RATE = 0.18
+PLACEHOLDER_IMAGE = "https://via.placeholder.com/80?text=TRONIX365"
+
+ITEM_ROW_TEMPLATE = CompiledTemplate("""
+        <tr>
+            <td style="padding: 15px; border-bottom: 1px solid #eee;">
+                <img src="$img_url" alt="Product" style="width: 60px; height: 60px; object-fit: cover; border-radius: 8px; border: 1px solid #eee;" />
+            </td>
+            <td style="padding: 15px; border-bottom: 1px solid #eee; text-align: left;">
+                <p style="margin: 0; font-weight: bold; color: #333;">$title</p>
+                <p style="margin: 5px 0 0; font-size: 13px; color: #666;">Qty: $quantity</p>
+            </td>
+            <td style="padding: 15px; border-bottom: 1px solid #eee; text-align: right;">
+                <p style="margin: 0; font-weight: bold; color: #333;">₹$line_total</p>
+            </td>
+        </tr>
+        """)
+
+ORDER_CONFIRMATION_TEMPLATE = CompiledTemplate("""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    </head>
+    <body style="font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif; background-color: #f4f4f5; margin: 0; padding: 40px 20px; color: #333;">
+        
+        <table width="100%" cellpadding="0" cellspacing="0" style="max-width: 600px; margin: 0 auto; background-color: #ffffff; border-radius: 12px; overflow: hidden; box-shadow: 0 4px 6px rgba(0,0,0,0.05);">
+            <!-- Header -->
+            <tr>
+                <td style="background-color: #8b5cf6; padding: 40px 30px; text-align: center;">
+                    <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 800; letter-spacing: 1px;">TRONIX365</h1>
+                    <p style="color: #eaddff; margin: 10px 0 0; font-size: 16px;">Order Confirmation</p>
+                </td>
+            </tr>
+            
+            <!-- Welcome Message -->
+            <tr>
+                <td style="padding: 40px 30px 20px;">
+                    <h2 style="margin: 0 0 15px; font-size: 22px; color: #111827;">Hello $full_name,</h2>
+                    <p style="margin: 0; font-size: 16px; color: #4b5563; line-height: 1.5;">
+                        Thank you for shopping with Tronix365! We've received your order and are currently processing it. 
+                        Below are the details of your purchase.
+                    </p>
+                </td>
+            </tr>
+            
+            <!-- Order Details Box -->
+            <tr>
+                <td style="padding: 0 30px 20px;">
+                    <div style="background-color: #f8fafc; padding: 20px; border-radius: 8px; border: 1px solid #e2e8f0;">
+                        <table width="100%" cellpadding="0" cellspacing="0">
+                            <tr>
+                                <td style="padding-bottom: 10px;">
+                                    <span style="font-size: 13px; color: #64748b; text-transform: uppercase; font-weight: bold;">Order ID</span><br>
+                                    <span style="font-size: 16px; color: #0f172a; font-weight: bold;">$order_number</span>
+                                </td>
+                                <td style="padding-bottom: 10px; text-align: right;">
+                                    <span style="font-size: 13px; color: #64748b; text-transform: uppercase; font-weight: bold;">Order Date</span><br>
+                                    <span style="font-size: 16px; color: #0f172a; font-weight: bold;">$date_str</span>
+                                </td>
+                            </tr>
+                            <tr>
+                                <td colspan="2" style="padding-top: 10px; border-top: 1px solid #e2e8f0;">
+                                    <span style="font-size: 13px; color: #64748b; text-transform: uppercase; font-weight: bold;">Status</span><br>
+                                    <span style="display: inline-block; background-color: #dbeafe; color: #1e40af; padding: 4px 12px; border-radius: 9999px; font-size: 14px; font-weight: bold; margin-top: 4px; text-transform: capitalize;">$status</span>
+                                </td>
+                            </tr>
+                        </table>
+                    </div>
+                </td>
+            </tr>
+            
+            <!-- Items Table -->
+            <tr>
+                <td style="padding: 0 30px;">
+                    <h3 style="margin: 0 0 15px; font-size: 18px; color: #111827; border-bottom: 2px solid #f1f5f9; padding-bottom: 10px;">Items Ordered</h3>
+                    <table width="100%" cellpadding="0" cellspacing="0" style="border-collapse: collapse;">
+                        $item_rows
+                    </table>
+                </td>
+            </tr>
+            
+            <!-- Financial Summary -->
+            <tr>
+                <td style="padding: 30px;">
+                    <table width="100%" cellpadding="0" cellspacing="0">
+                        <tr>
+                            <td width="50%"></td>
+                            <td width="50%">
+                                <table width="100%" cellpadding="0" cellspacing="0" style="font-size: 15px; color: #4b5563;">
+                                    <tr>
+                                        <td style="padding-bottom: 10px;">Subtotal</td>
+                                        <td style="padding-bottom: 10px; text-align: right; color: #111827;">₹$subtotal</td>
+                                    </tr>
+                                    <tr>
+                                        <td style="padding-bottom: 10px;">Estimated GST (18%)</td>
+                                        <td style="padding-bottom: 10px; text-align: right; color: #111827;">₹$gst</td>
+                                    </tr>
+                                    <tr>
+                                        <td style="padding-top: 15px; padding-bottom: 5px; border-top: 2px solid #e2e8f0; font-weight: bold; font-size: 18px; color: #111827;">Grand Total</td>
+                                        <td style="padding-top: 15px; padding-bottom: 5px; border-top: 2px solid #e2e8f0; font-weight: bold; font-size: 18px; text-align: right; color: #8b5cf6;">₹$grand_total</td>
+                                    </tr>
+                                </table>
+                            </td>
+                        </tr>
+                    </table>
+                </td>
+            </tr>
+            
+            <!-- Call to Action -->
+            <tr>
+                <td style="padding: 10px 30px 40px; text-align: center;">
+                    <a href="$order_url" style="display: inline-block; background-color: #8b5cf6; color: #ffffff; text-decoration: none; padding: 14px 32px; font-size: 16px; font-weight: bold; border-radius: 8px; box-shadow: 0 4px 6px rgba(139, 92, 246, 0.25);">Manage Your Order</a>
+                </td>
+            </tr>
+            
+            <!-- Footer -->
+            <tr>
+                <td style="background-color: #f8fafc; padding: 30px; text-align: center; border-top: 1px solid #e2e8f0;">
+                    <p style="margin: 0 0 10px; font-size: 14px; color: #64748b;">
+                        Need help? Reply to this email or contact our support team.
+                    </p>
+                    <p style="margin: 0; font-size: 12px; color: #94a3b8;">
+                        &copy; 2026 Tronix365. All rights reserved.<br>
+                        123 Innovation Park, Silicon Valley, India
+                    </p>
+                </td>
+            </tr>
+        </table>
+        
+    </body>
+    </html>
+    """, raw=("item_rows",))
+
+def compute_invoice(order):
+    """
+    Computes the invoice figures for an order once: line totals, subtotal, GST and grand total.
+    Assumes `order` is an OrderDB with `.items` loaded and each item's `.product` available.
+    """
+    lines = []
+    subtotal = 0.0
+    for item in order.items:
+        unit_price = item.price_at_purchase or 0.0
+        line_total = unit_price * item.quantity
+        subtotal += line_total
+        product = item.product
+        lines.append({
+            "product_id": item.product_id,
+            "title": product.title if product else f"Product ID: {item.product_id}",
+            "image": getattr(product, "image", None),
+            "quantity": item.quantity,
+            "unit_price": unit_price,
+            "line_total": line_total
+        })
+
+    gst = subtotal * GST_RATE
+    created_at = order.created_at
+    return {
+        "order_id": order.id,
+        "order_number": f"#order_tronix_{order.id:04d}",
+        "date_str": created_at.strftime("%B %d, %Y") if hasattr(created_at, 'strftime') else str(created_at).split("T")[0],
+        "full_name": order.full_name,
+        "customer_email": order.customer_email,
+        # Shipping and payment details are fixed when the order is placed
+        "address_line": order.address_line,
+        "city": order.city,
+        "state": order.state,
+        "pincode": order.pincode,
+        "phone": order.phone,
+        "txnid": order.txnid,
+        "status": order.status,
+        "lines": lines,
+        "subtotal": subtotal,
+        "gst": gst,
+        "grand_total": subtotal + gst
+    }
+
+def render_order_confirmation(invoice: dict, frontend_url: str):
+    rows = []
+    for line in invoice["lines"]:
+        # Fallback to a placeholder if image is missing; make relative images absolute
+        img_url = line["image"] or PLACEHOLDER_IMAGE
+        if img_url.startswith('/'):
+            img_url = f"{frontend_url}{img_url}"
+        ITEM_ROW_TEMPLATE.render_into(rows, {
+            "img_url": img_url,
+            "title": line["title"],
+            "quantity": line["quantity"],
+            "line_total": f"{line['line_total']:,.2f}"
+        })
+
+    return ORDER_CONFIRMATION_TEMPLATE.render({
+        "full_name": invoice["full_name"],
+        "order_number": invoice["order_number"],
+        "date_str": invoice["date_str"],
+        "status": invoice["status"],
+        "item_rows": "".join(rows),
+        "subtotal": f"{invoice['subtotal']:,.2f}",
+        "gst": f"{invoice['gst']:,.2f}",
+        "grand_total": f"{invoice['grand_total']:,.2f}",
+        "order_url": f"{frontend_url}/order/{invoice['order_id']}"
+    })
+
+# --- Rendered invoice cache ----------------------------------------------
+# Per process: each API worker and the email worker (a separate process) keep
+# their own. They agree because the figures are computed the same way from the
+# same rows, not because they share entries.
+
+INVOICE_CACHE_SIZE = 512
+_invoice_cache = OrderedDict()
+_invoice_cache_lock = Lock()
+
+def invoice_version(order):
+    # Items and prices are locked at purchase; only these fields change afterwards
+    return (order.status, order.full_name)
+
+def _cached(key, build):
+    with _invoice_cache_lock:
+        if key in _invoice_cache:
+            _invoice_cache.move_to_end(key)
+            CACHE_REQUESTS.inc("invoice", "hit")
+            return _invoice_cache[key]
+    CACHE_REQUESTS.inc("invoice", "miss")
+    value = build()
+    with _invoice_cache_lock:
+        _invoice_cache[key] = value
+        if len(_invoice_cache) > INVOICE_CACHE_SIZE:
+            _invoice_cache.popitem(last=False)
+    return value
+
+def get_invoice(order):
+    """
+    Invoice figures for an order, cached per order id and version.
+    """
+    return _cached(("data", order.id, invoice_version(order)), lambda: compute_invoice(order))
+
+def get_invoice_html(order, frontend_url: str):
+    """
+    Rendered invoice email for an order, cached per order id, version and frontend URL.
+    """
+    return _cached(
+        ("html", order.id, invoice_version(order), frontend_url),
+        lambda: render_order_confirmation(get_invoice(order), frontend_url)
+    )
+
+def clear_invoice_cache():
+    with _invoice_cache_lock:
+        _invoice_cache.clear()
@@ -1,55 +1,44 @@
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from typing import List, Optional
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
-from database import engine, Base, get_db
-from models import Product, ProductDB, Order, OrderCreate, OrderDB, OrderItemDB, LoginRequest, ReviewDB, ReviewCreate, ReviewResponse, ProductCreate, ProductUpdate, ContactMessageDB
-import requests
+from sqlalchemy.exc import IntegrityError
+from database import get_db, init_schema, SessionLocal, dialect_insert
+from models import Product, ProductDB, Order, OrderCreate, OrderDB, OrderItemDB, LoginRequest, ReviewDB, ReviewVoteDB, ReviewCreate, ReviewResponse, ReviewPage, CartLine, CartQuoteRequest, CartQuote, ProductCreate, ProductUpdate, ContactMessageDB
 import hashlib
 import os
+import logging
+from contextlib import asynccontextmanager
 from pydantic import BaseModel, EmailStr
-from datetime import datetime, timedelta
-from fastapi.staticfiles import StaticFiles
+from datetime import datetime, timedelta, date
+from static_utils import UploadStaticFiles
 from fastapi import UploadFile, File
-import shutil
-from email_utils import send_order_confirmation_email
+from email_outbox import enqueue_order_confirmation, enqueue_contact_notification, outbox_stats
+from email_utils import get_frontend_url
+from invoice_templates import get_invoice, get_invoice_html
+from image_utils import generate_variants_async, variants_for_url, build_srcset
+from storage_utils import store_stream
+from starlette.concurrency import run_in_threadpool
+from rollups import bump_counter, record_confirmed_order, get_rollup_stats, get_timeseries, ensure_rollups, GRANULARITIES
+from metrics import MetricsMiddleware, render as render_metrics
+from query_stats import QueryStatsMiddleware
+from rate_limit import RateLimitMiddleware
+from read_replicas import RecentWriteCookieMiddleware
+from catalog_snapshot import start_catalog_snapshot, stop_catalog_snapshot, current_snapshot, mark_catalog_dirty, live_fields
+from review_stats import record_review
+from cart_quote import build_quote, merge_lines, sign_quote, verify_quote, quote_txnid, InvalidQuote
+from review_pages import get_review_page_json, invalidate_reviews, InvalidCursor, SORTS as REVIEW_SORTS, DEFAULT_LIMIT as REVIEW_PAGE_LIMIT, MAX_LIMIT as REVIEW_PAGE_MAX_LIMIT
 
-# Ensure 'uploads' directory exists
 UPLOAD_DIR = "uploads"
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="Tronix365 API", version="0.1.0")
-
-# CORS Setup
-# CORS Setup - Hardcoded for Production Safety
-origins = [
-    "https://www.tronix365.in",
-    "https://tronix365.in",
-    "http://localhost:5173",
-    "http://localhost:3000"
-]
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Mount static files
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Importing this module only builds the app; anything that touches the disk or
+# the database happens in lifespan(), once per worker, before the first request.
+router = APIRouter()
 
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse, Response
 
-@app.exception_handler(RequestValidationError)
-@app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     print(f"Validation Error: {exc.errors()}")
     body = exc.body
@@ -61,15 +50,25 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 
-@app.get("/")
+@router.get("/")
 async def read_root():
     return {"message": "Welcome to Tronix365 API", "status": "running"}
 
-@app.get("/health")
+@router.get("/health")
 async def health_check():
     return {"status": "ok"}
 
-@app.get("/products", response_model=List[Product])
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    # Optional shared secret for scrapers when /metrics is reachable from outside
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("authorization") != f"Bearer {token}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    # The outbox depth query is blocking; keep it off the event loop
+    body = await run_in_threadpool(render_metrics)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/products", response_model=List[Product])
 async def get_products(
     skip: int = 0,
     limit: int = 20,
@@ -80,6 +79,12 @@ async def get_products(
     search: str = None,
     db: Session = Depends(get_db)
 ):
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        # Multi-worker mode: serve pre-serialised JSON from the shared snapshot
+        body = snapshot.list_json(lambda ids: live_fields(db, ids), skip, limit, category, min_price, max_price, sort_by, search)
+        return Response(body, media_type="application/json")
+
     query = db.query(ProductDB)
 
     if search:
@@ -93,39 +98,56 @@ async def get_products(
     if category and category != "All":
         query = query.filter(ProductDB.category == category)
     
+    # Prices are what an order charges (sale price, else list price)
     if min_price is not None:
-        query = query.filter(ProductDB.price >= min_price)
+        query = query.filter(ProductDB.effective_price >= min_price)
         
     if max_price is not None:
-        query = query.filter(ProductDB.price <= max_price)
-
-    if sort_by:
-        if sort_by == "price_asc":
-            query = query.order_by(ProductDB.price.asc())
-        elif sort_by == "price_desc":
-            query = query.order_by(ProductDB.price.desc())
-        elif sort_by == "name_asc":
-            query = query.order_by(ProductDB.title.asc())
+        query = query.filter(ProductDB.effective_price <= max_price)
+
+    # The id tie-break matches the (key, id) indexes, so no sort step is needed
+    if sort_by == "price_asc":
+        query = query.order_by(ProductDB.effective_price.asc(), ProductDB.id.asc())
+    elif sort_by == "price_desc":
+        query = query.order_by(ProductDB.effective_price.desc(), ProductDB.id.desc())
+    elif sort_by == "discount_desc":
+        query = query.order_by(ProductDB.discount_pct.desc(), ProductDB.id.desc())
+    elif sort_by == "name_asc":
+        query = query.order_by(ProductDB.title.asc())
+    else:
+        # Unsorted pages are in id order, whichever index the planner picks for the filters
+        query = query.order_by(ProductDB.id.asc())
 
     products = query.offset(skip).limit(limit).all()
     return products
 
-@app.get("/products/{product_id}", response_model=Product)
+@router.get("/products/{product_id}", response_model=Product)
 async def get_product(product_id: int, db: Session = Depends(get_db)):
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        body = snapshot.product_json(product_id, lambda ids: live_fields(db, ids))
+        if body is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return Response(body, media_type="application/json")
+
     product = db.query(ProductDB).filter(ProductDB.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
 
-@app.post("/products", response_model=Product, status_code=201)
+@router.post("/products", response_model=Product, status_code=201)
 async def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     new_product = ProductDB(**product.dict())
+    if new_product.image and not new_product.image_variants:
+        new_product.image_variants = await run_in_threadpool(variants_for_url, new_product.image)
     db.add(new_product)
+    bump_counter(db, "products", 1)
     db.commit()
+    mark_catalog_dirty()
     db.refresh(new_product)
     return new_product
 
-@app.put("/products/{product_id}", response_model=Product)
+@router.put("/products/{product_id}", response_model=Product)
 async def update_product(product_id: int, product: ProductUpdate, db: Session = Depends(get_db)):
     db_product = db.query(ProductDB).filter(ProductDB.id == product_id).first()
     if not db_product:
@@ -134,27 +156,39 @@ async def update_product(product_id: int, product: ProductUpdate, db: Session =
     product_data = product.dict(exclude_unset=True)
     for key, value in product_data.items():
         setattr(db_product, key, value)
+
+    # A new image without explicit variants picks up the ones generated at upload
+    if "image" in product_data and "image_variants" not in product_data:
+        db_product.image_variants = await run_in_threadpool(variants_for_url, db_product.image)
     
     db.commit()
+    mark_catalog_dirty()
     db.refresh(db_product)
     return db_product
 
-@app.delete("/products/{product_id}", status_code=204)
+@router.delete("/products/{product_id}", status_code=204)
 async def delete_product(product_id: int, db: Session = Depends(get_db)):
     db_product = db.query(ProductDB).filter(ProductDB.id == product_id).first()
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     db.delete(db_product)
+    bump_counter(db, "products", -1)
     db.commit()
+    mark_catalog_dirty()
     return None
 
 
 
-from email_utils import send_order_confirmation_email
+def load_products(db: Session, product_ids):
+    # One IN query for a whole cart instead of one lookup per line item
+    ids = set(product_ids)
+    if not ids:
+        return {}
+    return {p.id: p for p in db.query(ProductDB).filter(ProductDB.id.in_(ids))}
 
-@app.post("/orders", status_code=201)
-async def create_order(order: OrderCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+@router.post("/orders", status_code=201)
+async def create_order(order: OrderCreate, db: Session = Depends(get_db)):
     # Create Order
     new_order = OrderDB(
         customer_email=order.customer_email,
@@ -163,9 +197,10 @@ async def create_order(order: OrderCreate, background_tasks: BackgroundTasks, db
     )
     
     # Process Items
+    products = load_products(db, [item.product_id for item in order.items])
     for item in order.items:
         # Identify Product
-        product = db.query(ProductDB).filter(ProductDB.id == item.product_id).first()
+        product = products.get(item.product_id)
         if not product:
             raise HTTPException(status_code=400, detail=f"Product ID {item.product_id} is invalid.")
             
@@ -191,17 +226,17 @@ async def create_order(order: OrderCreate, background_tasks: BackgroundTasks, db
         product.stock -= item.quantity
 
     db.add(new_order)
+    record_confirmed_order(db, new_order)
+    # Queue the confirmation email in the same transaction; email_worker.py delivers it
+    enqueue_order_confirmation(db, new_order)
     db.commit()
     db.refresh(new_order)
-
-    # Dispatch Order Confirmation Email in the background
-    background_tasks.add_task(send_order_confirmation_email, new_order)
     
     print(f"Order saved and email queued: {new_order.id}")
     return {"message": "Order placed successfully", "order_id": new_order.id, "status": "confirmed"}
 
 
-@app.get("/orders", response_model=List[Order])
+@router.get("/orders", response_model=List[Order])
 async def get_orders(skip: int = 0, limit: int = 20, db: Session = Depends(get_db)):
     orders = db.query(OrderDB).options(
         joinedload(OrderDB.items).joinedload(OrderItemDB.product)
@@ -240,11 +275,15 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         raise credentials_exception
     return user
 
-@app.post("/products/{product_id}/reviews", response_model=ReviewResponse)
+async def get_current_admin(current_user: UserDB = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Access denied. Admin credentials required.")
+    return current_user
+
+@router.post("/products/{product_id}/reviews", response_model=ReviewResponse)
 async def create_review(product_id: int, review: ReviewCreate, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
-    # Verify product exists
-    product = db.query(ProductDB).filter(ProductDB.id == product_id).first()
-    if not product:
+    # Bump the product's rating aggregates; no row updated means no such product
+    if not record_review(db, product_id, review.rating):
         raise HTTPException(status_code=404, detail="Product not found")
 
     new_review = ReviewDB(
@@ -257,30 +296,56 @@ async def create_review(product_id: int, review: ReviewCreate, current_user: Use
         created_at=datetime.utcnow().isoformat()
     )
     db.add(new_review)
-    db.commit()
+    db.commit() # Review and aggregates land together
     db.refresh(new_review)
+    invalidate_reviews(product_id)
     return new_review
 
-@app.get("/products/{product_id}/reviews", response_model=List[ReviewResponse])
-async def get_reviews(product_id: int, db: Session = Depends(get_db)):
-    reviews = db.query(ReviewDB).filter(ReviewDB.product_id == product_id).all()
-    return reviews
-
-
+@router.get("/products/{product_id}/reviews", response_model=ReviewPage)
+async def get_reviews(
+    product_id: int,
+    sort: str = "newest",
+    limit: int = Query(REVIEW_PAGE_LIMIT, ge=1, le=REVIEW_PAGE_MAX_LIMIT),
+    cursor: str = None,
+    db: Session = Depends(get_db)
+):
+    if sort not in REVIEW_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(REVIEW_SORTS)}")
+    try:
+        body = get_review_page_json(db, product_id, sort, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(body, media_type="application/json")
+
+@router.post("/products/{product_id}/reviews/{review_id}/helpful")
+async def mark_review_helpful(product_id: int, review_id: int, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
+    review = db.query(ReviewDB).filter(ReviewDB.id == review_id, ReviewDB.product_id == product_id).first()
+    if not review:
+        raise HTTPException(status_code=404, detail="Review not found")
+
+    # Repeat votes are ignored, so only a first vote bumps the count
+    insert = dialect_insert(db.bind)
+    voted = db.execute(insert(ReviewVoteDB).values(review_id=review_id, user_id=current_user.id).on_conflict_do_nothing()).rowcount
+    if voted:
+        db.query(ReviewDB).filter(ReviewDB.id == review_id).update(
+            {ReviewDB.helpful_count: func.coalesce(ReviewDB.helpful_count, 0) + 1}, synchronize_session=False
+        )
+    db.commit()
+    if voted:
+        invalidate_reviews(product_id)
+    db.refresh(review)
+    return {"helpful_count": review.helpful_count}
 
 class ContactMessage(BaseModel):
     name: str
     email: EmailStr
     message: str
 
-from email_utils import send_contact_form_notification
 from models import ContactMessageDB
 
-from fastapi import BackgroundTasks
-
-@app.post("/contact")
-async def send_contact_email(contact: ContactMessage, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    # 1. Save to Database
+@router.post("/contact")
+async def send_contact_email(contact: ContactMessage, db: Session = Depends(get_db)):
+    # 1. Save to Database together with the outbox entry for the notification
     try:
         new_msg = ContactMessageDB(
             name=contact.name,
@@ -288,19 +353,19 @@ async def send_contact_email(contact: ContactMessage, background_tasks: Backgrou
             message=contact.message
         )
         db.add(new_msg)
+        enqueue_contact_notification(db, contact.name, contact.email, contact.message)
         db.commit()
     except Exception as e:
+        db.rollback()
         print(f"Error saving contact message to DB: {e}")
+        raise HTTPException(status_code=500, detail="Could not save your message. Please try again.")
 
-    # 2. Try sending the email in the background to prevent UI hanging
-    background_tasks.add_task(send_contact_form_notification, contact.name, contact.email, contact.message)
-
-    # 3. Always return success to the UI instantly (since it's in the DB)
+    # 2. email_worker.py delivers the notification, so the UI returns instantly
     return {"message": "Message sent successfully, queued for delivery"}
 
 
 
-@app.post("/signup", response_model=Token)
+@router.post("/signup", response_model=Token)
 async def signup(user: UserCreate, db: Session = Depends(get_db)):
     try:
         db_user = db.query(UserDB).filter(UserDB.email == user.email).first()
@@ -316,6 +381,7 @@ async def signup(user: UserCreate, db: Session = Depends(get_db)):
             role="user" # Default role
         )
         db.add(new_user)
+        bump_counter(db, "users", 1)
         db.commit()
         db.refresh(new_user)
         
@@ -333,7 +399,7 @@ async def signup(user: UserCreate, db: Session = Depends(get_db)):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Signup Error: {str(e)}")
 
-@app.post("/login", response_model=Token)
+@router.post("/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = db.query(UserDB).filter(UserDB.email == form_data.username).first()
     if not user or not verify_password(form_data.password, user.hashed_password):
@@ -355,7 +421,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     )
     return {"access_token": access_token, "token_type": "bearer", "user_name": user.full_name, "role": user.role}
 
-@app.post("/admin/login", response_model=Token)
+@router.post("/admin/login", response_model=Token)
 async def admin_login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = db.query(UserDB).filter(UserDB.email == form_data.username).first()
     if not user or not verify_password(form_data.password, user.hashed_password):
@@ -377,11 +443,11 @@ async def admin_login(form_data: OAuth2PasswordRequestForm = Depends(), db: Sess
     )
     return {"access_token": access_token, "token_type": "bearer", "user_name": user.full_name, "role": user.role}
 
-@app.get("/profile", response_model=UserResponse) 
+@router.get("/profile", response_model=UserResponse) 
 async def get_user_profile(current_user: UserDB = Depends(get_current_user)):
     return current_user
 
-@app.put("/profile", response_model=UserResponse)
+@router.put("/profile", response_model=UserResponse)
 async def update_user_profile(user_update: UserUpdate, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
     if user_update.full_name is not None:
         current_user.full_name = user_update.full_name
@@ -403,7 +469,7 @@ async def update_user_profile(user_update: UserUpdate, current_user: UserDB = De
     db.commit()
     db.refresh(current_user)
     return current_user
-@app.get("/debug-orders")
+@router.get("/debug-orders")
 async def debug_orders(db: Session = Depends(get_db)):
     orders = db.query(OrderDB).order_by(OrderDB.id.desc()).limit(3).all()
     users = db.query(UserDB).order_by(UserDB.id.desc()).limit(3).all()
@@ -412,13 +478,13 @@ async def debug_orders(db: Session = Depends(get_db)):
         "recent_users": [{"id": u.id, "email": u.email} for u in users]
     }
 
-@app.get("/orders/user", response_model=List[Order])
+@router.get("/orders/user", response_model=List[Order])
 async def get_user_orders(skip: int = 0, limit: int = 20, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
     # Fetch orders based on customer_email matching the logged-in user
     orders = db.query(OrderDB).options(joinedload(OrderDB.items).joinedload(OrderItemDB.product)).filter(OrderDB.customer_email == current_user.email).order_by(OrderDB.id.desc()).offset(skip).limit(limit).all()
     return orders
 
-@app.get("/orders/{order_id}", response_model=Order)
+@router.get("/orders/{order_id}", response_model=Order)
 async def get_order_by_id(order_id: int, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
     # Fetch specific order
     order = db.query(OrderDB).options(joinedload(OrderDB.items).joinedload(OrderItemDB.product)).filter(OrderDB.id == order_id).first()
@@ -431,57 +497,106 @@ async def get_order_by_id(order_id: int, current_user: UserDB = Depends(get_curr
         raise HTTPException(status_code=403, detail="Not authorized to view this order")
         
     return order
+
+@router.get("/orders/{order_id}/invoice")
+async def get_order_invoice(order_id: int, format: str = "json", current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
+    order = db.query(OrderDB).options(joinedload(OrderDB.items).joinedload(OrderItemDB.product)).filter(OrderDB.id == order_id).first()
+
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    if order.customer_email != current_user.email and current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to view this order")
+
+    # Same figures and template as the confirmation email (cached in this worker)
+    if format == "html":
+        return HTMLResponse(content=get_invoice_html(order, get_frontend_url()))
+    return get_invoice(order)
+
+@router.post("/orders/{order_id}/resend-invoice", status_code=202)
+async def resend_order_invoice(order_id: int, current_admin: UserDB = Depends(get_current_admin), db: Session = Depends(get_db)):
+    order = db.query(OrderDB).filter(OrderDB.id == order_id).first()
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    enqueue_order_confirmation(db, order)
+    db.commit()
+    return {"message": "Invoice email queued"}
     
 # Trigger reload for env update
 
 # Payment Endpoints
 from payu_utils import generate_payu_hash, verify_payu_hash
 from fastapi import Form, Request
-from fastapi.responses import RedirectResponse
-
-class PaymentItem(BaseModel):
-    product_id: int
-    quantity: int
+from fastapi.responses import RedirectResponse, StreamingResponse
+from export_utils import stream_export, export_headers
 
 class PaymentInitiate(BaseModel):
-    amount: float
+    amount: Optional[float] = None # Ignored; the server prices the cart
     firstname: str
     email: EmailStr
     productinfo: str
-    items: List[PaymentItem] # List of items
+    items: List[CartLine] = [] # List of items, when there is no quote_token; quantities of at least 1
+    quote_token: Optional[str] = None # From POST /cart/quote; replaces items and amount
     phone: str
     address_line: str
     city: str
     state: str
     pincode: str
 
-@app.post("/payment/initiate")
+def quote_cart(db: Session, items):
+    # One IN query for the cart; unknown products are a 404 as in create_order
+    products = load_products(db, [item.product_id for item in items])
+    try:
+        return build_quote(products, merge_lines(items))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Product {e.args[0]} not found")
+
+@router.post("/cart/quote", response_model=CartQuote)
+async def get_cart_quote(cart: CartQuoteRequest, db: Session = Depends(get_db)):
+    quote = quote_cart(db, cart.items)
+    if all(line.available for line in quote.lines):
+        quote.quote_token = sign_quote(quote)
+    return quote
+
+@router.post("/payment/initiate")
 async def initiate_payment(payment: PaymentInitiate, db: Session = Depends(get_db)):
-    # 1. Validate Stock
-    items_for_order = []
-    for item in payment.items:
-        product = db.query(ProductDB).filter(ProductDB.id == item.product_id).first()
-        if not product:
-            raise HTTPException(status_code=404, detail=f"Product {item.product_id} not found")
-        if product.stock < item.quantity:
-             raise HTTPException(status_code=400, detail=f"Insufficient stock for {product.title}. Only {product.stock} left.")
-        
-        # Create OrderItemDB instance
-        order_item = OrderItemDB(
-            product_id=item.product_id,
-            quantity=item.quantity,
-            price_at_purchase=product.sale_price if product.sale_price else product.price
-        )
-        items_for_order.append(order_item)
+    # 1. Price the order: from a signed quote (prices fixed, stock read again), else from the DB
+    txnid = None
+    if payment.quote_token:
+        try:
+            lines, amount, nonce = verify_quote(payment.quote_token)
+        except InvalidQuote as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # Stock may have sold out since the quote; one query for the quoted products
+        stock = dict(db.query(ProductDB.id, ProductDB.stock).filter(ProductDB.id.in_([pid for pid, _, _ in lines])).all())
+        for product_id, quantity, _ in lines:
+            if (stock.get(product_id) or 0) < quantity:
+                raise HTTPException(status_code=400, detail="Some items are no longer in stock, please review your cart again")
+        txnid = quote_txnid(amount, nonce)
+    elif payment.items:
+        quote = quote_cart(db, payment.items)
+        for line in quote.lines:
+            if not line.available:
+                raise HTTPException(status_code=400, detail=f"Insufficient stock for {line.title}. Only {line.stock} left.")
+        lines = [(line.product_id, line.quantity, line.unit_price) for line in quote.lines]
+        amount = quote.grand_total
+    else:
+        raise HTTPException(status_code=400, detail="Either items or quote_token is required")
+
+    items_for_order = [
+        OrderItemDB(product_id=product_id, quantity=quantity, price_at_purchase=price)
+        for product_id, quantity, price in lines
+    ]
 
     key = os.getenv("PAYU_KEY")
     salt = os.getenv("PAYU_SALT")
-    txnid = f"TXN{int(payment.amount)}{os.urandom(4).hex()}" # Unique ID
+    if txnid is None:
+        txnid = f"TXN{int(amount)}{os.urandom(4).hex()}" # Unique ID
     
     # Create Order in DB (Pending)
     new_order = OrderDB(
         customer_email=payment.email,
-        total_amount=payment.amount,
+        total_amount=amount,
         status="pending",
         items=items_for_order, # Save actual items
         txnid=txnid,
@@ -493,7 +608,12 @@ async def initiate_payment(payment: PaymentInitiate, db: Session = Depends(get_d
         pincode=payment.pincode
     )
     db.add(new_order)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # txnid is unique, and a quote token always yields the same one
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Quote already used, please review your cart again")
     db.refresh(new_order)
 
     payu_env = os.getenv("PAYU_ENV", "MOCK").upper()
@@ -505,7 +625,7 @@ async def initiate_payment(payment: PaymentInitiate, db: Session = Depends(get_d
         action_url = f"{os.getenv('BACKEND_URL', 'http://localhost:8000')}/payment/mock-process"
 
     # Strict formatting to avoid float precision hash mismatch
-    amount_str = f"{payment.amount:.2f}"
+    amount_str = f"{amount:.2f}"
     
     hash_value = generate_payu_hash(key, txnid, amount_str, payment.productinfo, payment.firstname, payment.email, salt)
     
@@ -523,7 +643,7 @@ async def initiate_payment(payment: PaymentInitiate, db: Session = Depends(get_d
         "action": action_url
     }
 
-@app.post("/payment/mock-process")
+@router.post("/payment/mock-process")
 async def mock_payment_process(
     key: str = Form(...),
     txnid: str = Form(...),
@@ -577,9 +697,8 @@ async def mock_payment_process(
     from fastapi.responses import HTMLResponse
     return HTMLResponse(content=html_content, status_code=200)
 
-@app.post("/payment/callback")
+@router.post("/payment/callback")
 async def payment_callback(
-    background_tasks: BackgroundTasks,
     status: str = Form(...),
     firstname: str = Form(...),
     amount: str = Form(...),
@@ -622,16 +741,16 @@ async def payment_callback(
                 order.status = "confirmed"
                 # Decrement Stock
                 if order.items:
+                    products = load_products(db, [item.product_id for item in order.items])
                     for item in order.items:
-                        product = db.query(ProductDB).filter(ProductDB.id == item.product_id).first()
+                        product = products.get(item.product_id)
                         if product:
                             product.stock -= item.quantity
                             if product.stock < 0: product.stock = 0 # Safety check
-                db.commit() # Commit both status and stock update
-                db.refresh(order)
-                
-                # Payment succeeds and order is confirmed. Send HTML invoice!
-                background_tasks.add_task(send_order_confirmation_email, order)
+                record_confirmed_order(db, order)
+                # Payment succeeds and order is confirmed. Queue the HTML invoice!
+                enqueue_order_confirmation(db, order)
+                db.commit() # Commit status, stock update and outbox entry together
         else:
             order.status = "failed"
             db.commit()
@@ -648,49 +767,163 @@ async def payment_callback(
     else:
         return RedirectResponse(url=f"{frontend_url}/payment/failure?txnid={txnid}", status_code=303)
 
-@app.get("/admin/stats")
+@router.get("/admin/stats")
 async def get_admin_stats(db: Session = Depends(get_db)):
-    total_orders = db.query(OrderDB).count()
-    total_revenue = db.query(func.sum(OrderDB.total_amount)).scalar() or 0.0
-    total_products = db.query(ProductDB).count()
-    total_users = db.query(UserDB).count()
-    
-    # Calculate 30-day Revenue Growth
-    now = datetime.utcnow()
-    thirty_days_ago = now - timedelta(days=30)
-    sixty_days_ago = now - timedelta(days=60)
-    
-    current_revenue = db.query(func.sum(OrderDB.total_amount)).filter(OrderDB.created_at >= thirty_days_ago).scalar() or 0.0
-    previous_revenue = db.query(func.sum(OrderDB.total_amount)).filter(OrderDB.created_at >= sixty_days_ago, OrderDB.created_at < thirty_days_ago).scalar() or 0.0
-    
-    if previous_revenue == 0:
-        growth = 100.0 if current_revenue > 0 else 0.0
-    else:
-        growth = ((current_revenue - previous_revenue) / previous_revenue) * 100.0
-    
-    return {
-        "total_revenue": total_revenue,
-        "total_orders": total_orders,
-        "total_products": total_products,
-        "active_users": total_users,
-        "growth": round(growth, 1)
-    }
+    # Reads precomputed rollups (see rollups.py) instead of aggregating the orders table.
+    # Only confirmed orders count towards revenue and order totals.
+    return get_rollup_stats(db)
+
+@router.get("/admin/stats/timeseries")
+async def get_admin_stats_timeseries(
+    granularity: str = "day",
+    start: date = Query(None, alias="from"),
+    end: date = Query(None, alias="to"),
+    db: Session = Depends(get_db)
+):
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of: {', '.join(GRANULARITIES)}")
+
+    # Default window: last 30 days / 12 weeks / 12 months
+    end = end or datetime.utcnow().date()
+    if start is None:
+        start = end - {"day": timedelta(days=29), "week": timedelta(weeks=11), "month": timedelta(days=334)}[granularity]
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
 
-@app.post("/upload")
-async def upload_image(file: UploadFile = File(...)):
     try:
-        # Create a unique filename
-        file_extension = file.filename.split(".")[-1]
-        unique_filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{os.urandom(4).hex()}.{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        series = get_timeseries(db, granularity, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"granularity": granularity, "from": start.isoformat(), "to": end.isoformat(), "series": series}
+
+@router.get("/admin/email/outbox")
+async def get_email_outbox_stats(current_admin: UserDB = Depends(get_current_admin), db: Session = Depends(get_db)):
+    return outbox_stats(db)
+
+EXPORT_FORMATS = ("csv", "ndjson")
+
+@router.get("/admin/export/orders")
+async def export_orders(
+    format: str = "csv",
+    gzip: bool = False,
+    start: date = Query(None, alias="from"),
+    end: date = Query(None, alias="to"),
+    status: str = None,
+    current_admin: UserDB = Depends(get_current_admin)
+):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'")
+    media_type, headers = export_headers("orders", format, gzip)
+    return StreamingResponse(
+        stream_export("orders", format, gzip, start=start, end=end, status=status),
+        media_type=media_type,
+        headers=headers
+    )
+
+@router.get("/admin/export/products")
+async def export_products(
+    format: str = "csv",
+    gzip: bool = False,
+    category: str = None,
+    current_admin: UserDB = Depends(get_current_admin)
+):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'")
+    media_type, headers = export_headers("products", format, gzip)
+    return StreamingResponse(
+        stream_export("products", format, gzip, category=category),
+        media_type=media_type,
+        headers=headers
+    )
+
+@router.post("/upload")
+async def upload_image(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    try:
+        # Stream to disk while hashing; identical bytes map to the same immutable URL
+        url, created = await run_in_threadpool(store_stream, db, file.file, file.filename)
+        db.commit()
+        file_path = os.path.join(UPLOAD_DIR, os.path.basename(url))
+
+        # Resize into thumb/card/detail widths in WebP and JPEG on the image pool,
+        # unless this exact image was uploaded (and resized) before
+        variants = await run_in_threadpool(variants_for_url, url)
+        if variants is None:
+            variants = await generate_variants_async(file_path, os.path.splitext(os.path.basename(url))[0])
             
         # Return a relative URL instead of absolute 
         # so it automatically adapts to whatever environment (Render/Local)
         # the frontend uses to display it.
-        return {"url": f"/uploads/{unique_filename}"}
+        return {"url": url, "variants": variants, "srcset": build_srcset(variants), "deduplicated": not created}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# CORS Setup - Hardcoded for Production Safety
+origins = [
+    "https://www.tronix365.in",
+    "https://tronix365.in",
+    "http://localhost:5173",
+    "http://localhost:3000"
+]
+
+def _ensure_rollups():
+    db = SessionLocal()
+    try:
+        result = ensure_rollups(db)
+        if result:
+            print(f"Rollups backfilled: {result['orders']} confirmed orders over {result['days']} days")
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Root logging at INFO, as uvicorn setups expect; library modules only get loggers
+    logging.basicConfig(level=logging.INFO)
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    # Deploys that run `python database.py` as a release step set AUTO_CREATE_SCHEMA=0
+    # so booting workers skip the create_all round trips
+    if os.getenv("AUTO_CREATE_SCHEMA", "1").lower() not in ("0", "false", "no"):
+        await run_in_threadpool(init_schema)
+    # Databases from before the rollup tables get their counters built once
+    await run_in_threadpool(_ensure_rollups)
+    # Shared catalog snapshot when CATALOG_SNAPSHOT_DIR is set (multi-worker mode)
+    await run_in_threadpool(start_catalog_snapshot, SessionLocal)
+    yield
+    stop_catalog_snapshot()
+
+def create_app() -> FastAPI:
+    """
+    Builds the ASGI app without touching the disk or the database; startup work
+    runs in lifespan(). Servers and tests serve the module-level `app`.
+    """
+    app = FastAPI(title="Tronix365 API", version="0.1.0", lifespan=lifespan)
+
+    # Token buckets on login/signup/contact/payment; innermost so 429s still get CORS headers and metrics
+    app.add_middleware(RateLimitMiddleware)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Read-your-writes cookie for clients that just wrote (read replicas only)
+    app.add_middleware(RecentWriteCookieMiddleware)
+
+    # Query count and DB time per request; X-DB-* headers when SQL_DEBUG is set
+    app.add_middleware(QueryStatsMiddleware)
+
+    # Latency/status/in-flight per route template; added last so it times the whole stack
+    app.add_middleware(MetricsMiddleware)
+
+    app.add_exception_handler(RequestValidationError, validation_exception_handler)
+    app.include_router(router)
+
+    # Mount static files (immutable caching for hashed uploads, ranges, optional X-Accel-Redirect).
+    # The directory is created at startup, so don't insist on it existing yet.
+    app.mount("/uploads", UploadStaticFiles(directory=UPLOAD_DIR, check_dir=False), name="uploads")
+    return app
+
+app = create_app()
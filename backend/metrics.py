@@ -0,0 +1,247 @@
+import time
+from bisect import bisect_left
+from threading import Lock
+
+# Minimal Prometheus text-format registry. Kept dependency-free and cheap enough
+# to stay on in production: one lock and a few dict operations per observation.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = Lock()
+        REGISTRY.append(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def collect(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}" for labels, v in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self, *labels):
+        """
+        (count, sum) for one label set; used by tests and the benchmark.
+        """
+        series = self._series.get(labels)
+        if not series:
+            return 0, 0.0
+        return sum(series[:-1]), series[-1]
+
+    def collect(self):
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        lines = []
+        names = self.labelnames + ("le",)
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+class CallbackGauge(Metric):
+    """
+    A gauge computed at scrape time, e.g. pool or queue sizes owned by another module.
+    `callback` returns {labels tuple: value}.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def collect(self):
+        try:
+            values = self.callback()
+        except Exception:
+            return [] # A broken collector must not take /metrics down with it
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}" for labels, v in values.items()]
+
+REGISTRY = []
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        samples = metric.collect()
+        if samples:
+            lines.extend(metric.header())
+            lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+# --- Shared metrics -----------------------------------------------------------
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Time from request start to the last response byte.", ("method", "route"))
+REQUESTS = Counter("http_requests_total", "Completed requests by status code.", ("method", "route", "status"))
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled.", ("method",))
+POOL_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled database connection.", ("pool",),
+                      buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0))
+POOL_TIMEOUTS = Counter("db_pool_checkout_timeouts_total", "Checkouts that gave up after pool_timeout seconds.", ("pool",))
+CACHE_REQUESTS = Counter("cache_requests_total", "In-process cache lookups by result (hit/miss).", ("cache", "result"))
+EMAILS_PROCESSED = Counter("email_worker_messages_total", "Outbox messages handled by the email worker: sent, retry (rescheduled) or failed (given up).", ("kind", "outcome"))
+EMAIL_BATCH = Histogram("email_worker_batch_seconds", "Time to render, send and record one claimed batch.", (),
+                        buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+
+def serve(port, host="0.0.0.0"):
+    """
+    Serves render() at /metrics from a daemon thread, for processes without the
+    API (e.g. email_worker.py --metrics-port). Returns the server.
+    """
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass # Scrapes every few seconds would drown the worker's log
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+def _pool_stats():
+    from database import engine
+
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {}
+    return {("checked_out",): pool.checkedout(), ("checked_in",): pool.checkedin(),
+            ("overflow",): pool.overflow(), ("size",): pool.size()}
+
+def _queue_depths():
+    # Modules are imported lazily so importing metrics never drags in the app
+    from database import SessionLocal
+    from email_outbox import outbox_stats
+    import image_utils
+
+    depths = {}
+    db = SessionLocal()
+    try:
+        stats = outbox_stats(db)
+        depths[("email_outbox",)] = stats["pending"] + stats["sending"]
+    finally:
+        db.close()
+    pool = image_utils._pool
+    depths[("image_variants",)] = pool._work_queue.qsize() if pool is not None else 0
+    return depths
+
+DB_POOL = CallbackGauge("db_pool_connections", "Connections in the SQLAlchemy pool by state.", _pool_stats, ("state",))
+QUEUE_DEPTH = CallbackGauge("background_queue_depth", "Work waiting in background queues.", _queue_depths, ("queue",))
+
+def _route_label(scope):
+    # The router records the matched route in the scope dict shared down the stack.
+    # Mounts (/uploads) record none but extend root_path with their prefix.
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    app_root = scope.get("app_root_path", "")
+    root = scope.get("root_path", "")
+    if root != app_root and root.startswith(app_root):
+        return root[len(app_root):] + "/{path}"
+    return "<unmatched>"
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware, so streaming responses pass through
+    untouched). Labels by route template, e.g. '/products/{product_id}', to keep
+    cardinality bounded; paths that match no route share one label.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        # The route is only known once the router has run, so in-flight is per method
+        IN_FLIGHT.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            route = _route_label(scope)
+            REQUEST_LATENCY.observe(duration, method, route)
+            REQUESTS.inc(method, route, str(status["code"]))
+            IN_FLIGHT.dec(method)
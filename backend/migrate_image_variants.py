@@ -0,0 +1,49 @@
+from database import SessionLocal, init_schema
+from models import ProductDB
+from image_utils import generate_variants, variants_for_url, UPLOAD_DIR
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+def run_migration(generate=True):
+    # 1. Missing columns and indexes, as at server startup
+    added = init_schema()
+    if added:
+        logger.info("Added columns: %s", ", ".join(added))
+
+    if not generate:
+        logger.info("Migration complete!")
+        return
+
+    # 2. Generate variants for products that point at a local upload
+    db = SessionLocal()
+    try:
+        products = db.query(ProductDB).filter(ProductDB.image.like("/uploads/%")).all()
+        logger.info("Generating variants for %d products...", len(products))
+        done = 0
+        for product in products:
+            variants = variants_for_url(product.image)
+            if not variants:
+                source_path = os.path.join(UPLOAD_DIR, os.path.basename(product.image))
+                if not os.path.exists(source_path):
+                    logger.warning("Missing file for product %s: %s", product.id, product.image)
+                    continue
+                variants = generate_variants(source_path, os.path.splitext(os.path.basename(source_path))[0])
+            if variants:
+                product.image_variants = variants
+                done += 1
+        db.commit()
+        logger.info("Variants recorded for %d products.", done)
+    finally:
+        db.close()
+
+    logger.info("Migration complete!")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Add image variants to existing products.")
+    parser.add_argument("--schema-only", action="store_true", help="Only add the column, do not generate images")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    run_migration(generate=not args.schema_only)
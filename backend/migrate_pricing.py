@@ -0,0 +1,42 @@
+import logging
+from database import SessionLocal, init_schema
+from sqlalchemy import update, bindparam
+from models import ProductDB, pricing_columns
+
+logger = logging.getLogger(__name__)
+
+def run_migration(batch_size=5000):
+    # 1. Missing columns and indexes, as at server startup
+    added = init_schema()
+    if added:
+        logger.info("Added columns: %s", ", ".join(added))
+
+    # 2. Derive the columns for every product, a batch per statement
+    db = SessionLocal()
+    try:
+        table = ProductDB.__table__
+        stmt = update(table).where(table.c.id == bindparam("product_id")).values(
+            effective_price=bindparam("new_effective_price"), discount_pct=bindparam("new_discount_pct")
+        )
+        rows = db.query(ProductDB.id, ProductDB.price, ProductDB.sale_price, ProductDB.mrp).order_by(ProductDB.id).all()
+        for start in range(0, len(rows), batch_size):
+            params = []
+            for row in rows[start:start + batch_size]:
+                pricing = pricing_columns(row._asdict())
+                params.append({"product_id": row.id, "new_effective_price": pricing["effective_price"], "new_discount_pct": pricing["discount_pct"]})
+            db.execute(stmt, params)
+        db.commit()
+        logger.info("Pricing derived for %d products.", len(rows))
+
+        # Running servers only rebuild after their own writes; publish the new prices
+        from catalog_snapshot import CATALOG_SNAPSHOT_DIR, publish_snapshot
+        if CATALOG_SNAPSHOT_DIR:
+            publish_snapshot(db, CATALOG_SNAPSHOT_DIR)
+    finally:
+        db.close()
+
+    logger.info("Migration complete!")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    run_migration()
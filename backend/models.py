@@ -1,8 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, JSON, Boolean, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Float, ForeignKey, JSON, Boolean, DateTime, Date, Index, event
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator, computed_field
 from typing import List, Optional, Dict, Any
 from datetime import datetime# SQLAlchemy Models (Database Tables)
 class ProductDB(Base):
@@ -14,12 +14,58 @@ class ProductDB(Base):
     price = Column(Float)
     category = Column(String)
     image = Column(String)
+    image_variants = Column(JSON, nullable=True) # Resized WebP/JPEG copies, see image_utils.py
     specs = Column(JSON) # Store specs as JSON
     skv = Column(String, unique=True, nullable=True) # Seller Known Value
     mrp = Column(Float, nullable=True) # Maximum Retail Price
     sale_price = Column(Float, nullable=True) # Discounted Price
     features = Column(JSON, nullable=True) # Bullet points
     stock = Column(Integer, default=100) # Real Stock Quantity
+    # Derived from price/sale_price/mrp on every write (see pricing_columns), so
+    # /products can filter and sort on what customers actually pay via an index
+    effective_price = Column(Float, nullable=True)
+    discount_pct = Column(Float, default=0.0, server_default="0")
+
+    # Review aggregates maintained by review_stats.py alongside each new review
+    review_count = Column(Integer, default=0, server_default="0")
+    rating_sum = Column(Integer, default=0, server_default="0")
+    rating_1 = Column(Integer, default=0, server_default="0")
+    rating_2 = Column(Integer, default=0, server_default="0")
+    rating_3 = Column(Integer, default=0, server_default="0")
+    rating_4 = Column(Integer, default=0, server_default="0")
+    rating_5 = Column(Integer, default=0, server_default="0")
+
+    # The id tie-break makes every sort total, so each of these is a plain index scan
+    __table_args__ = (
+        Index("ix_products_effective_price", "effective_price", "id"),
+        Index("ix_products_category_effective_price", "category", "effective_price", "id"),
+        Index("ix_products_discount_pct", "discount_pct", "id"),
+    )
+
+PRICING_COLUMNS = ("effective_price", "discount_pct")
+
+def pricing_columns(values):
+    """
+    effective_price and discount_pct for a product's price, sale_price and mrp
+    (a mapping or an object). The price is what an order charges: the sale price
+    when set, else the list price. The discount is measured from the MRP, or from
+    the list price when there is no MRP.
+    """
+    get = values.get if isinstance(values, dict) else lambda name: getattr(values, name, None)
+    price, sale_price, mrp = get("price"), get("sale_price"), get("mrp")
+    effective = sale_price if sale_price else price
+    reference = mrp if mrp else price
+    discount = 0.0
+    if effective is not None and reference and reference > effective:
+        discount = round((reference - effective) / reference * 100, 2)
+    return {"effective_price": effective, "discount_pct": discount}
+
+@event.listens_for(ProductDB, "before_insert")
+@event.listens_for(ProductDB, "before_update")
+def _sync_pricing(mapper, connection, target):
+    # ORM writes (admin create/update, seeds); bulk Core writes call pricing_columns themselves
+    for name, value in pricing_columns(target).items():
+        setattr(target, name, value)
 
 class UserDB(Base):
     __tablename__ = "users"
@@ -53,7 +99,7 @@ class OrderDB(Base):
     customer_email = Column(String, index=True)
     total_amount = Column(Float)
     status = Column(String, default="pending")
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
     # Relationship to OrderItemDB
     items = relationship("OrderItemDB", back_populates="order", cascade="all, delete-orphan")
@@ -74,6 +120,7 @@ class ProductBase(BaseModel):
     price: float
     category: str
     image: Optional[str] = None
+    image_variants: Optional[Dict[str, Dict[str, Any]]] = None
     specs: Optional[Dict[str, str]] = None
     skv: Optional[str] = None
     mrp: Optional[float] = None
@@ -112,6 +159,7 @@ class ProductUpdate(BaseModel):
     price: Optional[float] = None
     category: Optional[str] = None
     image: Optional[str] = None
+    image_variants: Optional[Dict[str, Dict[str, Any]]] = None
     specs: Optional[Dict[str, str]] = None
     skv: Optional[str] = None
     mrp: Optional[float] = None
@@ -121,6 +169,39 @@ class ProductUpdate(BaseModel):
 
 class Product(ProductBase):
     id: int
+    effective_price: Optional[float] = None
+    discount_pct: float = 0.0
+    review_count: int = 0
+    # Raw aggregate columns; clients get average_rating and rating_histogram instead
+    rating_sum: int = Field(0, exclude=True)
+    rating_1: int = Field(0, exclude=True)
+    rating_2: int = Field(0, exclude=True)
+    rating_3: int = Field(0, exclude=True)
+    rating_4: int = Field(0, exclude=True)
+    rating_5: int = Field(0, exclude=True)
+
+    @field_validator('discount_pct', 'review_count', 'rating_sum', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5', mode='before')
+    @classmethod
+    def missing_aggregate_is_zero(cls, v):
+        # Rows added before the aggregate columns were backfilled
+        return 0 if v is None else v
+
+    @computed_field
+    @property
+    def average_rating(self) -> Optional[float]:
+        return round(self.rating_sum / self.review_count, 2) if self.review_count else None
+
+    @computed_field
+    @property
+    def rating_histogram(self) -> Dict[str, int]:
+        return {"1": self.rating_1, "2": self.rating_2, "3": self.rating_3, "4": self.rating_4, "5": self.rating_5}
+
+    @computed_field
+    @property
+    def srcset(self) -> Optional[str]:
+        from image_utils import build_srcset
+        return build_srcset(self.image_variants)
+
     class Config:
         from_attributes = True
 
@@ -138,6 +219,32 @@ class OrderCreate(BaseModel):
     customer_email: str
     status: str = "pending"
 
+class CartLine(BaseModel):
+    product_id: int
+    quantity: int = Field(ge=1)
+
+class CartQuoteRequest(BaseModel):
+    items: List[CartLine] = Field(min_length=1)
+
+class CartQuoteLine(BaseModel):
+    product_id: int
+    title: str
+    image: Optional[str] = None
+    quantity: int
+    unit_price: float
+    line_total: float
+    stock: int
+    available: bool # Enough stock for the requested quantity
+
+class CartQuote(BaseModel):
+    lines: List[CartQuoteLine]
+    subtotal: float
+    gst: float
+    shipping: float
+    grand_total: float
+    quote_token: Optional[str] = None # Only when every line is available; accepted by /payment/initiate
+    expires_in: int # Seconds the token stays valid
+
 class Order(OrderCreate):
     id: int
     full_name: Optional[str] = None
@@ -199,9 +306,24 @@ class ReviewDB(Base):
     rating = Column(Integer)
     comment = Column(String)
     created_at = Column(String) # Store as ISO string for simplicity
+    helpful_count = Column(Integer, default=0, server_default="0")
+
+    # One index per review sort; each serves its keyset pages (see review_pages.py)
+    __table_args__ = (
+        Index("ix_reviews_product_created", "product_id", "created_at", "id"),
+        Index("ix_reviews_product_rating", "product_id", "rating", "id"),
+        Index("ix_reviews_product_helpful", "product_id", "helpful_count", "id"),
+    )
+
+class ReviewVoteDB(Base):
+    __tablename__ = "review_votes"
+
+    # One "helpful" vote per user per review
+    review_id = Column(Integer, ForeignKey("reviews.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
 
 class ReviewCreate(BaseModel):
-    rating: int
+    rating: int = Field(ge=1, le=5) # Indexes the 1-5 star histogram on products
     comment: str
 
 class ReviewResponse(BaseModel):
@@ -211,9 +333,20 @@ class ReviewResponse(BaseModel):
     user_name: str
     user_email: str
     created_at: str
+    helpful_count: int = 0
+
+    @field_validator('helpful_count', mode='before')
+    @classmethod
+    def missing_count_is_zero(cls, v):
+        return 0 if v is None else v
+
     class Config:
         from_attributes = True
 
+class ReviewPage(BaseModel):
+    items: List[ReviewResponse]
+    next_cursor: Optional[str] = None # Pass back as ?cursor= for the next page
+
 class ContactMessageDB(Base):
     __tablename__ = "contact_messages"
 
@@ -222,3 +355,50 @@ class ContactMessageDB(Base):
     email = Column(String)
     message = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# Rollup tables maintained by rollups.py (read by /admin/stats)
+class DailyStatsDB(Base):
+    __tablename__ = "daily_stats"
+
+    day = Column(Date, primary_key=True)
+    revenue = Column(Float, default=0.0) # Confirmed revenue for the day
+    order_count = Column(Integer, default=0) # Confirmed orders for the day
+
+class StatCounterDB(Base):
+    __tablename__ = "stat_counters"
+
+    name = Column(String, primary_key=True) # 'orders', 'revenue', 'products', 'users'
+    value = Column(Float, default=0.0)
+
+# Durable email queue, drained by email_worker.py
+class EmailOutboxDB(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String) # 'order_confirmation' or 'contact_notification'
+    payload = Column(JSON) # e.g. {"order_id": 12}
+    status = Column(String, default="pending", index=True) # pending / sending / sent / failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+# Content-addressed upload index, see storage_utils.py
+class StoredFileDB(Base):
+    __tablename__ = "stored_files"
+
+    sha256 = Column(String, primary_key=True) # Hex digest of the file bytes
+    filename = Column(String) # '<sha256>.<ext>' inside uploads/
+    size = Column(Integer)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# Digest of each components/ image as of its last import, so unchanged files are never re-read
+class ComponentFileDB(Base):
+    __tablename__ = "component_files"
+
+    name = Column(String, primary_key=True) # File name inside components/
+    size = Column(Integer)
+    mtime_ns = Column(BigInteger)
+    sha256 = Column(String)
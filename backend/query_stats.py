@@ -0,0 +1,157 @@
+import os
+import re
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Per-request SQL accounting. Every engine is hooked (class-level listeners), but
+# the hooks only do work while a request or capture_queries() has stats active.
+
+# Same statement shape this many times in one request is reported as an N+1 suspect
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+# Expose X-DB-* response headers; meant for development and staging
+SQL_DEBUG = os.getenv("SQL_DEBUG", "").lower() in ("1", "true", "yes")
+
+_WHITESPACE = re.compile(r"\s+")
+# "IN (?, ?, ?)" / "IN (%(id_1)s, %(id_2)s)" collapse to one shape whatever the list length
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s)(?:\s*,\s*(?:\?|%\(\w+\)s))*\s*\)")
+
+def fingerprint(statement):
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    return _PLACEHOLDER_LIST.sub("(?)", statement)
+
+class QueryStats:
+    def __init__(self, scope=None):
+        self.scope = scope  # ASGI scope of the request being measured, if any
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = {}  # fingerprint -> times executed
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.duration += seconds
+        shape = fingerprint(statement)
+        self.shapes[shape] = self.shapes.get(shape, 0) + 1
+
+    @property
+    def route(self):
+        # The router stores the matched route in the shared scope dict, so by the
+        # time queries run this is the template, e.g. 'GET /products/{product_id}'
+        if self.scope is None:
+            return None
+        route = self.scope.get("route")
+        return f"{self.scope['method']} {getattr(route, 'path', self.scope['path'])}"
+
+    def merge(self, other):
+        self.count += other.count
+        self.duration += other.duration
+        for shape, times in other.shapes.items():
+            self.shapes[shape] = self.shapes.get(shape, 0) + times
+
+    def n_plus_one(self, threshold=None):
+        """
+        Statement shapes repeated at least `threshold` times, most repeated first.
+        """
+        threshold = threshold or N_PLUS_ONE_THRESHOLD
+        repeated = [(shape, times) for shape, times in self.shapes.items() if times >= threshold]
+        return sorted(repeated, key=lambda item: -item[1])
+
+    def describe(self):
+        lines = [f"{self.count} queries, {self.duration * 1000:.1f} ms"]
+        for shape, times in sorted(self.shapes.items(), key=lambda item: -item[1]):
+            lines.append(f"  {times}x {shape[:200]}")
+        return "\n".join(lines)
+
+_current = ContextVar("query_stats", default=None)
+_captures = []  # capture_queries() blocks that should also see requests served elsewhere
+
+def current_stats():
+    return _current.get()
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_stats_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    starts = conn.info.get("query_stats_start")
+    if starts:
+        stats.record(statement, time.perf_counter() - starts.pop())
+
+@contextmanager
+def capture_queries():
+    """
+    Collects queries run in this context and by any request that finishes
+    while it is open (TestClient serves requests on another thread).
+    """
+    stats = QueryStats()
+    token = _current.set(stats)
+    _captures.append(stats)
+    try:
+        yield stats
+    finally:
+        _captures.remove(stats)
+        _current.reset(token)
+
+@contextmanager
+def assert_max_queries(limit, allow_n_plus_one=False):
+    """
+    Test helper: fails if the block runs more than `limit` queries, or repeats a
+    statement shape N_PLUS_ONE_THRESHOLD times unless allow_n_plus_one is set.
+
+        with assert_max_queries(4):
+            client.post("/orders", json=payload)
+    """
+    with capture_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        raise AssertionError(f"Expected at most {limit} queries, got {stats.describe()}")
+    if not allow_n_plus_one and stats.n_plus_one():
+        raise AssertionError(f"N+1 query pattern: {stats.describe()}")
+
+class QueryStatsMiddleware:
+    """
+    Pure ASGI middleware that counts queries and DB time per request. Suspected
+    N+1 patterns are logged; with SQL_DEBUG set the numbers are also returned as
+    X-DB-Query-Count / X-DB-Time-Ms / X-DB-N-Plus-One response headers.
+    """
+    def __init__(self, app, debug_headers=None):
+        self.app = app
+        self.debug_headers = SQL_DEBUG if debug_headers is None else debug_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = QueryStats(scope)
+        token = _current.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and self.debug_headers:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.count).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.duration * 1000:.2f}".encode()))
+                suspects = stats.n_plus_one()
+                if suspects:
+                    headers.append((b"x-db-n-plus-one", str(len(suspects)).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            for capture in list(_captures):
+                capture.merge(stats)
+            for shape, times in stats.n_plus_one():
+                logger.warning(f"N+1 suspect on {stats.route}: {times}x {shape[:200]}")
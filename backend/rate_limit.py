@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import importlib
+from collections import OrderedDict
+from threading import Lock
+from urllib.parse import parse_qs
+from metrics import Counter
+
+# Token-bucket rate limits for the endpoints attackers and spammers hammer:
+# credential stuffing on the logins (each attempt costs a pbkdf2 hash), signup
+# and contact spam (DB inserts and Brevo calls) and payment initiation. Buckets are
+# checked per client IP first; that check needs neither the body nor the database. Then
+# they are checked per account, using the email/username in the request body.
+
+# The limited endpoints take a few form or JSON fields; a larger body is refused
+# (413) rather than buffered to find the account in it
+MAX_BODY_BYTES = int(os.getenv("RATE_LIMIT_MAX_BODY", str(64 * 1024)))
+
+RATE_LIMITED = Counter("rate_limited_total", "Requests rejected by the rate limiter.", ("path", "scope"))
+
+class Limit:
+    """
+    `per_minute` tokens refill continuously, up to `burst` saved tokens.
+    """
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.burst = float(burst if burst is not None else per_minute)
+
+class Rule:
+    def __init__(self, ip=None, account=None, account_field=None):
+        self.ip = ip
+        self.account = account
+        self.account_field = account_field # Body field naming the account
+
+RULES = {
+    ("POST", "/login"): Rule(ip=Limit(20, 10), account=Limit(5), account_field="username"),
+    ("POST", "/admin/login"): Rule(ip=Limit(10, 5), account=Limit(5), account_field="username"),
+    ("POST", "/signup"): Rule(ip=Limit(5), account=Limit(2), account_field="email"),
+    ("POST", "/contact"): Rule(ip=Limit(3, 5), account=Limit(2, 3), account_field="email"),
+    ("POST", "/payment/initiate"): Rule(ip=Limit(20), account=Limit(10), account_field="email"),
+}
+
+class MemoryBackend:
+    """
+    Buckets in process memory, split across shards that each have their own lock
+    and LRU order. A check is one dict lookup and a little arithmetic; memory is
+    bounded by evicting the least recently used keys once `max_keys` is reached.
+    An evicted key simply starts again with a full bucket.
+
+    State is per process. To share limits across workers, pass any object with
+    the same hit() method (e.g. one backed by Redis) as the backend, or name a
+    factory in RATE_LIMIT_BACKEND="module:function".
+    """
+    def __init__(self, shards=16, max_keys=100_000):
+        shards = 1 << max(shards - 1, 0).bit_length() # Power of two, for masking
+        self._mask = shards - 1
+        self._per_shard = max(max_keys // shards, 1)
+        self._shards = [(Lock(), OrderedDict()) for _ in range(shards)]
+
+    def hit(self, key, limit, cost=1.0):
+        """
+        Takes `cost` tokens from `key`'s bucket. Returns (allowed, retry_after_seconds).
+        """
+        lock, buckets = self._shards[hash(key) & self._mask]
+        now = time.monotonic()
+        with lock:
+            state = buckets.get(key)
+            if state is None:
+                tokens = limit.burst
+            else:
+                tokens = min(limit.burst, state[0] + (now - state[1]) * limit.rate)
+                buckets.move_to_end(key)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            buckets[key] = (tokens, now)
+            if len(buckets) > self._per_shard:
+                buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (cost - tokens) / limit.rate
+
+    def __len__(self):
+        return sum(len(buckets) for _, buckets in self._shards)
+
+def backend_from_env():
+    path = os.getenv("RATE_LIMIT_BACKEND")
+    if not path:
+        return MemoryBackend()
+    module, _, factory = path.partition(":")
+    return getattr(importlib.import_module(module), factory)()
+
+def _account_from_body(body, content_type, field):
+    try:
+        if content_type.startswith("application/json"):
+            value = json.loads(body).get(field)
+        else:
+            value = parse_qs(body.decode("utf-8", "replace")).get(field, [None])[0]
+    except (ValueError, AttributeError):
+        return None
+    return value.strip().lower() if isinstance(value, str) and value.strip() else None
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware answering 429 with Retry-After once a bucket is empty.
+    Only the paths in `rules` are inspected; everything else passes straight
+    through. Behind a proxy, run uvicorn with --proxy-headers so the client
+    address is the real one.
+    """
+    def __init__(self, app, rules=None, backend=None, enabled=None, max_body=MAX_BODY_BYTES):
+        self.app = app
+        self.rules = RULES if rules is None else rules
+        self.max_body = max_body
+        self.backend = backend or backend_from_env()
+        if enabled is None:
+            enabled = os.getenv("RATE_LIMIT_ENABLED", "1").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        rule = self.rules.get((scope["method"], scope["path"]))
+        if rule is None:
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
+        client = scope.get("client")
+        if rule.ip is not None and client:
+            allowed, retry_after = self.backend.hit(f"{path}|ip|{client[0]}", rule.ip)
+            if not allowed:
+                RATE_LIMITED.inc(path, "ip")
+                return await self._reject(send, retry_after)
+
+        if rule.account is not None:
+            # Buffer the (small) body to read the account, then replay it downstream
+            headers = dict(scope["headers"])
+            declared = headers.get(b"content-length", b"")
+            if declared.isdigit() and int(declared) > self.max_body:
+                return await self._too_large(send)
+            chunks, size, messages = [], 0, []
+            while True:
+                message = await receive()
+                messages.append(message)
+                if message["type"] != "http.request":
+                    break
+                chunks.append(message.get("body", b""))
+                size += len(chunks[-1])
+                if size > self.max_body: # Chunked uploads declare no length
+                    return await self._too_large(send)
+                if not message.get("more_body"):
+                    break
+            content_type = headers.get(b"content-type", b"").decode("latin-1")
+            account = _account_from_body(b"".join(chunks), content_type, rule.account_field)
+            if account is not None:
+                allowed, retry_after = self.backend.hit(f"{path}|account|{account}", rule.account)
+                if not allowed:
+                    RATE_LIMITED.inc(path, "account")
+                    return await self._reject(send, retry_after)
+
+            async def replay():
+                return messages.pop(0) if messages else await receive()
+            return await self.app(scope, replay, send)
+
+        await self.app(scope, receive, send)
+
+    async def _reject(self, send, retry_after):
+        await self._respond(send, 429, "Too many requests. Please try again later.",
+                            [(b"retry-after", str(max(1, int(retry_after + 0.999))).encode())])
+
+    async def _too_large(self, send):
+        # The rest of the body is never read, so the connection cannot be reused
+        await self._respond(send, 413, "Request body too large.", [(b"connection", b"close")])
+
+    async def _respond(self, send, status, detail, headers=()):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                *headers,
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,221 @@
+import os
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from threading import Lock
+from sqlalchemy import event, text, Insert, Update, Delete
+from sqlalchemy.orm import Session
+from metrics import Counter, CallbackGauge
+
+logger = logging.getLogger(__name__)
+
+# With DATABASE_REPLICA_URLS set (comma separated), request sessions for GET/HEAD
+# read from a replica; everything else, and every flush, goes to the primary. A
+# client that committed a write in the last READ_YOUR_WRITES_SECONDS reads from the
+# primary too, so the order it just placed is in /orders/user even while replicas
+# lag. Clients are recognised by their bearer token, and by a short-lived cookie
+# set on the response to any write (which also covers the PayU callback, where
+# the browser has no token). Replicas that refuse connections are skipped until a
+# probe succeeds again.
+REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+HEALTH_CHECK_INTERVAL = float(os.getenv("REPLICA_HEALTH_INTERVAL", "10"))
+READ_METHODS = ("GET", "HEAD")
+RECENT_WRITE_COOKIE = "db_recent_write"
+
+READ_ROUTING = Counter("db_read_routing_total", "Read-only request sessions by the database that served them.", ("target",))
+
+class Replica:
+    def __init__(self, engine):
+        self.engine = engine
+        self.name = engine.url.render_as_string(hide_password=True)
+        self.healthy = False
+        self.checked_at = None # Never probed: the first pick checks it
+        event.listen(engine, "handle_error", self._on_error)
+
+    def _on_error(self, context):
+        # Refused connections and dropped sockets take the replica out until the next
+        # probe; query errors (bad SQL, missing table) say nothing about its health
+        if context.connection is None or context.is_disconnect:
+            self.set_healthy(False)
+
+    def set_healthy(self, healthy):
+        if healthy != self.healthy:
+            (logger.info if healthy else logger.warning)("Read replica %s is %s", self.name, "up" if healthy else "down")
+        self.healthy = healthy
+        self.checked_at = time.monotonic()
+
+    def probe(self):
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except Exception:
+            self.set_healthy(False)
+        else:
+            self.set_healthy(True)
+        return self.healthy
+
+class ReplicaSet:
+    """
+    Round robin over the replicas that answered their last probe. Each replica is
+    re-probed at most every `interval` seconds, by whichever request picks it next.
+    """
+    def __init__(self, engines=(), interval=HEALTH_CHECK_INTERVAL):
+        self.replicas = [Replica(engine) for engine in engines]
+        self.interval = interval
+        self._next = 0
+        self._lock = Lock()
+
+    def replace(self, engines):
+        # In place, so sessions and routing keep referring to this set
+        with self._lock:
+            old, self.replicas, self._next = self.replicas, [Replica(engine) for engine in engines], 0
+        for replica in old:
+            replica.engine.dispose()
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def _claim_probe(self, replica, now):
+        # One request probes a replica that is due; the rest go by its last result
+        with self._lock:
+            if replica.checked_at is not None and now - replica.checked_at < self.interval:
+                return False
+            replica.checked_at = now
+            return True
+
+    def pick(self):
+        """
+        The engine of a healthy replica, or None when all of them are down.
+        """
+        if not self.replicas:
+            return None
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+        now = time.monotonic()
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            if self._claim_probe(replica, now):
+                replica.probe()
+            if replica.healthy:
+                return replica.engine
+        return None
+
+    def health(self):
+        return {(replica.name,): int(replica.healthy) for replica in self.replicas}
+
+class RecentWrites:
+    """
+    Clients that committed a write in the last `window` seconds, kept in this
+    worker's memory (bounded LRU, like the rate limiter's buckets).
+    """
+    def __init__(self, window=READ_YOUR_WRITES_SECONDS, max_keys=100_000):
+        self.window = window
+        self.max_keys = max_keys
+        self._until = OrderedDict()
+        self._lock = Lock()
+
+    def note(self, keys, now=None):
+        until = (now or time.monotonic()) + self.window
+        with self._lock:
+            for key in keys:
+                self._until[key] = until
+                self._until.move_to_end(key)
+            while len(self._until) > self.max_keys:
+                self._until.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._until.clear()
+
+    def seen(self, keys, now=None):
+        now = now or time.monotonic()
+        with self._lock:
+            return any(self._until.get(key, 0) > now for key in keys)
+
+def client_keys(request):
+    """
+    Who a request comes from, for RecentWrites: its bearer token. Not its address,
+    which clients behind one proxy or NAT share; browsers without a token are
+    recognised by RECENT_WRITE_COOKIE instead.
+    """
+    authorization = request.headers.get("authorization")
+    if authorization:
+        return ["auth:" + hashlib.sha256(authorization.encode()).hexdigest()]
+    return []
+
+class RecentWriteCookieMiddleware:
+    """
+    Pure ASGI middleware that sets RECENT_WRITE_COOKIE, expiring after the
+    read-your-writes window, on responses to requests whose session committed a
+    write. The cookie travels with the browser, so it works whichever worker
+    serves the next request.
+    """
+    def __init__(self, app, window=READ_YOUR_WRITES_SECONDS):
+        self.app = app
+        self.cookie = f"{RECENT_WRITE_COOKIE}=1; Max-Age={max(int(window), 1)}; Path=/; HttpOnly; SameSite=Lax".encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            # Endpoints commit before they respond; get_db records it in the request state
+            if message["type"] == "http.response.start" and scope.get("state", {}).get("db_wrote"):
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", self.cookie)]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+class RoutingSession(Session):
+    """
+    Session that reads from a replica when info["read_only"] is set. The replica
+    picked first serves the rest of the session, so a request sees one snapshot.
+    Flushes and Core writes go to the primary, and once a session has written,
+    its later reads do too.
+    """
+    def __init__(self, *args, replicas=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.info.get("read_only"):
+            if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+                self.info["read_only"] = False
+            else:
+                if "replica" not in self.info:
+                    self.info["replica"] = self.replicas.pick() if self.replicas else None
+                    READ_ROUTING.inc("replica" if self.info["replica"] is not None else "primary_failover")
+                if self.info["replica"] is not None:
+                    return self.info["replica"]
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+def install_read_routing(session_factory, replicas, recent_writes):
+    """
+    Records the clients of sessions that commit (see RecentWrites and
+    RecentWriteCookieMiddleware) and returns route_request(request) -> info dict
+    for new request sessions.
+    """
+    @event.listens_for(session_factory, "after_commit")
+    def _note_write(session):
+        if session.info.get("read_only") or "request_state" not in session.info:
+            return
+        session.info["request_state"].db_wrote = True
+        if session.info["client_keys"]:
+            recent_writes.note(session.info["client_keys"])
+
+    def route_request(request):
+        if not replicas or request is None:
+            return {}
+        info = {"client_keys": client_keys(request), "request_state": request.state}
+        if request.method not in READ_METHODS:
+            return info
+        if request.cookies.get(RECENT_WRITE_COOKIE) or recent_writes.seen(info["client_keys"]):
+            READ_ROUTING.inc("primary_recent_write")
+            return info
+        return {**info, "read_only": True}
+
+    CallbackGauge("db_replica_healthy", "1 while a read replica answers its health probe.", replicas.health, ("replica",))
+    return route_request
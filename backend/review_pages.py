@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import base64
+from collections import OrderedDict
+from threading import Lock
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from metrics import CACHE_REQUESTS
+from models import ReviewDB, ReviewPage
+
+# sort -> (key columns, descending). The last key is always the id, so the order is
+# total and a page boundary is just the last row's key. Each sort walks one of the
+# (product_id, <key>, id) indexes declared on ReviewDB.
+#
+# "helpful" sorts on a count that votes keep changing. A review voted up or down
+# while a client is paging moves across the page boundary, so that client can
+# miss it or see it twice; the id tiebreak keeps the order total but cannot pin
+# a moving key. Clients paging by helpfulness should drop repeated ids.
+SORTS = {
+    "newest": ((ReviewDB.created_at, ReviewDB.id), True),
+    "highest": ((ReviewDB.rating, ReviewDB.id), True),
+    "lowest": ((ReviewDB.rating, ReviewDB.id), False),
+    "helpful": ((ReviewDB.helpful_count, ReviewDB.id), True),
+}
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# First pages by (product_id, sort, limit), as serialised JSON. New reviews and votes
+# drop a product's entries in this process; the TTL bounds staleness in other workers.
+FIRST_PAGE_CACHE_SIZE = 2048
+FIRST_PAGE_TTL = float(os.getenv("REVIEW_PAGE_CACHE_TTL", "30"))
+_first_pages = OrderedDict()
+_first_pages_lock = Lock()
+
+class InvalidCursor(ValueError):
+    pass
+
+# JSON type of each sort's key in a cursor (created_at is stored as an ISO string)
+CURSOR_TYPES = {"newest": str, "highest": int, "lowest": int, "helpful": int}
+
+def encode_cursor(sort, values):
+    # The sort travels in the cursor so a cursor is only ever compared with its own keys
+    return base64.urlsafe_b64encode(json.dumps([sort, *values], separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor, sort):
+    """
+    The key values in `cursor`. Raises InvalidCursor for cursors that are
+    malformed or were issued for another sort.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(values, list) or len(values) != 3 or values[0] not in CURSOR_TYPES:
+        raise InvalidCursor("Malformed cursor")
+    if values[0] != sort:
+        raise InvalidCursor(f"Cursor is for sort '{values[0]}', not '{sort}'")
+    key, review_id = values[1:]
+    # bool is an int subclass, but never a valid key
+    if type(key) is not CURSOR_TYPES[sort] or type(review_id) is not int:
+        raise InvalidCursor("Malformed cursor")
+    return [key, review_id]
+
+def fetch_page(db: Session, product_id: int, sort: str, limit: int, cursor: str = None):
+    """
+    One page of a product's reviews plus the cursor for the next one (None on
+    the last page). Seeks past the cursor instead of counting an OFFSET, so
+    page 500 costs the same as page 1.
+    """
+    keys, descending = SORTS[sort]
+    query = db.query(ReviewDB).filter(ReviewDB.product_id == product_id)
+    if cursor is not None:
+        boundary = tuple_(*decode_cursor(cursor, sort))
+        query = query.filter(tuple_(*keys) < boundary if descending else tuple_(*keys) > boundary)
+    query = query.order_by(*[key.desc() if descending else key.asc() for key in keys])
+    rows = query.limit(limit + 1).all() # One extra row tells us whether another page exists
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, [getattr(last, key.key) for key in keys])
+    return ReviewPage(items=rows, next_cursor=next_cursor)
+
+def get_review_page_json(db: Session, product_id: int, sort: str = "newest", limit: int = DEFAULT_LIMIT, cursor: str = None) -> bytes:
+    """
+    Serialised ReviewPage. First pages come from memory until the product gets
+    a new review or vote, or FIRST_PAGE_TTL seconds pass.
+    """
+    if cursor is not None:
+        return fetch_page(db, product_id, sort, limit, cursor).model_dump_json().encode("utf-8")
+
+    key = (product_id, sort, limit)
+    now = time.monotonic()
+    with _first_pages_lock:
+        entry = _first_pages.get(key)
+        if entry is not None and entry[0] > now:
+            _first_pages.move_to_end(key)
+            CACHE_REQUESTS.inc("review_first_page", "hit")
+            return entry[1]
+    CACHE_REQUESTS.inc("review_first_page", "miss")
+    body = fetch_page(db, product_id, sort, limit).model_dump_json().encode("utf-8")
+    with _first_pages_lock:
+        _first_pages[key] = (now + FIRST_PAGE_TTL, body)
+        _first_pages.move_to_end(key)
+        if len(_first_pages) > FIRST_PAGE_CACHE_SIZE:
+            _first_pages.popitem(last=False)
+    return body
+
+def invalidate_reviews(product_id: int):
+    with _first_pages_lock:
+        for key in [key for key in _first_pages if key[0] == product_id]:
+            del _first_pages[key]
+
+def clear_review_cache():
+    with _first_pages_lock:
+        _first_pages.clear()
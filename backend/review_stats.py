@@ -0,0 +1,66 @@
+from sqlalchemy import func, case, select, update, bindparam
+from sqlalchemy.orm import Session
+from models import ProductDB, ReviewDB, ReviewVoteDB
+
+# Per-star counters on products; index 0 is the 1-star column
+STAR_COLUMNS = [ProductDB.rating_1, ProductDB.rating_2, ProductDB.rating_3, ProductDB.rating_4, ProductDB.rating_5]
+AGGREGATE_COLUMNS = ["review_count", "rating_sum", "rating_1", "rating_2", "rating_3", "rating_4", "rating_5"]
+
+def record_review(db: Session, product_id: int, rating: int) -> bool:
+    """
+    Adds one review to the product's aggregates inside the caller's transaction.
+    The increments run in SQL, so concurrent reviews never lose an update.
+    Returns False when the product does not exist.
+    """
+    star = STAR_COLUMNS[rating - 1]
+    updated = db.query(ProductDB).filter(ProductDB.id == product_id).update({
+        ProductDB.review_count: func.coalesce(ProductDB.review_count, 0) + 1,
+        ProductDB.rating_sum: func.coalesce(ProductDB.rating_sum, 0) + rating,
+        star: func.coalesce(star, 0) + 1,
+    }, synchronize_session=False)
+    return updated == 1
+
+def backfill_review_stats(db: Session):
+    """
+    Recomputes every product's aggregates from the reviews table, and each review's
+    helpful_count from its votes, in one transaction.
+    Safe to re-run; use it after bulk loads or manual review edits.
+    """
+    rows = db.query(
+        ReviewDB.product_id,
+        func.count(ReviewDB.id),
+        func.coalesce(func.sum(ReviewDB.rating), 0),
+        *[func.sum(case((ReviewDB.rating == star, 1), else_=0)) for star in range(1, 6)]
+    ).filter(ReviewDB.rating.between(1, 5)).group_by(ReviewDB.product_id).all()
+
+    db.execute(update(ProductDB).values({name: 0 for name in AGGREGATE_COLUMNS}))
+    if rows:
+        stmt = update(ProductDB.__table__).where(ProductDB.__table__.c.id == bindparam("product_id")).values(
+            {name: bindparam(f"new_{name}") for name in AGGREGATE_COLUMNS}
+        )
+        db.execute(stmt, [
+            {"product_id": row[0], **{f"new_{name}": value or 0 for name, value in zip(AGGREGATE_COLUMNS, row[1:])}}
+            for row in rows
+        ])
+    votes = select(func.count()).where(ReviewVoteDB.review_id == ReviewDB.id).scalar_subquery()
+    db.execute(update(ReviewDB).values(helpful_count=votes))
+    db.commit()
+    return {"products": len(rows), "reviews": sum(row[1] for row in rows)}
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal, init_schema
+
+    parser = argparse.ArgumentParser(description="Maintain the review aggregates stored on products.")
+    parser.add_argument("command", choices=["backfill"], help="'backfill' adds any missing columns and indexes and recomputes counts, sums and histograms from reviews")
+    args = parser.parse_args()
+
+    added = init_schema() # Missing columns and indexes, as at server startup
+    if added:
+        print(f"Added columns: {', '.join(added)}")
+    db = SessionLocal()
+    try:
+        result = backfill_review_stats(db)
+        print(f"Backfill complete: {result['reviews']} reviews across {result['products']} products")
+    finally:
+        db.close()
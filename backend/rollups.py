@@ -0,0 +1,249 @@
+from datetime import datetime, date, timedelta
+from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import dialect_insert
+from metrics import CACHE_REQUESTS
+from models import DailyStatsDB, StatCounterDB, OrderDB, ProductDB, UserDB
+
+# Only these order statuses count towards revenue and order totals
+CONFIRMED_STATUSES = ("confirmed",)
+
+def bump_counter(db: Session, name: str, delta: float):
+    """
+    Adds `delta` to a named counter inside the caller's transaction.
+    The caller commits, so the counter moves together with the row it describes.
+    """
+    insert = dialect_insert(db.bind)
+    stmt = insert(StatCounterDB).values(name=name, value=delta)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StatCounterDB.name],
+        set_={"value": StatCounterDB.value + stmt.excluded.value}
+    )
+    db.execute(stmt)
+
+def record_confirmed_order(db: Session, order: OrderDB, day: date = None):
+    """
+    Adds a newly confirmed order to today's bucket and the running totals.
+    Must be called exactly once per order, when its status becomes 'confirmed'.
+    """
+    if day is None:
+        day = order.created_at.date() if order.created_at else datetime.utcnow().date()
+    amount = order.total_amount or 0.0
+
+    insert = dialect_insert(db.bind)
+    stmt = insert(DailyStatsDB).values(day=day, revenue=amount, order_count=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyStatsDB.day],
+        set_={
+            "revenue": DailyStatsDB.revenue + stmt.excluded.revenue,
+            "order_count": DailyStatsDB.order_count + stmt.excluded.order_count
+        }
+    )
+    db.execute(stmt)
+    bump_counter(db, "orders", 1)
+    bump_counter(db, "revenue", amount)
+    if day <= datetime.utcnow().date() - timedelta(days=2):
+        # A late confirmation changes buckets other workers may have cached as closed
+        bump_counter(db, BUCKETS_VERSION, 1)
+    _invalidate_buckets(day)
+
+def _window_revenue(db: Session, start: date, end: date):
+    return db.query(func.sum(DailyStatsDB.revenue)).filter(
+        DailyStatsDB.day >= start, DailyStatsDB.day < end
+    ).scalar() or 0.0
+
+def get_rollup_stats(db: Session, now: datetime = None):
+    """
+    Builds the /admin/stats payload from the counters and the last 60 daily buckets.
+    """
+    if now is None:
+        now = datetime.utcnow()
+    counters = {c.name: c.value for c in db.query(StatCounterDB).all()}
+
+    tomorrow = now.date() + timedelta(days=1)
+    thirty_days_ago = tomorrow - timedelta(days=30)
+    sixty_days_ago = tomorrow - timedelta(days=60)
+
+    current_revenue = _window_revenue(db, thirty_days_ago, tomorrow)
+    previous_revenue = _window_revenue(db, sixty_days_ago, thirty_days_ago)
+
+    if previous_revenue == 0:
+        growth = 100.0 if current_revenue > 0 else 0.0
+    else:
+        growth = ((current_revenue - previous_revenue) / previous_revenue) * 100.0
+
+    return {
+        "total_revenue": counters.get("revenue", 0.0),
+        "total_orders": int(counters.get("orders", 0)),
+        "total_products": int(counters.get("products", 0)),
+        "active_users": int(counters.get("users", 0)),
+        "growth": round(growth, 1)
+    }
+
+# --- Time series ---------------------------------------------------------
+
+GRANULARITIES = ("day", "week", "month")
+MAX_BUCKETS = 1000
+
+# (granularity, bucket_start) -> (revenue, order_count), closed buckets only.
+# A bucket is closed once it ended before yesterday; the one-day grace covers
+# payment callbacks that confirm an order created the previous day. Later
+# confirmations and backfills bump the BUCKETS_VERSION counter, and every
+# worker drops its cached buckets when it reads a new version.
+BUCKETS_VERSION = "timeseries_version"
+_bucket_cache = {}
+_bucket_version = None
+
+def bucket_start(day: date, granularity: str):
+    if granularity == "week":
+        return day - timedelta(days=day.weekday()) # ISO week, starts Monday
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+def next_bucket(start: date, granularity: str):
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+def _invalidate_buckets(day: date):
+    for granularity in GRANULARITIES:
+        _bucket_cache.pop((granularity, bucket_start(day, granularity)), None)
+
+def clear_timeseries_cache():
+    _bucket_cache.clear()
+
+def get_timeseries(db: Session, granularity: str, start: date, end: date, today: date = None):
+    """
+    Returns revenue, order count and average order value per bucket between
+    `start` and `end` (inclusive), read from the daily_stats rollup.
+    Closed buckets are served from memory after a one-row version check, so only
+    the open ones are read from daily_stats.
+    """
+    global _bucket_version
+    if today is None:
+        today = datetime.utcnow().date()
+    closed_before = today - timedelta(days=1)
+
+    version = db.query(StatCounterDB.value).filter(StatCounterDB.name == BUCKETS_VERSION).scalar() or 0
+    if version != _bucket_version:
+        _bucket_cache.clear()
+        _bucket_version = version
+
+    buckets = []
+    current = bucket_start(start, granularity)
+    while current <= end:
+        buckets.append(current)
+        if len(buckets) > MAX_BUCKETS:
+            raise ValueError(f"Range spans more than {MAX_BUCKETS} {granularity} buckets")
+        current = next_bucket(current, granularity)
+
+    missing = [b for b in buckets if (granularity, b) not in _bucket_cache]
+    CACHE_REQUESTS.inc("timeseries_bucket", "hit", amount=len(buckets) - len(missing))
+    CACHE_REQUESTS.inc("timeseries_bucket", "miss", amount=len(missing))
+    fresh = {}
+    if missing:
+        rows = db.query(DailyStatsDB.day, DailyStatsDB.revenue, DailyStatsDB.order_count).filter(
+            DailyStatsDB.day >= missing[0],
+            DailyStatsDB.day < next_bucket(missing[-1], granularity)
+        ).all()
+        for b in missing:
+            fresh[b] = (0.0, 0)
+        for day, revenue, order_count in rows:
+            b = bucket_start(day, granularity)
+            if b in fresh:
+                total, count = fresh[b]
+                fresh[b] = (total + (revenue or 0.0), count + (order_count or 0))
+        for b, value in fresh.items():
+            if next_bucket(b, granularity) <= closed_before:
+                _bucket_cache[(granularity, b)] = value
+
+    series = []
+    for b in buckets:
+        revenue, orders = fresh[b] if b in fresh else _bucket_cache[(granularity, b)]
+        series.append({
+            "bucket": b.isoformat(),
+            "revenue": round(revenue, 2),
+            "orders": orders,
+            "avg_order_value": round(revenue / orders, 2) if orders else 0.0
+        })
+    return series
+
+def _as_date(value):
+    # SQLite returns date() results as 'YYYY-MM-DD' strings
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+def backfill_rollups(db: Session):
+    """
+    Rebuilds every rollup row from the source tables in a single transaction.
+    Safe to re-run; use it after bulk imports or manual DB edits.
+    """
+    # create_all does not add indexes to an existing table
+    db.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_created_at ON orders (created_at)"))
+
+    version = db.query(StatCounterDB.value).filter(StatCounterDB.name == BUCKETS_VERSION).scalar() or 0
+    db.query(DailyStatsDB).delete()
+    db.query(StatCounterDB).delete()
+
+    day_col = func.date(OrderDB.created_at)
+    buckets = db.query(
+        day_col, func.sum(OrderDB.total_amount), func.count(OrderDB.id)
+    ).filter(
+        OrderDB.status.in_(CONFIRMED_STATUSES), OrderDB.created_at.isnot(None)
+    ).group_by(day_col).all()
+
+    total_revenue = 0.0
+    total_orders = 0
+    for day, revenue, order_count in buckets:
+        db.add(DailyStatsDB(day=_as_date(day), revenue=revenue or 0.0, order_count=order_count))
+        total_revenue += revenue or 0.0
+        total_orders += order_count
+
+    db.add_all([
+        StatCounterDB(name="orders", value=total_orders),
+        StatCounterDB(name="revenue", value=total_revenue),
+        StatCounterDB(name="products", value=db.query(ProductDB).count()),
+        StatCounterDB(name="users", value=db.query(UserDB).count()),
+        StatCounterDB(name=BUCKETS_VERSION, value=version + 1),
+    ])
+    db.commit()
+    clear_timeseries_cache()
+    return {"days": len(buckets), "orders": total_orders, "revenue": total_revenue}
+
+def ensure_rollups(db: Session):
+    """
+    Backfills the rollups once on a database that predates them (no counters yet),
+    so /admin/stats starts from the existing orders instead of from zero.
+    Returns the backfill result, or None when the counters are already there.
+    """
+    if db.query(StatCounterDB.name).first() is not None:
+        return None
+    try:
+        return backfill_rollups(db)
+    except IntegrityError:
+        # Another worker backfilled at the same time
+        db.rollback()
+        return None
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal, engine, Base
+
+    parser = argparse.ArgumentParser(description="Maintain the /admin/stats rollup tables.")
+    parser.add_argument("command", choices=["backfill"], help="'backfill' rebuilds all rollups from orders, products and users")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        result = backfill_rollups(db)
+        print(f"Backfill complete: {result['days']} days, {result['orders']} confirmed orders, revenue {result['revenue']:.2f}")
+    finally:
+        db.close()
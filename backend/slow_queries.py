@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import random
+import logging
+from logging.handlers import RotatingFileHandler
+from datetime import datetime, timezone
+from sqlalchemy import event
+from query_stats import fingerprint, current_stats
+
+# Slow-query log: statements slower than SLOW_QUERY_MS are written as JSON lines
+# (statement, fingerprint, parameters, duration, route and plan) to a rotating file.
+# Disabled unless SLOW_QUERY_MS is set. Summarise with `python slow_queries.py`.
+
+SLOW_QUERY_LOG = "slow_queries.log"
+MAX_PARAM_LENGTH = 200
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms, path=SLOW_QUERY_LOG, sample_rate=1.0, explain=True,
+                 explain_analyze=False, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.threshold = threshold_ms / 1000
+        self.path = path
+        self.sample_rate = sample_rate
+        self.explain = explain
+        # ANALYZE runs the statement a second time; only SELECTs are ever explained
+        self.explain_analyze = explain_analyze
+
+        self.logger = logging.getLogger(f"{__name__}.{id(self)}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False # Records are JSON lines, not console output
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.logger.addHandler(handler)
+
+    @classmethod
+    def from_env(cls):
+        threshold = float(os.getenv("SLOW_QUERY_MS", "0") or 0)
+        if threshold <= 0:
+            return None
+        return cls(
+            threshold,
+            path=os.getenv("SLOW_QUERY_LOG", SLOW_QUERY_LOG),
+            sample_rate=float(os.getenv("SLOW_QUERY_SAMPLE_RATE", "1.0")),
+            explain=os.getenv("SLOW_QUERY_EXPLAIN", "1").lower() in ("1", "true", "yes"),
+            explain_analyze=os.getenv("SLOW_QUERY_EXPLAIN_ANALYZE", "").lower() in ("1", "true", "yes"),
+            max_bytes=int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+            backup_count=int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5")),
+        )
+
+    def install(self, engine):
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        return self
+
+    def uninstall(self, engine):
+        event.remove(engine, "before_cursor_execute", self._before)
+        event.remove(engine, "after_cursor_execute", self._after)
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            handler.close()
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("slow_query_start")
+        if not starts:
+            return
+        duration = time.perf_counter() - starts.pop()
+        if duration < self.threshold or random.random() >= self.sample_rate:
+            return
+
+        stats = current_stats()
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "route": stats.route if stats is not None else None,
+            "fingerprint": fingerprint(statement),
+            "statement": statement,
+            "parameters": _loggable(parameters, executemany),
+            "executemany": executemany,
+            "dialect": conn.dialect.name,
+        }
+        if self.explain and not executemany and _is_select(statement):
+            entry["plan"] = self._explain(conn, cursor, statement, parameters)
+        self.logger.info(json.dumps(entry, default=str))
+
+    def _explain(self, conn, cursor, statement, parameters):
+        # Runs on the same DBAPI connection so the plan sees the same transaction
+        dbapi_cursor = cursor.connection.cursor()
+        postgres = conn.dialect.name == "postgresql"
+        try:
+            if postgres:
+                # A failed EXPLAIN must not abort the caller's transaction
+                dbapi_cursor.execute("SAVEPOINT slow_query_explain")
+                prefix = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " if self.explain_analyze else "EXPLAIN (FORMAT JSON) "
+            elif conn.dialect.name == "sqlite":
+                prefix = "EXPLAIN QUERY PLAN "
+            else:
+                prefix = "EXPLAIN "
+            dbapi_cursor.execute(prefix + statement, parameters)
+            rows = [list(row) for row in dbapi_cursor.fetchall()]
+            if postgres:
+                dbapi_cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+                return rows[0][0] if rows else None
+            return rows
+        except Exception as e:
+            if postgres:
+                try:
+                    dbapi_cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                except Exception:
+                    pass
+            return {"error": str(e)}
+        finally:
+            dbapi_cursor.close()
+
+def _is_select(statement):
+    head = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return head in ("SELECT", "WITH")
+
+def _loggable(parameters, executemany):
+    if executemany:
+        # Thousands of rows from the importer would swamp the log; the first few suffice
+        return {"rows": len(parameters), "first": [_truncate(p) for p in list(parameters)[:3]]}
+    return _truncate(parameters)
+
+def _truncate(value):
+    if isinstance(value, dict):
+        return {k: _truncate(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_truncate(v) for v in value]
+    if isinstance(value, (str, bytes)) and len(value) > MAX_PARAM_LENGTH:
+        return f"{value[:MAX_PARAM_LENGTH]!r}... ({len(value)} chars)"
+    return value
+
+def install_slow_query_log(engine):
+    """
+    Attaches the slow-query log to `engine` when SLOW_QUERY_MS is set.
+    """
+    log = SlowQueryLog.from_env()
+    return log.install(engine) if log else None
+
+# --- Report -------------------------------------------------------------------
+
+def read_entries(path):
+    # Oldest rotated file first: slow_queries.log.5 ... .1, then the live file
+    backups = sorted((p for p in os.listdir(os.path.dirname(path) or ".")
+                      if p.startswith(os.path.basename(path) + ".") and p.rsplit(".", 1)[-1].isdigit()),
+                     key=lambda p: -int(p.rsplit(".", 1)[-1]))
+    paths = [os.path.join(os.path.dirname(path), p) for p in backups] + [path]
+    for p in paths:
+        if not os.path.exists(p):
+            continue
+        with open(p, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue # Partially written line at rotation time
+
+def aggregate(entries):
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry["fingerprint"], {
+            "fingerprint": entry["fingerprint"], "count": 0, "total_ms": 0.0,
+            "durations": [], "routes": {}, "plan": None, "last_seen": None,
+        })
+        group["count"] += 1
+        group["total_ms"] += entry["duration_ms"]
+        group["durations"].append(entry["duration_ms"])
+        route = entry.get("route") or "(no request)"
+        group["routes"][route] = group["routes"].get(route, 0) + 1
+        if entry.get("plan") is not None:
+            group["plan"] = entry["plan"] # Latest plan wins
+        group["last_seen"] = entry.get("ts")
+
+    report = []
+    for group in groups.values():
+        durations = sorted(group.pop("durations"))
+        group["total_ms"] = round(group["total_ms"], 3)
+        group["avg_ms"] = round(group["total_ms"] / group["count"], 3)
+        group["p95_ms"] = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+        group["max_ms"] = durations[-1]
+        report.append(group)
+    return report
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarise the slow-query log by statement fingerprint.")
+    parser.add_argument("--log", default=os.getenv("SLOW_QUERY_LOG", SLOW_QUERY_LOG), help="Log file (rotated backups are read too)")
+    parser.add_argument("--sort", choices=["total", "count", "max", "avg"], default="total", help="Order of the report")
+    parser.add_argument("--top", type=int, default=20, help="Number of fingerprints to show")
+    parser.add_argument("--plans", action="store_true", help="Print the latest captured plan for each fingerprint")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    sort_key = {"total": "total_ms", "count": "count", "max": "max_ms", "avg": "avg_ms"}[args.sort]
+    report = sorted(aggregate(read_entries(args.log)), key=lambda g: -g[sort_key])[:args.top]
+
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    elif not report:
+        print(f"No slow queries recorded in {args.log}")
+    else:
+        for group in report:
+            print(f"\n{group['count']}x  total {group['total_ms']:.1f} ms  avg {group['avg_ms']:.1f}  "
+                  f"p95 {group['p95_ms']:.1f}  max {group['max_ms']:.1f}")
+            print(f"  {group['fingerprint'][:300]}")
+            routes = ", ".join(f"{route} ({n})" for route, n in sorted(group["routes"].items(), key=lambda r: -r[1]))
+            print(f"  routes: {routes}")
+            if args.plans and group["plan"] is not None:
+                print("  plan: " + json.dumps(group["plan"], default=str)[:2000])
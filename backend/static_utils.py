@@ -0,0 +1,60 @@
+import os
+from urllib.parse import quote
+from starlette.staticfiles import StaticFiles
+from starlette.responses import Response, FileResponse
+from starlette.datastructures import Headers
+from storage_utils import HASHED_URL
+
+# Hashed uploads never change, so browsers and CDNs may keep them for a year
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Legacy names can be overwritten, so only cache briefly and revalidate
+MUTABLE_CACHE = "public, max-age=300, must-revalidate"
+
+class UploadStaticFiles(StaticFiles):
+    """
+    StaticFiles for /uploads with cache headers chosen by file name.
+
+    Starlette's FileResponse already answers If-None-Match / If-Modified-Since
+    with 304 and serves Range requests with 206. It also hands the file to the
+    server through the ASGI pathsend extension where supported, so the worker
+    does not copy the bytes itself.
+
+    With `accel_redirect_prefix` set (UPLOADS_ACCEL_REDIRECT_PREFIX), responses
+    are empty and carry X-Accel-Redirect. The fronting nginx then streams the
+    file with sendfile, handling ranges and conditionals itself.
+    """
+    def __init__(self, *args, accel_redirect_prefix: str = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if accel_redirect_prefix is None:
+            accel_redirect_prefix = os.getenv("UPLOADS_ACCEL_REDIRECT_PREFIX")
+        self.accel_redirect_prefix = accel_redirect_prefix.rstrip("/") if accel_redirect_prefix else None
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        relative_path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+        immutable = bool(HASHED_URL.match(f"/uploads/{relative_path}"))
+        cache_control = IMMUTABLE_CACHE if immutable else MUTABLE_CACHE
+
+        if self.accel_redirect_prefix:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+            return Response(
+                status_code=status_code,
+                headers={
+                    "X-Accel-Redirect": f"{self.accel_redirect_prefix}/{quote(relative_path)}",
+                    "Content-Type": response.media_type,
+                    "Cache-Control": cache_control
+                }
+            )
+
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers["Cache-Control"] = cache_control
+        if immutable:
+            # The content hash is a strong validator that is identical on every host
+            digest = os.path.basename(relative_path)[:64]
+            response.headers["ETag"] = f'"{digest}"'
+
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return Response(status_code=304, headers={
+                key: value for key, value in response.headers.items()
+                if key in ("cache-control", "etag", "last-modified", "vary", "date")
+            })
+        return response
@@ -0,0 +1,282 @@
+import os
+import re
+import shutil
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.orm import Session
+from models import StoredFileDB, ComponentFileDB, ProductDB, UserDB
+from database import dialect_insert
+
+UPLOAD_DIR = "uploads"
+CHUNK_SIZE = 1024 * 1024
+
+# '/uploads/<64 hex chars>.<ext>': the name is the content, so the URL never changes meaning
+HASHED_URL = re.compile(r"^/uploads/(?:variants/)?[0-9a-f]{64}[.-]")
+
+def is_content_addressed(url: str):
+    return bool(url and HASHED_URL.match(url))
+
+def _extension(filename: str):
+    ext = os.path.splitext(filename or "")[1].lstrip(".").lower()
+    return ext if ext.isalnum() else "bin"
+
+def store_stream(db: Session, fileobj, original_name: str):
+    """
+    Streams `fileobj` into uploads/ while hashing it, and returns (url, created).
+    Identical bytes are stored once: a repeat upload discards the temp file and
+    returns the existing URL, also when the same bytes are being uploaded
+    concurrently. The caller commits the StoredFileDB row.
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+
+    # Temp file in the same directory so the final rename is atomic
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+
+        sha256 = digest.hexdigest()
+        stored = db.get(StoredFileDB, sha256)
+        if stored and os.path.exists(os.path.join(UPLOAD_DIR, stored.filename)):
+            os.remove(tmp_path)
+            return f"/uploads/{stored.filename}", False
+
+        filename = f"{sha256}.{_extension(original_name)}"
+        os.replace(tmp_path, os.path.join(UPLOAD_DIR, filename))
+        if stored:
+            stored.filename = filename # File had gone missing; re-point the row
+            return f"/uploads/{filename}", True
+
+        # Concurrent uploads of the same bytes both get here; the row inserted
+        # first wins and the others use its file
+        insert = dialect_insert(db.get_bind())
+        result = db.execute(insert(StoredFileDB).values(sha256=sha256, filename=filename, size=size)
+                            .on_conflict_do_nothing(index_elements=["sha256"]))
+        if result.rowcount == 1:
+            return f"/uploads/{filename}", True
+        winner = db.query(StoredFileDB.filename).filter(StoredFileDB.sha256 == sha256).scalar()
+        if winner != filename and os.path.exists(os.path.join(UPLOAD_DIR, winner)):
+            os.remove(os.path.join(UPLOAD_DIR, filename)) # Same bytes under another extension
+            filename = winner
+        return f"/uploads/{filename}", False
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def store_file(db: Session, source_path: str):
+    """
+    Adds a file from disk (e.g. components/) to the content-addressed store.
+    """
+    with open(source_path, "rb") as f:
+        return store_stream(db, f, os.path.basename(source_path))
+
+def hash_file(path: str):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ComponentImages:
+    """
+    Resolves CSV image names to stored /uploads/ URLs for the product importer.
+
+    components/ is listed once up front, so matching a name is a dict lookup rather
+    than an os.path.exists per candidate extension. A file whose size and mtime match
+    its component_files row is not read again, and a digest already present in
+    uploads/ is not copied again, so re-importing an unchanged catalog touches no
+    image files. The remaining hashing and copying runs on a thread pool.
+    With dry_run nothing is copied or recorded; URLs are still computed.
+    """
+    EXTENSIONS = ['', '.jpeg', '.jpg', '.png']
+
+    def __init__(self, db: Session, directory: str = "components", workers: int = None, dry_run: bool = False):
+        self.db = db
+        self.dry_run = dry_run
+        self.directory = directory
+        self.files = {}
+        if os.path.isdir(directory):
+            with os.scandir(directory) as entries:
+                self.files = {entry.name: entry.stat() for entry in entries if entry.is_file()}
+        # Plain tuples: the pool threads must not touch ORM instances
+        self.known = {name: (size, mtime_ns, sha256) for name, size, mtime_ns, sha256 in db.query(
+            ComponentFileDB.name, ComponentFileDB.size, ComponentFileDB.mtime_ns, ComponentFileDB.sha256)}
+        self.stored = dict(db.query(StoredFileDB.sha256, StoredFileDB.filename))
+        self.urls = {}
+        self.hashed = 0
+        self.copied = 0
+        self.pool = ThreadPoolExecutor(max_workers=workers or min(8, (os.cpu_count() or 2) * 2), thread_name_prefix="import-image")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.pool.shutdown()
+
+    def locate(self, image_val: str):
+        for ext in self.EXTENSIONS:
+            if image_val + ext in self.files:
+                return image_val + ext
+        return None
+
+    def _materialize(self, name: str):
+        # Runs on the pool: touches the filesystem only, never the session
+        stat = self.files[name]
+        known = self.known.get(name)
+        if known and known[:2] == (stat.st_size, stat.st_mtime_ns):
+            sha256, hashed = known[2], False
+        else:
+            sha256, hashed = hash_file(os.path.join(self.directory, name)), True
+
+        filename = self.stored.get(sha256) or f"{sha256}.{_extension(name)}"
+        target = os.path.join(UPLOAD_DIR, filename)
+        copied = False
+        if not self.dry_run and not os.path.exists(target):
+            fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload-")
+            os.close(fd)
+            try:
+                shutil.copyfile(os.path.join(self.directory, name), tmp_path)
+                os.replace(tmp_path, target)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            copied = True
+        return name, stat, sha256, filename, hashed, copied
+
+    def resolve(self, image_vals):
+        """
+        Stores every components/ file named in `image_vals` and returns
+        {image_val: url}. Names with no matching file are left out.
+        The caller commits the component_files/stored_files rows.
+        """
+        located = {}
+        for image_val in image_vals:
+            if image_val and image_val not in self.urls and not image_val.startswith('http'):
+                name = self.locate(image_val)
+                if name:
+                    located.setdefault(name, []).append(image_val)
+        if located and not self.dry_run:
+            os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+        for name, stat, sha256, filename, hashed, copied in self.pool.map(self._materialize, list(located)):
+            self.hashed += hashed
+            self.copied += copied
+            for image_val in located[name]:
+                self.urls[image_val] = f"/uploads/{filename}"
+            if self.dry_run:
+                continue
+            if hashed:
+                self.known[name] = (stat.st_size, stat.st_mtime_ns, sha256)
+                self.db.merge(ComponentFileDB(name=name, size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha256=sha256))
+            if sha256 not in self.stored:
+                self.stored[sha256] = filename
+                self.db.add(StoredFileDB(sha256=sha256, filename=filename, size=stat.st_size))
+        return self.urls
+
+def referenced_urls(db: Session):
+    """
+    Every /uploads/ URL still pointed at by a product (image or variants) or a user.
+    """
+    urls = set()
+    for image, variants in db.query(ProductDB.image, ProductDB.image_variants).yield_per(1000):
+        if image:
+            urls.add(image)
+        for variant in (variants or {}).values():
+            urls.update(v for k, v in variant.items() if k != "width")
+    for (picture,) in db.query(UserDB.profile_picture).filter(UserDB.profile_picture.isnot(None)).yield_per(1000):
+        urls.add(picture)
+    return urls
+
+def collect_garbage(db: Session, dry_run: bool = True, grace_hours: int = 24):
+    """
+    Deletes stored files (and their variants) that nothing references any more.
+    Files younger than `grace_hours` are kept: they may be uploads whose product
+    form has not been saved yet.
+    """
+    from image_utils import VARIANT_DIR
+
+    referenced = {os.path.basename(url) for url in referenced_urls(db) if url.startswith("/uploads/")}
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=grace_hours)
+    removed = []
+    for stored in db.query(StoredFileDB).filter(StoredFileDB.created_at < cutoff).all():
+        if stored.filename in referenced:
+            continue
+        removed.append(stored.filename)
+        if dry_run:
+            continue
+        path = os.path.join(UPLOAD_DIR, stored.filename)
+        if os.path.exists(path):
+            os.remove(path)
+        if os.path.isdir(VARIANT_DIR):
+            for variant in os.listdir(VARIANT_DIR):
+                if variant.startswith(f"{stored.sha256}-"):
+                    os.remove(os.path.join(VARIANT_DIR, variant))
+        db.delete(stored)
+    if not dry_run:
+        db.commit()
+    return removed
+
+def migrate_existing_uploads(db: Session):
+    """
+    Moves products and users still pointing at legacy upload names onto the
+    content-addressed store, collapsing duplicate copies onto one file.
+    """
+    from image_utils import variants_for_url
+
+    moved = 0
+    for product in db.query(ProductDB).filter(ProductDB.image.like("/uploads/%")).all():
+        if is_content_addressed(product.image):
+            continue
+        source_path = os.path.join(UPLOAD_DIR, os.path.basename(product.image))
+        if not os.path.isfile(source_path):
+            print(f"  ! Missing file for product {product.id}: {product.image}")
+            continue
+        product.image, _ = store_file(db, source_path)
+        product.image_variants = variants_for_url(product.image)
+        moved += 1
+
+    for user in db.query(UserDB).filter(UserDB.profile_picture.like("/uploads/%")).all():
+        if is_content_addressed(user.profile_picture):
+            continue
+        source_path = os.path.join(UPLOAD_DIR, os.path.basename(user.profile_picture))
+        if os.path.isfile(source_path):
+            user.profile_picture, _ = store_file(db, source_path)
+            moved += 1
+
+    db.commit()
+    return moved
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal, engine, Base
+
+    parser = argparse.ArgumentParser(description="Manage the content-addressed upload store.")
+    parser.add_argument("command", choices=["migrate", "gc"], help="'migrate' rewrites legacy upload URLs to hashed names; 'gc' lists or deletes unreferenced files")
+    parser.add_argument("--delete", action="store_true", help="With 'gc', actually delete instead of listing")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.command == "migrate":
+            print(f"Moved {migrate_existing_uploads(db)} references onto hashed files.")
+            print("Legacy files were left in place; run 'gc' after checking the site.")
+        else:
+            removed = collect_garbage(db, dry_run=not args.delete)
+            verb = "Deleted" if args.delete else "Unreferenced"
+            for filename in removed:
+                print(f"  - {filename}")
+            print(f"{verb}: {len(removed)} files")
+    finally:
+        db.close()
@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+
+os.environ.setdefault("PAYU_KEY", "test-key")
+os.environ.setdefault("PAYU_SALT", "test-salt")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app
+
+def test_cart_quote():
+    from fastapi.testclient import TestClient
+    from database import SessionLocal
+    from models import ProductDB, OrderDB
+    from cart_quote import verify_quote, InvalidQuote
+
+    with throwaway_app("test_cart_quote") as app: # Schema created; TestClient without `with` skips the lifespan
+        db = SessionLocal()
+        db.add_all([
+            ProductDB(title="Sale Board", description="On sale", price=500.0, sale_price=450.0, stock=10, category="Boards"),
+            ProductDB(title="Plain Sensor", description="List price", price=99.5, stock=3, category="Sensors"),
+        ])
+        db.commit()
+        db.close()
+
+        client = TestClient(app)
+        # The sensor appears twice; lines are merged before the stock check
+        cart = {"items": [{"product_id": 1, "quantity": 2}, {"product_id": 2, "quantity": 1}, {"product_id": 2, "quantity": 1}]}
+        quote = client.post("/cart/quote", json=cart).json()
+        lines = {line["product_id"]: line for line in quote["lines"]}
+        assert (lines[1]["unit_price"] == 450.0 and lines[2]["unit_price"] == 99.5 and lines[2]["quantity"] == 2
+                and quote["subtotal"] == 1099.0 and quote["gst"] == 197.82 and quote["grand_total"] == 1296.82), \
+            f"Unexpected quote {quote}"
+        print("SUCCESS: Quote prices lines with the sale price fallback, GST and total.")
+
+        short = client.post("/cart/quote", json={"items": [{"product_id": 2, "quantity": 5}]}).json()
+        missing = client.post("/cart/quote", json={"items": [{"product_id": 99, "quantity": 1}]})
+        assert short["lines"][0]["available"] is False and short["quote_token"] is None and missing.status_code == 404, \
+            f"Got {short} and {missing.status_code}"
+        print("SUCCESS: Short stock gets no token and unknown products a 404.")
+
+        # The client-sent amount is ignored; the order takes the quoted total
+        payment = {"amount": 1.0, "firstname": "Quote", "email": "quote@example.com", "productinfo": "Quote order",
+                   "quote_token": quote["quote_token"], "phone": "9999999999", "address_line": "1 Test Road",
+                   "city": "Pune", "state": "Maharashtra", "pincode": "411001"}
+        response = client.post("/payment/initiate", json=payment).json()
+        db = SessionLocal()
+        order = db.query(OrderDB).filter(OrderDB.txnid == response["txnid"]).one()
+        items = sorted((item.product_id, item.quantity, item.price_at_purchase) for item in order.items)
+        db.close()
+        assert response["amount"] == "1296.82" and order.total_amount == 1296.82 and items == [(1, 2, 450.0), (2, 2, 99.5)], \
+            f"Order {order.total_amount} {items}, response {response}"
+        print("SUCCESS: /payment/initiate creates the order from the quote token.")
+
+        # A token places one order; replaying it (e.g. a second tab) is refused
+        replay = client.post("/payment/initiate", json=payment)
+        db = SessionLocal()
+        orders = db.query(OrderDB).count()
+        db.close()
+        assert replay.status_code == 400 and "already used" in replay.json()["detail"] and orders == 1, \
+            f"Replay got {replay.status_code} {replay.text}, {orders} orders"
+        print("SUCCESS: A used quote token is rejected.")
+
+        # Stock sold out after the quote was signed
+        fresh = client.post("/cart/quote", json={"items": [{"product_id": 2, "quantity": 3}]}).json()
+        db = SessionLocal()
+        db.query(ProductDB).filter(ProductDB.id == 2).update({"stock": 1})
+        db.commit()
+        db.close()
+        sold_out = client.post("/payment/initiate", json={**payment, "quote_token": fresh["quote_token"]})
+        assert fresh["quote_token"] and sold_out.status_code == 400 and "no longer in stock" in sold_out.json()["detail"], \
+            f"Sold-out quote got {sold_out.status_code} {sold_out.text}"
+        print("SUCCESS: Stock is checked again when a quote is paid.")
+
+        # Quantities below 1 would lower the total and raise stock on confirmation
+        negative = client.post("/payment/initiate", json={**payment, "quote_token": None,
+                                                          "items": [{"product_id": 1, "quantity": 2}, {"product_id": 2, "quantity": -5}]})
+        assert negative.status_code == 422, f"Negative quantity got {negative.status_code} {negative.text}"
+        print("SUCCESS: Quantities below 1 are refused on the items path.")
+
+        body, _, signature = quote["quote_token"].partition(".")
+        tampered = client.post("/payment/initiate", json={**payment, "quote_token": body[:-2] + "xx." + signature})
+        non_ascii = client.post("/payment/initiate", json={**payment, "quote_token": body + ".sïgnature"})
+        assert non_ascii.status_code == 400, f"Non-ASCII token got {non_ascii.status_code}"
+        try:
+            verify_quote(quote["quote_token"], now=time.time() + 3600)
+            expired = False
+        except InvalidQuote:
+            expired = True
+        assert tampered.status_code == 400 and expired, f"Tampered token got {tampered.status_code}, expiry enforced: {expired}"
+        print("SUCCESS: Tampered and expired tokens are rejected.")
+
+if __name__ == "__main__":
+    test_cart_quote()
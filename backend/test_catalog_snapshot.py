@@ -0,0 +1,120 @@
+import os
+import sys
+import time
+
+# Rebuild soon after a write; read when catalog_snapshot is first imported
+os.environ["CATALOG_REBUILD_DEBOUNCE"] = "0.1"
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app
+
+QUERIES = [
+    {},
+    {"skip": 40, "limit": 20},
+    {"category": "Sensors"},
+    {"category": "Motors", "sort_by": "price_desc", "limit": 50},
+    {"sort_by": "price_asc", "min_price": 150, "max_price": 260},
+    {"sort_by": "name_asc", "skip": 10},
+    {"sort_by": "discount_desc", "limit": 40},
+    {"category": "Sensors", "sort_by": "discount_desc", "max_price": 200},
+    {"search": "ESP32", "sort_by": "price_asc"},
+    {"search": "relay", "category": "Modules"},
+    {"search": "no-such-term"},
+    {"category": "Unknown"},
+]
+
+def test_catalog_snapshot():
+    from fastapi.testclient import TestClient
+    from database import SessionLocal
+    from models import ProductDB
+    import catalog_snapshot
+
+    with throwaway_app("test_catalog_snapshot", snapshot_dir="test_catalog_snapshot") as app:
+        db = SessionLocal()
+        categories = ["Sensors", "Motors", "Modules", "Displays"]
+        words = ["ESP32 board", "Relay module", "Ultrasonic sensor", "Servo motor", "OLED display"]
+        db.add_all([
+            ProductDB(title=f"{words[i % 5]} {i:03d}", description=f"Part number {i * 7}", category=categories[i % 4],
+                      price=100.0 + (i * 37) % 300 + i / 1000, sale_price=90.0 + (i * 13) % 200 if i % 3 == 0 else None,
+                      mrp=450.0 if i % 5 == 0 else None, stock=10)
+            for i in range(300)
+        ])
+        db.commit()
+        db.close()
+
+        with TestClient(app) as client:
+            snapshot = catalog_snapshot.current_snapshot()
+            assert snapshot is not None and snapshot.count == 300, "No snapshot after startup."
+            print("SUCCESS: Snapshot published at startup.")
+
+            # Same answers as the database path
+            mismatches = []
+            reader = catalog_snapshot._reader
+            requests = [("/products", params) for params in QUERIES] + [("/products/7", {}), ("/products/9999", {})]
+            for url, params in requests:
+                from_snapshot = client.get(url, params=params)
+                catalog_snapshot._reader = None
+                from_db = client.get(url, params=params)
+                catalog_snapshot._reader = reader
+                if (from_snapshot.status_code, from_snapshot.json()) != (from_db.status_code, from_db.json()):
+                    mismatches.append((url, params))
+            assert not mismatches, f"Snapshot differs from the database for {mismatches}"
+            print(f"SUCCESS: {len(requests)} queries match the database path.")
+
+            # A write publishes a new generation that other workers pick up
+            generation = snapshot.generation
+            client.put("/products/7", json={"price": 999.0})
+            other_worker = catalog_snapshot.SnapshotReader("test_catalog_snapshot")
+            deadline = time.time() + 10
+            while time.time() < deadline and catalog_snapshot.current_snapshot().generation == generation:
+                time.sleep(0.05)
+            fresh = catalog_snapshot.current_snapshot()
+            assert fresh.generation != generation and client.get("/products/7").json()["price"] == 999.0 \
+                    and other_worker.current().generation == fresh.generation, \
+                "Snapshot was not rebuilt after the write."
+            print("SUCCESS: Product write swapped in a new snapshot for every reader.")
+
+            # Orders change stock without a rebuild; responses read it live
+            generation = fresh.generation
+            client.post("/orders", json={"customer_email": "snap@example.com", "total_amount": 200.0,
+                                         "items": [{"product_id": 5, "quantity": 2}]})
+            time.sleep(0.3) # Longer than the debounce
+            stock = client.get("/products/5").json()["stock"]
+            listed = {p["id"]: p["stock"] for p in client.get("/products", params={"limit": 10}).json()}
+            assert catalog_snapshot.current_snapshot().generation == generation and stock == 8 and listed[5] == 8, \
+                f"Stock {stock} / {listed.get(5)}, generation changed: {catalog_snapshot.current_snapshot().generation != generation}"
+            print("SUCCESS: An order updates stock in snapshot responses without a rebuild.")
+
+            # Builds are taken by one worker at a time; the others leave requests to it
+            other = catalog_snapshot.SnapshotPublisher("test_catalog_snapshot", SessionLocal)
+            with catalog_snapshot._build_lock("test_catalog_snapshot"):
+                other.mark_dirty() # Thread retries until the lock is free
+                busy = other.rebuild_requested()
+            deadline = time.time() + 10
+            while time.time() < deadline and catalog_snapshot.current_snapshot().generation == generation:
+                time.sleep(0.05)
+            other.stop()
+            rebuilt = catalog_snapshot.current_snapshot().generation != generation
+            assert busy is False and rebuilt and other.rebuild_requested() is True, f"Busy returned {busy}, rebuilt after release: {rebuilt}"
+            print("SUCCESS: A request made while another worker builds is built once the lock frees.")
+
+            # CURRENT naming a generation already deleted by later builds
+            reader = catalog_snapshot.SnapshotReader("test_catalog_snapshot")
+            attached = reader.current()
+            pointer = os.path.join("test_catalog_snapshot", catalog_snapshot.POINTER)
+            with open(pointer) as f:
+                published = f.read()
+            with open(pointer, "w") as f:
+                f.write("catalog-0.snap")
+            try:
+                kept = reader.current()
+            except FileNotFoundError:
+                kept = None
+            with open(pointer, "w") as f:
+                f.write(published)
+            assert kept is attached and reader.current().generation == attached.generation, f"Reader returned {kept} for a removed generation."
+            print("SUCCESS: A reader keeps its mapping when CURRENT names a removed generation.")
+
+if __name__ == "__main__":
+    test_catalog_snapshot()
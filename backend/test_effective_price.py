@@ -0,0 +1,58 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app
+
+CSV = """skv,title,category,price,mrp,sale_price,stock,description,features,specs,image
+EFF-001,Imported Relay,Modules,80,100,60,5,Relay module,,,
+EFF-002,Imported Servo,Motors,200,,,5,Servo motor,,,
+"""
+
+def test_effective_price():
+    from fastapi.testclient import TestClient
+    from sqlalchemy import text
+
+    with throwaway_app("test_effective_price") as app: # Schema created; TestClient without `with` skips the lifespan
+        from database import engine
+        client = TestClient(app)
+        board = client.post("/products", json={"title": "Sale Board", "description": "On sale", "category": "Boards",
+                                               "price": 500.0, "mrp": 600.0, "sale_price": 400.0, "stock": 5}).json()
+        client.post("/products", json={"title": "Plain Board", "description": "List price", "category": "Boards", "price": 450.0, "stock": 5})
+        assert board["effective_price"] == 400.0 and board["discount_pct"] == 33.33, f"Unexpected pricing {board}"
+        print("SUCCESS: Product create derives effective price and discount.")
+
+        # The sale price is what customers pay, so it decides the order
+        titles = [p["title"] for p in client.get("/products", params={"sort_by": "price_asc"}).json()]
+        updated = client.put(f"/products/{board['id']}", json={"sale_price": None}).json()
+        titles_after = [p["title"] for p in client.get("/products", params={"sort_by": "price_asc"}).json()]
+        assert titles == ["Sale Board", "Plain Board"] and titles_after == ["Plain Board", "Sale Board"] and updated["discount_pct"] == 16.67, \
+            f"Orders {titles} then {titles_after}, updated {updated}"
+        print("SUCCESS: Updates resync pricing and price sorting follows it.")
+
+        with open("test_effective_price.csv", "w") as f:
+            f.write(CSV)
+        from import_products import import_products
+        try:
+            import_products("test_effective_price.csv")
+        finally:
+            os.remove("test_effective_price.csv")
+        imported = {p["title"]: p for p in client.get("/products", params={"sort_by": "discount_desc"}).json()}
+        top = client.get("/products", params={"sort_by": "discount_desc", "limit": 1}).json()[0]
+        cheap = [p["title"] for p in client.get("/products", params={"max_price": 100}).json()]
+        assert imported["Imported Relay"]["effective_price"] == 60.0 and top["title"] == "Imported Relay" and cheap == ["Imported Relay"], \
+            f"Imported {imported}, top discount {top['title']}, under 100: {cheap}"
+        print("SUCCESS: Imports set pricing; discount sort and price filters use it.")
+
+        plans = []
+        with engine.connect() as conn:
+            for sql in ("SELECT id FROM products ORDER BY effective_price, id LIMIT 20",
+                        "SELECT id FROM products WHERE category = 'Boards' ORDER BY effective_price DESC, id DESC LIMIT 20",
+                        "SELECT id FROM products ORDER BY discount_pct DESC, id DESC LIMIT 20"):
+                plans.append(" ".join(str(row) for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql))))
+        assert all("USING" in plan and "INDEX" in plan and "TEMP B-TREE" not in plan for plan in plans), f"Plans need a sort step: {plans}"
+        print("SUCCESS: Price and discount sorts are index scans.")
+
+if __name__ == "__main__":
+    test_effective_price()
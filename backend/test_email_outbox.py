@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Credentials before importing the app; the mock's URL is set once it has a port
+os.environ["BREVO_API_KEY"] = "test-key"
+os.environ["CONTACT_EMAIL"] = "support@example.com"
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app
+
+class MockBrevoHandler(BaseHTTPRequestHandler):
+    received = []
+    fail_next = 0
+    protocol_version = "HTTP/1.1" # keep-alive, like the real API
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if MockBrevoHandler.fail_next > 0:
+            MockBrevoHandler.fail_next -= 1
+            self._reply(503, {"message": "try again"})
+            return
+        MockBrevoHandler.received.append((self.headers.get("api-key"), json.loads(body)))
+        self._reply(201, {"messageId": f"<mock-{len(MockBrevoHandler.received)}>"})
+
+    def _reply(self, status, data):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def test_outbox_delivery():
+    import email_utils
+
+    # Port 0: the OS picks a free port, so parallel runs do not collide
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockBrevoHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    brevo_url = email_utils.BREVO_API_URL
+    email_utils.BREVO_API_URL = f"http://127.0.0.1:{server.server_address[1]}/v3/smtp/email"
+
+    from database import SessionLocal
+    from models import EmailOutboxDB
+    from email_outbox import enqueue_contact_notification, outbox_stats
+    from email_worker import process_batch, WorkerMetrics
+
+    with throwaway_app("test_email_outbox"):
+        db = SessionLocal()
+        try:
+            # 1. Queue messages; nothing is sent until a worker claims them
+            for i in range(5):
+                enqueue_contact_notification(db, f"Tester {i}", f"tester{i}@example.com", "Hello")
+            db.commit()
+            print(f"Queued: {outbox_stats(db)}")
+
+            # 2. First attempt: the mock rejects two sends with 503
+            MockBrevoHandler.fail_next = 2
+            metrics = WorkerMetrics()
+            process_batch(batch_size=10, concurrency=2, metrics=metrics)
+            stats = outbox_stats(db)
+            print(f"After first batch: {stats} | worker: {metrics.as_dict()}")
+            assert stats["sent"] == 3 and stats["pending"] == 2, "Unexpected queue state after first batch."
+            print("SUCCESS: Transient failures were rescheduled.")
+
+            # 3. Make the retries due now and drain again
+            db.query(EmailOutboxDB).filter(EmailOutboxDB.status == "pending").update(
+                {"next_attempt_at": EmailOutboxDB.created_at}, synchronize_session=False
+            )
+            db.commit()
+            process_batch(batch_size=10, concurrency=2, metrics=metrics)
+            stats = outbox_stats(db)
+            print(f"After retry: {stats} | worker: {metrics.as_dict()}")
+            assert stats["sent"] == 5 and len(MockBrevoHandler.received) == 5, "Not every message was delivered."
+            print("SUCCESS: All messages delivered to the mock Brevo server.")
+
+            # 4. A message that raises while rendering is rescheduled; the rest of its batch is sent
+            import email_worker
+            from metrics import EMAILS_PROCESSED
+            for i in range(3):
+                enqueue_contact_notification(db, f"Later {i}", f"later{i}@example.com", "Hello again")
+            db.commit()
+            broken_id = db.query(EmailOutboxDB.id).filter(EmailOutboxDB.status == "pending").order_by(EmailOutboxDB.id).first()[0]
+            build_message = email_worker.build_message
+            def flaky_build(session, message):
+                if message.id == broken_id:
+                    raise KeyError("template")
+                return build_message(session, message)
+            sent_before, retry_before = EMAILS_PROCESSED.value("contact_notification", "sent"), EMAILS_PROCESSED.value("contact_notification", "retry")
+            email_worker.build_message = flaky_build
+            try:
+                process_batch(batch_size=10, concurrency=2, metrics=metrics)
+            finally:
+                email_worker.build_message = build_message
+            db.expire_all()
+            broken = db.get(EmailOutboxDB, broken_id)
+            stats = outbox_stats(db)
+            assert broken.status == "pending" and "KeyError" in broken.last_error and stats["sent"] == 7 and stats["sending"] == 0 \
+                    and EMAILS_PROCESSED.value("contact_notification", "sent") - sent_before == 2 \
+                    and EMAILS_PROCESSED.value("contact_notification", "retry") - retry_before == 1, \
+                f"Broken message {broken.status} ({broken.last_error}), queue {stats}"
+            print("SUCCESS: A message that fails to render is retried later without stalling its batch.")
+        finally:
+            db.close()
+            server.shutdown()
+            server.server_close()
+            email_utils.BREVO_API_URL = brevo_url
+
+if __name__ == "__main__":
+    test_outbox_delivery()
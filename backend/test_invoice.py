@@ -0,0 +1,43 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app
+
+def test_invoice_escapes_customer_fields():
+    from fastapi.testclient import TestClient
+    from database import SessionLocal
+    from models import ProductDB, OrderDB, OrderItemDB
+
+    with throwaway_app("test_invoice") as app: # Schema created; TestClient without `with` skips the lifespan
+        db = SessionLocal()
+        product = ProductDB(title='Board <img src=x onerror="alert(2)">', description="Escaping test product", price=100.0, stock=5, category="Test")
+        db.add(product)
+        db.flush()
+        order = OrderDB(
+            customer_email="buyer@example.com", total_amount=118.0, status="confirmed",
+            full_name="<script>alert(1)</script>", address_line="1 Test Road", city="Pune", state="Maharashtra", pincode="411001",
+            items=[OrderItemDB(product_id=product.id, quantity=1, price_at_purchase=100.0)]
+        )
+        db.add(order)
+        db.commit()
+        order_id = order.id
+        db.close()
+
+        client = TestClient(app)
+        token = client.post("/signup", json={"email": "buyer@example.com", "password": "secret123", "full_name": "Buyer"}).json()["access_token"]
+        response = client.get(f"/orders/{order_id}/invoice", params={"format": "html"}, headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, f"Invoice got {response.status_code} {response.text}"
+        body = response.text
+        assert "<script>" not in body and "&lt;script&gt;alert(1)&lt;/script&gt;" in body, "Customer name not escaped"
+        assert "<img src=x" not in body and "Board &lt;img src=x onerror=&quot;alert(2)&quot;&gt;" in body, "Product title not escaped"
+        assert body.count("<tr>") > 1 and "118.00" in body, "Item rows or totals missing from the invoice"
+        print("SUCCESS: Customer and product fields are HTML-escaped in the invoice.")
+
+        data = client.get(f"/orders/{order_id}/invoice", headers={"Authorization": f"Bearer {token}"}).json()
+        assert data["full_name"] == "<script>alert(1)</script>" and data["grand_total"] == 118.0, f"Invoice JSON: {data}"
+        print("SUCCESS: The JSON invoice keeps the raw values for the page to render as text.")
+
+if __name__ == "__main__":
+    test_invoice_escapes_customer_fields()
@@ -0,0 +1,42 @@
+import os
+import sys
+
+# /metrics open to the test client
+os.environ.pop("METRICS_TOKEN", None)
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app
+
+def test_metrics_endpoint():
+    from fastapi.testclient import TestClient
+    from metrics import REQUESTS, REQUEST_LATENCY
+
+    with throwaway_app("test_metrics") as app: # Schema created; TestClient without `with` skips the lifespan
+        client = TestClient(app)
+        # Metrics are per process; earlier tests in the session may have counted already
+        not_found = REQUESTS.value("GET", "/products/{product_id}", "404")
+        listed = REQUESTS.value("GET", "/products", "200")
+        timed = REQUEST_LATENCY.snapshot("GET", "/products/{product_id}")[0]
+        for product_id in (1, 2, 3):
+            client.get(f"/products/{product_id}") # 404s on the empty DB, still counted
+        client.get("/products")
+
+        body = client.get("/metrics").text
+        expected = [
+            f'http_requests_total{{method="GET",route="/products/{{product_id}}",status="404"}} {not_found + 3}',
+            f'http_requests_total{{method="GET",route="/products",status="200"}} {listed + 1}',
+            f'http_request_duration_seconds_count{{method="GET",route="/products/{{product_id}}"}} {timed + 3}',
+            'db_pool_connections{state="checked_out"}',
+            'background_queue_depth{queue="email_outbox"} 0',
+        ]
+        missing = [line for line in expected if line not in body]
+        assert not missing, f"Missing from /metrics: {missing}"
+        print("SUCCESS: /metrics reports per-route counts, latency, pool and queue gauges.")
+
+        # Route templates, not raw paths, so ids never create new series
+        assert "/products/1\"" not in body, "Raw path leaked into metric labels."
+        print("SUCCESS: Labels use route templates.")
+
+if __name__ == "__main__":
+    test_metrics_endpoint()
@@ -0,0 +1,71 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app
+
+def test_pool_profiles():
+    from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+    from database import engine_options, create_db_engine
+    from metrics import POOL_WAIT, POOL_TIMEOUTS, render
+
+    default = engine_options("postgresql://shop@localhost/tronix365")
+    lean = engine_options("postgresql://shop@localhost/tronix365", "lean")
+    pooler = engine_options("postgresql+psycopg://shop@pgbouncer:6432/tronix365", "pooler")
+    pooler_psycopg2 = engine_options("postgresql://shop@pgbouncer:6432/tronix365", "pooler")
+    assert (default["pool_pre_ping"] and not lean["pool_pre_ping"] and lean["pool_use_lifo"]
+            and not pooler["pool_pre_ping"] and pooler["connect_args"] == {"prepare_threshold": None}
+            and "connect_args" not in pooler_psycopg2 and "prepared_statements" not in pooler), \
+        f"Unexpected options {default} / {lean} / {pooler} / {pooler_psycopg2}"
+    print("SUCCESS: Profiles set pre-ping, LIFO and prepared statements as documented.")
+
+    # SQLite keeps SQLAlchemy's own pools; an in-memory database must stay one database
+    from sqlalchemy import text
+    memory = create_db_engine("sqlite://")
+    with memory.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        with memory.connect() as other: # A second checkout while the first is held
+            tables = other.execute(text("SELECT name FROM sqlite_master")).scalars().all()
+    memory.dispose()
+    assert "poolclass" not in engine_options("sqlite://") and tables == ["t"], f"sqlite:// options {engine_options('sqlite://')}, tables seen {tables}"
+    print("SUCCESS: sqlite:// keeps SQLAlchemy's pool and one in-memory database.")
+
+    with throwaway_app("test_pool_profiles"): # /metrics reads the outbox depth from its engine
+        os.environ.update({"DB_POOL_SIZE": "1", "DB_MAX_OVERFLOW": "0", "DB_POOL_TIMEOUT": "0.05", "DB_POOL_PRE_PING": "0"})
+        try:
+            overridden = engine_options("postgresql://shop@localhost/tronix365")
+            try:
+                engine_options("postgresql://shop@localhost/tronix365", "turbo")
+                rejected = False
+            except ValueError:
+                rejected = True
+            assert (overridden["pool_size"], overridden["max_overflow"], overridden["pool_timeout"], overridden["pool_pre_ping"]) == (1, 0, 0.05, False) \
+                    and rejected and "pool_size" not in engine_options("sqlite:///./test_pool_profiles.db"), \
+                f"Overrides gave {overridden}, unknown profile rejected: {rejected}"
+            print("SUCCESS: Environment overrides win and unknown profiles are rejected.")
+
+            # One connection, no overflow: a second checkout waits pool_timeout, then gives up
+            small = create_db_engine("sqlite:///./test_pool_profiles.db", "default", name="test_small")
+            held = small.connect()
+            try:
+                small.connect()
+                timed_out = False
+            except PoolTimeoutError:
+                timed_out = True
+            held.close()
+            small.connect().close()
+            small.dispose()
+
+            waits, waited = POOL_WAIT.snapshot("test_small")
+            body = render()
+            assert timed_out and POOL_TIMEOUTS.value("test_small") == 1 and waits == 3 and waited >= 0.05 \
+                    and 'db_pool_checkout_timeouts_total{pool="test_small"} 1' in body and 'db_pool_checkout_wait_seconds_count{pool="test_small"} 3' in body, \
+                f"Timed out: {timed_out}, timeouts {POOL_TIMEOUTS.value('test_small')}, waits {waits} totalling {waited:.3f}s"
+            print("SUCCESS: Checkout waits and timeouts are exported per pool.")
+        finally:
+            for variable in ("DB_POOL_SIZE", "DB_MAX_OVERFLOW", "DB_POOL_TIMEOUT", "DB_POOL_PRE_PING"):
+                del os.environ[variable]
+
+if __name__ == "__main__":
+    test_pool_profiles()
@@ -0,0 +1,98 @@
+import os
+import sys
+
+os.environ.setdefault("PAYU_KEY", "test-key")
+os.environ.setdefault("PAYU_SALT", "test-salt")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app, payu_callback_form
+
+# Query budgets per endpoint, for a 3-item cart. Raise one only together with
+# the change that needs it.
+BUDGETS = {
+    "GET /products": 1,
+    "GET /products/{id}": 1,
+    "POST /orders": 11,
+    "POST /cart/quote": 1,
+    "POST /payment/initiate": 6,
+    "POST /payment/initiate (quote token)": 6,
+    "POST /payment/callback": 9,
+}
+
+def check(name, fn):
+    from query_stats import assert_max_queries
+
+    # Over budget raises AssertionError, failing the test
+    with assert_max_queries(BUDGETS[name]) as stats:
+        response = fn()
+    print(f"SUCCESS: {name} ran {stats.count} queries (budget {BUDGETS[name]}).")
+    return response
+
+def test_query_budgets():
+    from fastapi.testclient import TestClient
+    from database import SessionLocal
+    from models import ProductDB
+    import query_stats
+
+    # X-DB-* headers from apps built while it is set (SQL_DEBUG=1 in a deployment)
+    debug, query_stats.SQL_DEBUG = query_stats.SQL_DEBUG, True
+
+    try:
+        with throwaway_app("test_query_budget") as app: # Schema created; TestClient without `with` skips the lifespan
+            db = SessionLocal()
+            db.add_all([ProductDB(title=f"Budget Product {i}", description="Budget test product", price=100.0 + i, stock=50, category="Test") for i in range(10)])
+            db.commit()
+            product_ids = [p.id for p in db.query(ProductDB.id)]
+            db.close()
+
+            client = TestClient(app)
+            cart = [{"product_id": pid, "quantity": 1} for pid in product_ids[:3]]
+
+            check("GET /products", lambda: client.get("/products"))
+            check("GET /products/{id}", lambda: client.get(f"/products/{product_ids[0]}"))
+            check("POST /orders", lambda: client.post("/orders", json={
+                "customer_email": "budget@example.com", "total_amount": 100.0, "items": cart
+            }))
+
+            payment = {
+                "amount": 499.0, "firstname": "Budget", "email": "budget@example.com", "productinfo": "Budget order",
+                "items": cart, "phone": "9999999999", "address_line": "1 Test Road",
+                "city": "Pune", "state": "Maharashtra", "pincode": "411001"
+            }
+            response = check("POST /payment/initiate", lambda: client.post("/payment/initiate", json=payment))
+            quote = check("POST /cart/quote", lambda: client.post("/cart/quote", json={"items": cart}))
+            with_token = {**payment, "items": [], "quote_token": quote.json()["quote_token"]}
+            check("POST /payment/initiate (quote token)", lambda: client.post("/payment/initiate", json=with_token))
+            form = payu_callback_form(response.json())
+            check("POST /payment/callback", lambda: client.post("/payment/callback", data=form, follow_redirects=False))
+
+            # Product lookups must not scale with the cart. (SQLite cannot batch ORM
+            # inserts that need RETURNING, so order_items still insert one by one there.)
+            big_cart = [{"product_id": pid, "quantity": 1} for pid in product_ids]
+            from query_stats import capture_queries
+            with capture_queries() as stats:
+                client.post("/orders", json={"customer_email": "budget@example.com", "total_amount": 100.0, "items": big_cart})
+            repeated_selects = [shape for shape, _ in stats.n_plus_one() if shape.startswith("SELECT")]
+            assert not repeated_selects, f"Per-item SELECTs in POST /orders. {stats.describe()}"
+            print("SUCCESS: POST /orders loads a 10-item cart without per-item SELECTs.")
+
+            # Debug headers carry the same numbers
+            response = client.get("/products")
+            assert response.headers.get("x-db-query-count", "").isdigit() and "x-db-time-ms" in response.headers, \
+                f"Debug headers missing: {dict(response.headers)}"
+            print("SUCCESS: X-DB-Query-Count and X-DB-Time-Ms headers present in debug mode.")
+
+            # The detector itself: one lookup per id is flagged
+            with capture_queries() as stats:
+                db = SessionLocal()
+                for pid in product_ids:
+                    db.query(ProductDB).filter(ProductDB.id == pid).first()
+                db.close()
+            assert stats.n_plus_one(), f"N+1 pattern not detected. {stats.describe()}"
+            print("SUCCESS: Per-item lookups flagged as N+1.")
+    finally:
+        query_stats.SQL_DEBUG = debug
+
+if __name__ == "__main__":
+    test_query_budgets()
@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+
+os.environ["RATE_LIMIT_ENABLED"] = "1"
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app
+
+def test_rate_limit():
+    from fastapi.testclient import TestClient
+    from rate_limit import MemoryBackend, Limit
+
+    with throwaway_app("test_rate_limit") as app: # Schema created; TestClient without `with` skips the lifespan
+        client = TestClient(app)
+
+        # The body is replayed to the endpoint after the limiter reads the account
+        res = client.post("/signup", json={"email": "limit@example.com", "password": "secret123", "full_name": "Limit"})
+        assert res.status_code == 200 and "access_token" in res.json(), f"Signup failed behind the limiter: {res.status_code} {res.text}"
+        print("SUCCESS: Signup passes through the limiter intact.")
+
+        # Per account: the 6th attempt on one username is refused, another username is not
+        statuses = [client.post("/login", data={"username": "limit@example.com", "password": "wrong"}).status_code for _ in range(6)]
+        other = client.post("/login", data={"username": "other@example.com", "password": "wrong"})
+        assert statuses == [401] * 5 + [429] and other.status_code == 401, \
+            f"Unexpected per-account statuses {statuses}, other user {other.status_code}"
+        print("SUCCESS: Per-account bucket stops repeated logins for one user.")
+
+        # Per IP: spraying different usernames still drains the address's bucket
+        statuses = [client.post("/login", data={"username": f"user{i}@example.com", "password": "x"}).status_code for i in range(10)]
+        refused = client.post("/login", data={"username": "fresh@example.com", "password": "x"})
+        assert 429 in statuses and refused.status_code == 429 and int(refused.headers["retry-after"]) >= 1, \
+            f"Unexpected per-IP statuses {statuses + [refused.status_code]}"
+        print("SUCCESS: Per-IP bucket refuses with Retry-After.")
+
+        # Bodies the limiter would have to buffer are capped, with or without a declared length
+        sender = TestClient(app, client=("10.0.0.9", 50000))
+        padding = "x" * (100 * 1024)
+        declared = sender.post("/contact", json={"name": "Big", "email": "big@example.com", "message": padding})
+        chunked = sender.post("/contact", content=iter([b'{"email": "big@example.com", "message": "', padding.encode(), b'"}']),
+                              headers={"content-type": "application/json"})
+        assert declared.status_code == 413 and chunked.status_code == 413, f"Oversized bodies got {declared.status_code} and {chunked.status_code}"
+        print("SUCCESS: Oversized bodies on limited routes are refused with 413.")
+
+        # Other endpoints are untouched
+        assert client.get("/products").status_code == 200, "/products affected by the limiter."
+        print("SUCCESS: Unlimited routes pass straight through.")
+
+        # Bounded memory and the cost of a check
+        backend = MemoryBackend(shards=4, max_keys=1000)
+        limit = Limit(60, 5)
+        started = time.perf_counter()
+        for i in range(100_000):
+            backend.hit(f"ip|{i}", limit)
+        per_check_us = (time.perf_counter() - started) / 100_000 * 1e6
+        assert len(backend) <= 1000, f"Store grew to {len(backend)} keys."
+        print(f"SUCCESS: Store holds {len(backend)} keys after 100000 distinct clients ({per_check_us:.2f} us per check).")
+
+if __name__ == "__main__":
+    test_rate_limit()
@@ -0,0 +1,104 @@
+import os
+import sys
+
+os.environ.setdefault("PAYU_KEY", "test-key")
+os.environ.setdefault("PAYU_SALT", "test-salt")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app, remove_path
+
+# Two replicas; the second one's directory does not exist yet, so it refuses
+# connections until the test creates it
+REPLICA_URLS = ("sqlite:///./test_replica_a.db", "sqlite:///./test_replica_b/replica.db")
+
+def _seed(bind, title):
+    from sqlalchemy.orm import Session
+    from database import init_schema
+    from models import ProductDB, UserDB
+    from auth import get_password_hash
+
+    init_schema(bind)
+    with Session(bind) as db:
+        db.add(ProductDB(title=title, description="Routing probe", price=100.0, stock=10, category="Boards"))
+        db.add(UserDB(email="reader@example.com", full_name="Reader", hashed_password=get_password_hash("secret123")))
+        db.commit()
+
+def test_read_replicas():
+    for path in ("test_replica_a.db", "test_replica_b"):
+        remove_path(path)
+
+    from fastapi.testclient import TestClient
+
+    try:
+        with throwaway_app("test_read_replicas", REPLICA_URLS, schema=False) as app:
+            from database import engine, replicas, recent_writes
+            from read_replicas import RECENT_WRITE_COOKIE
+            replica_a, replica_b = replicas.replicas
+            # Same rows everywhere, but titled by database so responses show who served them
+            _seed(engine, "Primary Board")
+            _seed(replica_a.engine, "Replica A Board")
+
+            browser = TestClient(app, client=("10.0.0.1", 50000))
+            titles = {browser.get("/products/1").json()["title"] for _ in range(4)}
+            assert titles == {"Replica A Board"} and not replica_b.healthy, f"GETs served {titles}, replica b healthy: {replica_b.healthy}"
+            print("SUCCESS: GETs read from the healthy replica and skip the unreachable one.")
+
+            # Same address as the browser: a shared proxy or NAT must not pin everyone to the primary
+            buyer = TestClient(app, client=("10.0.0.1", 50000))
+            token = buyer.post("/login", data={"username": "reader@example.com", "password": "secret123"}).json()["access_token"]
+            auth = {"Authorization": f"Bearer {token}"}
+            placed = buyer.post("/orders", headers=auth, json={"customer_email": "reader@example.com", "total_amount": 100.0,
+                                                             "items": [{"product_id": 1, "quantity": 1}]})
+            # The order only exists on the primary; replication has not caught up
+            mine = buyer.get("/orders/user", headers=auth).json()
+            other = browser.get("/products/1").json()["title"]
+            assert len(mine) == 1 and other == "Replica A Board" and RECENT_WRITE_COOKIE in placed.cookies, \
+                f"Buyer saw {len(mine)} orders, other client read {other}, cookies {dict(placed.cookies)}"
+            print("SUCCESS: A client that just wrote reads its own orders from the primary; others on its address do not.")
+
+            # Another device with the same token has no cookie; the token alone routes it
+            phone = TestClient(app, client=("10.0.0.3", 50000))
+            assert len(phone.get("/orders/user", headers=auth).json()) == 1, "Same token without the cookie read from the lagging replica."
+            print("SUCCESS: The bearer token carries the write to the client's other devices.")
+
+            # The PayU callback case: no token, only the cookie from the write's response
+            guest = TestClient(app, client=("10.0.0.4", 50000))
+            guest.post("/orders", json={"customer_email": "guest@example.com", "total_amount": 100.0,
+                                        "items": [{"product_id": 1, "quantity": 1}]})
+            with_cookie = guest.get("/orders", params={"limit": 5}).json()
+            guest.cookies.clear()
+            without_cookie = guest.get("/orders", params={"limit": 5}).json()
+            assert len(with_cookie) == 2 and without_cookie == [], \
+                f"Guest read {len(with_cookie)} orders with the cookie, {len(without_cookie)} without"
+            print("SUCCESS: A tokenless write is followed by primary reads for that browser only.")
+
+            recent_writes.clear() # The read-your-writes window has passed
+            buyer.cookies.clear()
+            after = buyer.get("/orders/user", headers=auth).json()
+            assert after == [], f"Expected the (lagging) replica's empty order list, got {after}"
+            print("SUCCESS: Once the window passes the same client reads from the replica again.")
+
+            # Replica b comes up, replica a goes away: probes notice both
+            os.makedirs("test_replica_b")
+            _seed(replica_b.engine, "Replica B Board")
+            replicas.interval = 0
+            os.remove("test_replica_a.db")
+            os.makedirs("test_replica_a.db") # A directory where the file was: connects fail
+            replica_a.engine.dispose()
+            titles = {browser.get("/products/1").json()["title"] for _ in range(4)}
+            assert titles == {"Replica B Board"} and not replica_a.healthy, \
+                f"After failover GETs served {titles}, replica a healthy: {replica_a.healthy}"
+            print("SUCCESS: Reads fail over to the replica that passes its health probe.")
+
+            replica_b.engine.dispose()
+            remove_path("test_replica_b")
+            title = browser.get("/products/1").json()["title"]
+            assert title == "Primary Board", f"Expected the primary with no replicas up, got {title}"
+            print("SUCCESS: With every replica down, reads fall back to the primary.")
+    finally:
+        for path in ("test_replica_a.db", "test_replica_b"):
+            remove_path(path)
+
+if __name__ == "__main__":
+    test_read_replicas()
@@ -0,0 +1,92 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app
+
+EXPECTED_ORDER = {
+    "newest": lambda r: (r["created_at"], r["id"]),
+    "highest": lambda r: (r["rating"], r["id"]),
+    "lowest": lambda r: (-r["rating"], -r["id"]),
+    "helpful": lambda r: (r["helpful_count"], r["id"]),
+}
+
+def walk(client, sort):
+    reviews, cursor, pages = [], None, 0
+    while True:
+        params = {"sort": sort, "limit": 10}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/products/1/reviews", params=params).json()
+        reviews += page["items"]
+        pages += 1
+        cursor = page["next_cursor"]
+        if not cursor:
+            return reviews, pages
+
+def test_review_pages():
+    from fastapi.testclient import TestClient
+    from sqlalchemy import text
+    from database import SessionLocal
+    from models import ProductDB, ReviewDB
+    from query_stats import capture_queries
+
+    with throwaway_app("test_review_pages") as app: # Schema created, caches empty; no lifespan without `with`
+        from database import engine
+        db = SessionLocal()
+        db.add(ProductDB(title="Popular Sensor", description="A sensor", price=120.0, stock=5, category="Sensors"))
+        db.add_all([
+            ReviewDB(product_id=1, user_id=1, user_email="bulk@example.com", user_name="Bulk", rating=1 + (i * 7) % 5,
+                     comment=f"Review {i}", created_at=f"2026-01-{1 + (i * 11) % 28:02d}T10:00:00", helpful_count=(i * 3) % 4)
+            for i in range(25)
+        ])
+        db.commit()
+        db.close()
+
+        client = TestClient(app)
+        everything = [dict(id=r[0], rating=r[1], created_at=r[2], helpful_count=r[3]) for r in
+                      engine.connect().execute(text("SELECT id, rating, created_at, helpful_count FROM reviews"))]
+        failures = []
+        for sort, key in EXPECTED_ORDER.items():
+            reviews, pages = walk(client, sort)
+            expected = sorted(everything, key=key, reverse=True)
+            if [r["id"] for r in reviews] != [r["id"] for r in expected] or pages != 3:
+                failures.append(sort)
+        assert not failures, f"Wrong pages for {failures}"
+        print("SUCCESS: Every sort pages through all 25 reviews in order, 10 at a time.")
+
+        with engine.connect() as conn:
+            plan = " ".join(str(row) for row in conn.execute(text(
+                "EXPLAIN QUERY PLAN SELECT * FROM reviews WHERE product_id = 1 AND (rating, id) < (3, 20) ORDER BY rating DESC, id DESC LIMIT 11")))
+        assert "ix_reviews_product_rating" in plan and "TEMP B-TREE" not in plan, f"Unexpected plan {plan}"
+        print("SUCCESS: Keyset page is served by the composite index without a sort.")
+
+        # First page: cached until a new review arrives
+        with capture_queries() as stats:
+            client.get("/products/1/reviews")
+        cached_queries = stats.count
+        token = client.post("/signup", json={"email": "pager@example.com", "password": "secret123", "full_name": "Pager"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        client.post("/products/1/reviews", json={"rating": 5, "comment": "Latest"}, headers=headers)
+        newest = client.get("/products/1/reviews").json()["items"][0]
+        assert cached_queries == 0 and newest["comment"] == "Latest", f"{cached_queries} queries for a cached page, newest is {newest}"
+        print("SUCCESS: First page served from cache and refreshed by a new review.")
+
+        # Helpful votes count once per user and reorder the helpful sort
+        votes = [client.post(f"/products/1/reviews/{newest['id']}/helpful", headers=headers).json()["helpful_count"] for _ in range(2)]
+        top = client.get("/products/1/reviews", params={"sort": "helpful"}).json()["items"][0]
+        assert votes == [1, 1] and top["helpful_count"] == 3, f"Votes {votes}, top helpful review {top}"
+        print("SUCCESS: Helpful votes are counted once per user.")
+
+        bad_cursor = client.get("/products/1/reviews", params={"cursor": "not-a-cursor"})
+        bad_sort = client.get("/products/1/reviews", params={"sort": "random"})
+        # A newest-sort cursor holds a timestamp; comparing it with ratings would be a 500 on PostgreSQL
+        newest_cursor = client.get("/products/1/reviews", params={"sort": "newest"}).json()["next_cursor"]
+        other_sort = client.get("/products/1/reviews", params={"sort": "highest", "cursor": newest_cursor})
+        assert bad_cursor.status_code == 400 and bad_sort.status_code == 400 and other_sort.status_code == 400, \
+            f"Got {bad_cursor.status_code}, {other_sort.status_code} and {bad_sort.status_code}"
+        print("SUCCESS: Bad cursors, cursors from another sort and bad sorts are rejected.")
+
+if __name__ == "__main__":
+    test_review_pages()
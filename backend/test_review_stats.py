@@ -0,0 +1,62 @@
+import os
+import sys
+
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app
+
+def test_review_stats():
+    from fastapi.testclient import TestClient
+    from database import SessionLocal
+    from models import ProductDB, ReviewDB
+    from query_stats import capture_queries
+    from review_stats import backfill_review_stats
+
+    with throwaway_app("test_review_stats") as app: # Schema created; TestClient without `with` skips the lifespan
+        db = SessionLocal()
+        db.add_all([
+            ProductDB(title="Rated Sensor", description="A sensor", price=120.0, stock=5, category="Sensors"),
+            ProductDB(title="Unrated Motor", description="A motor", price=300.0, stock=5, category="Motors"),
+        ])
+        db.commit()
+        db.close()
+
+        client = TestClient(app)
+        token = client.post("/signup", json={"email": "reviewer@example.com", "password": "secret123", "full_name": "Reviewer"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for rating in (5, 4, 4):
+            client.post("/products/1/reviews", json={"rating": rating, "comment": "Works"}, headers=headers)
+
+        expected = {"review_count": 3, "average_rating": 4.33, "rating_histogram": {"1": 0, "2": 0, "3": 0, "4": 2, "5": 1}}
+        detail = client.get("/products/1").json()
+        assert {key: detail.get(key) for key in expected} == expected and "rating_sum" not in detail, f"Unexpected aggregates {detail}"
+        print("SUCCESS: Review aggregates maintained with each review.")
+
+        with capture_queries() as stats:
+            listing = client.get("/products").json()
+        unrated = next(p for p in listing if p["id"] == 2)
+        assert stats.count == 1 and unrated["review_count"] == 0 and unrated["average_rating"] is None, \
+            f"{stats.count} queries, unrated product {unrated}"
+        print("SUCCESS: Product list carries ratings in a single query.")
+
+        bad = client.post("/products/1/reviews", json={"rating": 6, "comment": "Too good"}, headers=headers)
+        missing = client.post("/products/99/reviews", json={"rating": 5, "comment": "?"}, headers=headers)
+        assert bad.status_code == 422 and missing.status_code == 404 and client.get("/products/1").json()["review_count"] == 3, \
+            f"Got {bad.status_code} and {missing.status_code} for invalid reviews."
+        print("SUCCESS: Invalid reviews leave aggregates untouched.")
+
+        # Reviews written behind the API's back are picked up by the backfill
+        db = SessionLocal()
+        db.add(ReviewDB(product_id=2, user_id=1, user_email="reviewer@example.com", user_name="Reviewer", rating=1, comment="Bulk", created_at="2026-01-01"))
+        db.query(ProductDB).filter(ProductDB.id == 1).update({ProductDB.review_count: 0})
+        db.commit()
+        result = backfill_review_stats(db)
+        db.close()
+        first, second = client.get("/products/1").json(), client.get("/products/2").json()
+        assert result == {"products": 2, "reviews": 4} and first["review_count"] == 3 and second["rating_histogram"]["1"] == 1, \
+            f"Backfill gave {result}, {first}, {second}"
+        print("SUCCESS: Backfill rebuilds aggregates from the reviews table.")
+
+if __name__ == "__main__":
+    test_review_stats()
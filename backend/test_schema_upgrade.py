@@ -0,0 +1,55 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app
+
+# products and reviews as the first release created them
+OLD_TABLES = [
+    """CREATE TABLE products (id INTEGER PRIMARY KEY, title VARCHAR, description VARCHAR, price FLOAT, category VARCHAR,
+       image VARCHAR, specs JSON, skv VARCHAR UNIQUE, mrp FLOAT, sale_price FLOAT, features JSON, stock INTEGER)""",
+    """CREATE TABLE reviews (id INTEGER PRIMARY KEY, product_id INTEGER REFERENCES products (id), user_id INTEGER,
+       user_email VARCHAR, user_name VARCHAR, rating INTEGER, comment VARCHAR, created_at VARCHAR)""",
+    "INSERT INTO products (id, title, description, price, category, mrp, sale_price, stock) VALUES (1, 'Old Board', 'From v1', 500.0, 'Boards', 600.0, 450.0, 5)",
+]
+
+def test_schema_upgrade():
+    from sqlalchemy import inspect, text
+    from database import SessionLocal, init_schema
+    from models import ProductDB
+
+    with throwaway_app("test_schema_upgrade", schema=False):
+        from database import engine
+        with engine.begin() as conn:
+            for statement in OLD_TABLES:
+                conn.execute(text(statement))
+
+        added = init_schema()
+        expected = {"products.effective_price", "products.discount_pct", "products.review_count", "products.rating_5",
+                    "products.image_variants", "reviews.helpful_count"}
+        assert expected <= set(added), f"Added {added}"
+        indexes = {index["name"] for index in inspect(engine).get_indexes("products")} | {index["name"] for index in inspect(engine).get_indexes("reviews")}
+        missing = {index.name for index in ProductDB.__table__.indexes if index.name} - indexes
+        assert not missing and "ix_reviews_product_rating" in indexes, f"Indexes missing after upgrade: {missing}"
+        print("SUCCESS: Startup schema step adds missing columns and indexes to existing tables.")
+
+        db = SessionLocal()
+        product = db.query(ProductDB).one()
+        assert product.title == "Old Board" and product.review_count == 0 and product.effective_price is None, \
+            f"Old row after upgrade: {product.review_count}, {product.effective_price}"
+        db.close()
+        assert init_schema() == [], "Second upgrade added columns again"
+        print("SUCCESS: Existing rows load through the ORM and a second run is a no-op.")
+
+        from migrate_pricing import run_migration
+        run_migration()
+        db = SessionLocal()
+        product = db.query(ProductDB).one()
+        assert product.effective_price == 450.0 and product.discount_pct == 25.0, \
+            f"Pricing after migrate_pricing: {product.effective_price}, {product.discount_pct}"
+        db.close()
+        print("SUCCESS: migrate_pricing fills the new columns on the upgraded table.")
+
+if __name__ == "__main__":
+    test_schema_upgrade()
@@ -0,0 +1,50 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app, remove_path
+
+def test_slow_query_log():
+    remove_path("test_slow_queries.log")
+
+    from fastapi.testclient import TestClient
+    from database import SessionLocal
+    from models import ProductDB
+    from slow_queries import read_entries, aggregate
+
+    # A near-zero threshold makes every statement "slow". The log is attached when
+    # the test database's engine is built, and only to that engine.
+    os.environ.update({"SLOW_QUERY_MS": "0.0001", "SLOW_QUERY_LOG": "test_slow_queries.log"})
+    try:
+        with throwaway_app("test_slow_queries") as app: # Schema created; TestClient without `with` skips the lifespan
+            del os.environ["SLOW_QUERY_MS"], os.environ["SLOW_QUERY_LOG"]
+            db = SessionLocal()
+            db.add(ProductDB(title="Slow Sensor", description="A sensor", price=120.0, stock=5, category="Sensors"))
+            db.commit()
+            db.close()
+
+            client = TestClient(app)
+            for _ in range(3):
+                client.get("/products", params={"search": "sensor", "sort_by": "price_asc"})
+
+            entries = [e for e in read_entries("test_slow_queries.log") if e["route"] == "GET /products"]
+            assert len(entries) >= 3 and all(e["fingerprint"].startswith("SELECT") for e in entries), \
+                f"Expected 3 GET /products entries, got {entries}"
+            print("SUCCESS: Slow statements logged with route and fingerprint.")
+
+            entry = entries[-1] if entries else {}
+            assert entry.get("parameters") and "%sensor%" in str(entry["parameters"]) and isinstance(entry.get("plan"), list), \
+                f"Missing parameters or plan: {entry}"
+            print("SUCCESS: Parameters and EXPLAIN plan captured.")
+
+            report = [g for g in aggregate(read_entries("test_slow_queries.log")) if "GET /products" in g["routes"]]
+            assert len(report) == 1 and report[0]["count"] == 3, f"Unexpected report: {report}"
+            print("SUCCESS: Report groups repeated statements by fingerprint.")
+    finally:
+        os.environ.pop("SLOW_QUERY_MS", None)
+        os.environ.pop("SLOW_QUERY_LOG", None)
+        remove_path("test_slow_queries.log") # Closed when the harness swapped the engine out
+
+if __name__ == "__main__":
+    test_slow_query_log()
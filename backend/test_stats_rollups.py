@@ -0,0 +1,83 @@
+import os
+import sys
+from datetime import datetime
+
+os.environ.setdefault("PAYU_KEY", "test-key")
+os.environ.setdefault("PAYU_SALT", "test-salt")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app, payu_callback_form
+
+def test_rollups():
+    from fastapi.testclient import TestClient
+    from database import SessionLocal
+    from models import ProductDB, OrderDB, StatCounterDB
+
+    with throwaway_app("test_stats_rollups") as app:
+        # A database from before the rollups: a confirmed and a pending order, no counters
+        db = SessionLocal()
+        product = ProductDB(title="Rollup Product", description="Rollup test product", price=100.0, stock=50, category="Test")
+        db.add(product)
+        db.flush()
+        db.add_all([
+            OrderDB(customer_email="old@example.com", total_amount=250.0, status="confirmed", created_at=datetime.utcnow()),
+            OrderDB(customer_email="old@example.com", total_amount=999.0, status="pending", created_at=datetime.utcnow()),
+        ])
+        db.commit()
+        product_id = product.id
+        assert db.query(StatCounterDB).count() == 0
+        db.close()
+
+        with TestClient(app) as client: # Runs the lifespan, which backfills the missing counters
+            stats = client.get("/admin/stats").json()
+            assert stats["total_orders"] == 1 and abs(stats["total_revenue"] - 250.0) < 0.01 and stats["total_products"] == 1, \
+                f"Startup backfill gave {stats}"
+            print("SUCCESS: Missing counters backfilled from existing orders at startup.")
+
+            # A pending order does not count until its payment is confirmed
+            before = client.get("/admin/stats").json()
+            payment = {
+                "amount": 1.0, "firstname": "Rollup", "email": "rollup_test@example.com", "productinfo": "Rollup order",
+                "items": [{"product_id": product_id, "quantity": 2}], "phone": "9999999999", "address_line": "1 Test Road",
+                "city": "Pune", "state": "Maharashtra", "pincode": "411001"
+            }
+            response = client.post("/payment/initiate", json=payment)
+            assert response.status_code == 200, f"Payment initiate failed: {response.status_code} {response.text}"
+            data = response.json()
+            pending = client.get("/admin/stats").json()
+            assert pending["total_orders"] == before["total_orders"] and pending["total_revenue"] == before["total_revenue"], \
+                f"Pending order moved the counters: {before} -> {pending}"
+            print("SUCCESS: Pending order left the counters alone.")
+
+            response = client.post("/payment/callback", data=payu_callback_form(data), follow_redirects=False)
+            assert response.status_code == 303 and "/payment/success" in response.headers["location"], \
+                f"Payment callback failed: {response.status_code} {response.headers.get('location')}"
+            db = SessionLocal()
+            order = db.query(OrderDB).filter(OrderDB.txnid == data["txnid"]).first()
+            assert order.status == "confirmed", f"Order status is {order.status}"
+            amount = order.total_amount
+            db.close()
+
+            after = client.get("/admin/stats").json()
+            assert after["total_orders"] == before["total_orders"] + 1, f"Order counter did not move: {before} -> {after}"
+            assert abs(after["total_revenue"] - before["total_revenue"] - amount) < 0.01, \
+                f"Revenue did not move by {amount}: {before} -> {after}"
+            print("SUCCESS: Confirmed payment moved the order and revenue counters.")
+
+            # A repeated callback must not count the order twice
+            client.post("/payment/callback", data=payu_callback_form(data), follow_redirects=False)
+            again = client.get("/admin/stats").json()
+            assert again["total_orders"] == after["total_orders"] and again["total_revenue"] == after["total_revenue"], \
+                f"Repeated callback moved the counters: {after} -> {again}"
+            print("SUCCESS: Repeated callback counted once.")
+
+        # Counters already present: a restart does not rebuild them
+        db = SessionLocal()
+        from rollups import ensure_rollups
+        assert ensure_rollups(db) is None, "Rollups rebuilt although the counters exist"
+        db.close()
+        print("SUCCESS: Existing counters left alone on restart.")
+
+if __name__ == "__main__":
+    test_rollups()
@@ -0,0 +1,51 @@
+import io
+import os
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app
+
+def test_concurrent_identical_uploads():
+    from database import SessionLocal
+    from models import StoredFileDB
+    from storage_utils import store_stream, UPLOAD_DIR
+
+    payload = b"same bytes, two browsers " + os.urandom(16)
+    with throwaway_app("test_store_stream"):
+        # The first upload has written its row but not committed when the second arrives
+        first = SessionLocal()
+        first_url, first_created = store_stream(first, io.BytesIO(payload), "photo.jpg")
+
+        result = {}
+        def second_upload():
+            db = SessionLocal()
+            try:
+                result["value"] = store_stream(db, io.BytesIO(payload), "photo.jpeg")
+                db.commit()
+            except Exception as e:
+                result["error"] = e
+            finally:
+                db.close()
+        thread = threading.Thread(target=second_upload)
+        thread.start()
+        thread.join(0.5) # Blocked on the first upload's insert
+        first.commit()
+        first.close()
+        thread.join()
+
+        second_url, second_created = result.get("value", (None, None))
+        db = SessionLocal()
+        rows = db.query(StoredFileDB).all()
+        db.close()
+        leftovers = [name for name in os.listdir(UPLOAD_DIR) if name.startswith(os.path.basename(first_url).split(".")[0])]
+        for name in leftovers:
+            os.remove(os.path.join(UPLOAD_DIR, name))
+        assert "error" not in result and first_created and not second_created and second_url == first_url \
+                and len(rows) == 1 and leftovers == [os.path.basename(first_url)], \
+            f"Second upload gave {result}, rows {len(rows)}, files {leftovers}"
+        print("SUCCESS: Concurrent identical uploads share one row and one file.")
+
+if __name__ == "__main__":
+    test_concurrent_identical_uploads()
@@ -0,0 +1,113 @@
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+os.environ.setdefault("PAYU_KEY", "test-key")
+os.environ.setdefault("PAYU_SALT", "test-salt")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from testing_utils import throwaway_app, payu_callback_form
+
+TODAY = date(2025, 6, 18)
+
+def test_timeseries():
+    from fastapi.testclient import TestClient
+    from database import SessionLocal
+    from models import DailyStatsDB, OrderDB, ProductDB
+    import rollups
+    from rollups import get_timeseries, MAX_BUCKETS
+
+    with throwaway_app("test_timeseries") as app:
+        db = SessionLocal()
+        # Monday 2025-01-06 starts an ISO week; 2025-01-13 the next one
+        db.add_all([
+            DailyStatsDB(day=date(2025, 1, 6), revenue=100.0, order_count=1),
+            DailyStatsDB(day=date(2025, 1, 8), revenue=50.0, order_count=2),
+            DailyStatsDB(day=date(2025, 1, 13), revenue=30.0, order_count=1),
+            DailyStatsDB(day=date(2025, 2, 3), revenue=20.0, order_count=1),
+        ])
+        db.commit()
+
+        days = get_timeseries(db, "day", date(2025, 1, 6), date(2025, 1, 8), today=TODAY)
+        assert [(b["bucket"], b["revenue"], b["orders"], b["avg_order_value"]) for b in days] == [
+            ("2025-01-06", 100.0, 1, 100.0), ("2025-01-07", 0.0, 0, 0.0), ("2025-01-08", 50.0, 2, 25.0)
+        ], f"Day buckets: {days}"
+        print("SUCCESS: Day buckets, empty days included.")
+
+        weeks = get_timeseries(db, "week", date(2025, 1, 8), date(2025, 1, 19), today=TODAY)
+        assert [(b["bucket"], b["revenue"], b["orders"], b["avg_order_value"]) for b in weeks] == [
+            ("2025-01-06", 150.0, 3, 50.0), ("2025-01-13", 30.0, 1, 30.0)
+        ], f"Week buckets: {weeks}"
+        print("SUCCESS: Week buckets start on Monday, also for a mid-week 'from'.")
+
+        months = get_timeseries(db, "month", date(2025, 1, 15), date(2025, 2, 10), today=TODAY)
+        assert [(b["bucket"], b["revenue"], b["orders"]) for b in months] == [
+            ("2025-01-01", 180.0, 4), ("2025-02-01", 20.0, 1)
+        ], f"Month buckets: {months}"
+        print("SUCCESS: Month buckets start on the 1st.")
+
+        try:
+            get_timeseries(db, "day", TODAY - timedelta(days=MAX_BUCKETS), TODAY, today=TODAY)
+            raise AssertionError(f"More than {MAX_BUCKETS} buckets were not refused")
+        except ValueError:
+            pass
+        assert len(get_timeseries(db, "day", TODAY - timedelta(days=MAX_BUCKETS - 1), TODAY, today=TODAY)) == MAX_BUCKETS
+        client = TestClient(app)
+        response = client.get("/admin/stats/timeseries", params={"granularity": "day", "from": "2020-01-01", "to": "2025-06-18"})
+        assert response.status_code == 400, f"Oversized range got {response.status_code}"
+        print(f"SUCCESS: Ranges over {MAX_BUCKETS} buckets are refused (400 over HTTP).")
+
+        # Closed buckets are served from memory: an out-of-band edit is not seen...
+        db.query(DailyStatsDB).filter(DailyStatsDB.day == date(2025, 1, 13)).update({"revenue": 999.0})
+        db.commit()
+        weeks = get_timeseries(db, "week", date(2025, 1, 13), date(2025, 1, 19), today=TODAY)
+        assert weeks[0]["revenue"] == 30.0, f"Closed week re-read from the DB: {weeks}"
+        # ...while open ones (ending after yesterday) are read every time
+        db.add(DailyStatsDB(day=TODAY, revenue=10.0, order_count=1))
+        db.commit()
+        assert get_timeseries(db, "day", TODAY, TODAY, today=TODAY)[0]["revenue"] == 10.0
+        db.query(DailyStatsDB).filter(DailyStatsDB.day == TODAY).update({"revenue": 15.0})
+        db.commit()
+        assert get_timeseries(db, "day", TODAY, TODAY, today=TODAY)[0]["revenue"] == 15.0, "Open bucket was cached"
+        db.close()
+        print("SUCCESS: Closed buckets come from the cache, open ones from the DB.")
+
+        # A payment confirming an older order drops that order's cached buckets
+        db = SessionLocal()
+        product = ProductDB(title="Series Product", description="Time series test product", price=100.0, stock=10, category="Test")
+        db.add(product)
+        db.commit()
+        product_id = product.id
+        db.close()
+        payment = {
+            "firstname": "Series", "email": "series@example.com", "productinfo": "Series order",
+            "items": [{"product_id": product_id, "quantity": 1}], "phone": "9999999999", "address_line": "1 Test Road",
+            "city": "Pune", "state": "Maharashtra", "pincode": "411001"
+        }
+        data = client.post("/payment/initiate", json=payment).json()
+        placed = datetime.utcnow() - timedelta(days=3) # Paid late; its day is already closed
+        db = SessionLocal()
+        db.query(OrderDB).filter(OrderDB.txnid == data["txnid"]).update({"created_at": placed})
+        db.commit()
+        db.close()
+
+        params = {"granularity": "day", "from": placed.date().isoformat(), "to": placed.date().isoformat()}
+        before = client.get("/admin/stats/timeseries", params=params).json()["series"][0]
+        other_worker = dict(rollups._bucket_cache), rollups._bucket_version
+        client.post("/payment/callback", data=payu_callback_form(data), follow_redirects=False)
+        after = client.get("/admin/stats/timeseries", params=params).json()["series"][0]
+        assert before["orders"] == 0 and after["orders"] == 1 and abs(after["revenue"] - float(data["amount"])) < 0.01, \
+            f"Confirmation not reflected in a cached bucket: {before} -> {after}"
+        print("SUCCESS: Confirming an order invalidates its cached buckets.")
+
+        # Another worker cached the bucket before the confirmation and never saw it
+        rollups._bucket_cache.clear()
+        rollups._bucket_cache.update(other_worker[0])
+        rollups._bucket_version = other_worker[1]
+        elsewhere = client.get("/admin/stats/timeseries", params=params).json()["series"][0]
+        assert elsewhere == after, f"Other worker kept the stale bucket: {elsewhere}"
+        print("SUCCESS: Workers that cached the bucket drop it on the next request.")
+
+if __name__ == "__main__":
+    test_timeseries()
@@ -0,0 +1,61 @@
+import os
+import shutil
+import hashlib
+from contextlib import contextmanager
+
+# Shared setup for the in-process tests (test_*.py). Each test gets its own SQLite
+# file, engine and app, so the tests run together in one pytest session as well
+# as one file at a time (`python test_x.py`).
+
+def remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def payu_callback_form(data, status="success"):
+    """
+    The form PayU (or /payment/mock-process) posts to /payment/callback for the
+    /payment/initiate response `data`, signed with PAYU_SALT.
+    """
+    salt = os.environ["PAYU_SALT"]
+    hash_string = f"{salt}|{status}|||||||||||{data['email']}|{data['firstname']}|{data['productinfo']}|{data['amount']}|{data['txnid']}|{data['key']}"
+    return {
+        "status": status, "firstname": data["firstname"], "amount": data["amount"], "txnid": data["txnid"],
+        "hash": hashlib.sha512(hash_string.encode("utf-8")).hexdigest(), "productinfo": data["productinfo"], "email": data["email"]
+    }
+
+@contextmanager
+def throwaway_app(name, replica_urls=(), snapshot_dir=None, schema=True):
+    """
+    Points the database module at a fresh `<name>.db` in the working directory,
+    creates the schema and yields a new app built on it. In-process caches are
+    emptied first. The engines, the database file and `snapshot_dir` are removed
+    afterwards.
+    """
+    import database
+    import catalog_snapshot
+    from review_pages import clear_review_cache
+    from invoice_templates import clear_invoice_cache
+    from rollups import clear_timeseries_cache
+    from main import create_app
+
+    path = f"{name}.db"
+    remove_path(path)
+    if snapshot_dir:
+        remove_path(snapshot_dir)
+    database.connect_database(f"sqlite:///./{path}", replica_urls)
+    if schema:
+        database.init_schema()
+    clear_review_cache()
+    clear_invoice_cache()
+    clear_timeseries_cache()
+    catalog_snapshot.CATALOG_SNAPSHOT_DIR = snapshot_dir
+    try:
+        yield create_app()
+    finally:
+        catalog_snapshot.stop_catalog_snapshot()
+        database.connect_database("sqlite://") # Releases the file; nothing is written to it
+        remove_path(path)
+        if snapshot_dir:
+            remove_path(snapshot_dir)
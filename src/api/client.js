@@ -2,6 +2,8 @@ import axios from 'axios';
 
 const client = axios.create({
     baseURL: import.meta.env.VITE_API_URL || 'http://localhost:8000',
+    // Sends the API's read-your-writes cookie back (see backend/read_replicas.py)
+    withCredentials: true,
     headers: {
         'Content-Type': 'application/json',
     },
@@ -1,10 +1,10 @@
 import React from 'react';
 import toast from 'react-hot-toast';
-import { ShoppingCart, Eye, Heart } from 'lucide-react';
+import { ShoppingCart, Eye, Heart, Star } from 'lucide-react';
 import { Link } from 'react-router-dom';
 import { motion } from 'framer-motion';
 import { useWishlist } from '../../context/WishlistContext';
-import { getImageUrl } from '../../utils/imageUtils';
+import { getImageUrl, getImageSrcSet } from '../../utils/imageUtils';
 
 const ProductCard = ({ product }) => {
     const { toggleWishlist, isInWishlist } = useWishlist();
@@ -21,6 +21,9 @@ const ProductCard = ({ product }) => {
             <div className="relative h-48 overflow-hidden bg-white/5 p-4 flex items-center justify-center">
                 <img
                     src={getImageUrl(product.image)}
+                    srcSet={getImageSrcSet(product.srcset)}
+                    sizes="(max-width: 640px) 50vw, 300px"
+                    loading="lazy"
                     alt={product.title}
                     className="h-full object-contain group-hover:scale-110 transition-transform duration-500"
                 />
@@ -67,6 +70,14 @@ const ProductCard = ({ product }) => {
                         {product.title}
                     </h3>
                 </Link>
+                {/* Ratings come inline with the product, no per-card review fetch */}
+                {product.review_count > 0 && (
+                    <div className="flex items-center gap-1 text-xs text-tronix-muted mb-2">
+                        <Star size={12} className="text-yellow-500" fill="currentColor" />
+                        <span className="text-white">{product.average_rating.toFixed(1)}</span>
+                        <span>({product.review_count})</span>
+                    </div>
+                )}
                 <div className="mt-auto flex items-center justify-between">
                     <div className="flex flex-col">
                         <span className="text-xl font-bold text-white">₹{product.price}</span>
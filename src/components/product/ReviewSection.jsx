@@ -1,13 +1,24 @@
 import React, { useState, useEffect } from 'react';
-import { Star, User, Send } from 'lucide-react';
+import { Star, User, Send, ThumbsUp } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
 import toast from 'react-hot-toast';
 import client from '../../api/client';
 
-const ReviewSection = ({ productId }) => {
+const SORT_OPTIONS = [
+    { value: 'newest', label: 'Newest' },
+    { value: 'helpful', label: 'Most Helpful' },
+    { value: 'highest', label: 'Highest Rated' },
+    { value: 'lowest', label: 'Lowest Rated' },
+];
+
+const ReviewSection = ({ productId, reviewCount = 0, averageRating = null }) => {
     const [reviews, setReviews] = useState([]);
     const [loading, setLoading] = useState(true);
-    const [stats, setStats] = useState({ average: 0, count: 0 });
+    // Aggregates come with the product, so the header never needs every review
+    const [stats, setStats] = useState({ average: averageRating || 0, count: reviewCount });
+    const [sort, setSort] = useState('newest');
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     // New Review State
     const [rating, setRating] = useState(5);
@@ -19,30 +30,48 @@ const ReviewSection = ({ productId }) => {
     const token = localStorage.getItem('tronix_token');
     const isLoggedIn = !!user && !!token;
 
-    // Fetch Reviews
-    const fetchReviews = async () => {
+    // Fetch a page of reviews; without a cursor this replaces the list
+    const fetchReviews = async (cursor = null) => {
         try {
-            const response = await client.get(`/products/${productId}/reviews`);
-            const data = response.data;
-            setReviews(data);
-
-            // Calculate Stats
-            if (data.length > 0) {
-                const avg = data.reduce((acc, r) => acc + r.rating, 0) / data.length;
-                setStats({ average: avg, count: data.length });
-            } else {
-                setStats({ average: 0, count: 0 });
-            }
+            const response = await client.get(`/products/${productId}/reviews`, {
+                params: { sort, ...(cursor ? { cursor } : {}) }
+            });
+            const { items, next_cursor } = response.data;
+            setReviews((prev) => (cursor ? [...prev, ...items] : items));
+            setNextCursor(next_cursor);
         } catch (error) {
             console.error('Failed to fetch reviews:', error);
         } finally {
             setLoading(false);
+            setLoadingMore(false);
         }
     };
 
     useEffect(() => {
         fetchReviews();
-    }, [productId]);
+    }, [productId, sort]);
+
+    useEffect(() => {
+        setStats({ average: averageRating || 0, count: reviewCount });
+    }, [productId, reviewCount, averageRating]);
+
+    const loadMore = () => {
+        setLoadingMore(true);
+        fetchReviews(nextCursor);
+    };
+
+    const markHelpful = async (reviewId) => {
+        if (!isLoggedIn) {
+            toast.error("You must be logged in to vote");
+            return;
+        }
+        try {
+            const response = await client.post(`/products/${productId}/reviews/${reviewId}/helpful`);
+            setReviews((prev) => prev.map((r) => (r.id === reviewId ? { ...r, helpful_count: response.data.helpful_count } : r)));
+        } catch (error) {
+            console.error('Failed to record vote:', error);
+        }
+    };
 
     const handleSubmit = async (e) => {
         e.preventDefault();
@@ -65,9 +94,13 @@ const ReviewSection = ({ productId }) => {
             });
 
             toast.success('Review submitted successfully!');
+            setStats((prev) => ({
+                average: (prev.average * prev.count + rating) / (prev.count + 1),
+                count: prev.count + 1
+            }));
             setComment('');
             setRating(5);
-            fetchReviews(); // Refresh list
+            fetchReviews(); // Refresh first page
         } catch (error) {
             console.error('Error submitting review:', error);
 
@@ -173,6 +206,19 @@ const ReviewSection = ({ productId }) => {
 
             {/* Reviews List */}
             <div className="space-y-4">
+                {stats.count > 1 && (
+                    <div className="flex justify-end">
+                        <select
+                            value={sort}
+                            onChange={(e) => setSort(e.target.value)}
+                            className="bg-black/40 border border-white/10 rounded-lg px-3 py-2 text-sm text-white focus:border-tronix-primary outline-none"
+                        >
+                            {SORT_OPTIONS.map((option) => (
+                                <option key={option.value} value={option.value}>{option.label}</option>
+                            ))}
+                        </select>
+                    </div>
+                )}
                 {reviews.length > 0 ? (
                     reviews.map((review) => (
                         <motion.div
@@ -207,6 +253,12 @@ const ReviewSection = ({ productId }) => {
                             <p className="text-gray-300 text-sm leading-relaxed">
                                 {review.comment}
                             </p>
+                            <button
+                                onClick={() => markHelpful(review.id)}
+                                className="mt-4 flex items-center gap-1 text-xs text-tronix-muted hover:text-white transition-colors"
+                            >
+                                <ThumbsUp size={12} /> Helpful ({review.helpful_count || 0})
+                            </button>
                         </motion.div>
                     ))
                 ) : (
@@ -214,6 +266,15 @@ const ReviewSection = ({ productId }) => {
                         No reviews yet. Be the first to share your experience!
                     </div>
                 )}
+                {nextCursor && (
+                    <button
+                        onClick={loadMore}
+                        disabled={loadingMore}
+                        className="w-full border border-white/10 hover:border-tronix-primary text-white text-sm font-medium py-2.5 rounded-lg transition-colors disabled:opacity-50"
+                    >
+                        {loadingMore ? 'Loading...' : 'Load More Reviews'}
+                    </button>
+                )}
             </div>
         </div>
     );
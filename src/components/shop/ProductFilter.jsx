@@ -75,6 +75,7 @@ const ProductFilter = ({
                         {sortBy === '' && 'Default'}
                         {sortBy === 'price_asc' && 'Price: Low to High'}
                         {sortBy === 'price_desc' && 'Price: High to Low'}
+                        {sortBy === 'discount_desc' && 'Biggest Discount'}
                         {sortBy === 'name_asc' && 'Name: A to Z'}
                     </span>
                     <ChevronDown size={16} className={`text-gray-400 transition-transform ${isSortOpen ? 'rotate-180' : ''}`} />
@@ -92,6 +93,7 @@ const ProductFilter = ({
                                 { value: '', label: 'Default' },
                                 { value: 'price_asc', label: 'Price: Low to High' },
                                 { value: 'price_desc', label: 'Price: High to Low' },
+                                { value: 'discount_desc', label: 'Biggest Discount' },
                                 { value: 'name_asc', label: 'Name: A to Z' }
                             ].map((option) => (
                                 <button
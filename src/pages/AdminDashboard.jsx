@@ -9,6 +9,7 @@ import { getImageUrl } from '../utils/imageUtils';
 const AdminDashboard = () => {
     const [activeTab, setActiveTab] = useState('products');
     const [stats, setStats] = useState({ total_revenue: 0, total_orders: 0, total_products: 0, active_users: 0, growth: 0 });
+    const [revenueSeries, setRevenueSeries] = useState([]);
 
     // Data States
     const [products, setProducts] = useState([]);
@@ -65,6 +66,10 @@ const AdminDashboard = () => {
                 const statsRes = await client.get('/admin/stats');
                 setStats(statsRes.data);
 
+                // Fetch 30-day revenue series (bucketed server-side)
+                const seriesRes = await client.get('/admin/stats/timeseries?granularity=day');
+                setRevenueSeries(seriesRes.data.series);
+
                 // Fetch Initial Products
                 const prodRes = await client.get(`/products?skip=0&limit=${LIMIT}`);
                 setProducts(prodRes.data);
@@ -299,6 +304,29 @@ const AdminDashboard = () => {
                     ))}
                 </div>
 
+                {/* Revenue Chart */}
+                {revenueSeries.length > 0 && (
+                    <div className="bg-tronix-card border border-white/5 p-6 rounded-xl mb-8">
+                        <div className="flex items-center justify-between mb-4">
+                            <span className="text-gray-400 text-sm">Revenue (Last 30 Days)</span>
+                            <TrendingUp className="text-emerald-500" size={20} />
+                        </div>
+                        <div className="flex items-end gap-1 h-32">
+                            {(() => {
+                                const maxRevenue = Math.max(...revenueSeries.map(b => b.revenue), 1);
+                                return revenueSeries.map(b => (
+                                    <div
+                                        key={b.bucket}
+                                        title={`${b.bucket}: ₹${b.revenue.toLocaleString()} (${b.orders} orders)`}
+                                        className="flex-1 bg-violet-500/60 hover:bg-violet-400 rounded-t transition-colors"
+                                        style={{ height: `${Math.max((b.revenue / maxRevenue) * 100, 2)}%` }}
+                                    />
+                                ));
+                            })()}
+                        </div>
+                    </div>
+                )}
+
                 {/* Content Area */}
                 <div className="bg-tronix-card border border-white/5 rounded-xl overflow-hidden min-h-[500px] flex flex-col">
                     <div className="border-b border-white/5 p-4 flex items-center justify-between">
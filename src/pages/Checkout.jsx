@@ -48,11 +48,37 @@ const Checkout = () => {
 
     const [paymentMethod, setPaymentMethod] = useState('payu');
 
-    // Derived Totals
-    const subtotal = cartTotal;
-    const gst = Math.round(cartTotal * 0.18);
-    const shipping = 0; // Free shipping logic
-    const totalAmount = subtotal + gst + shipping;
+    // Authoritative prices, stock and totals in one call; the token locks them for payment
+    const [quote, setQuote] = useState(null);
+
+    const fetchQuote = async () => {
+        if (selectedItems.length === 0) return null;
+        try {
+            const response = await client.post('/cart/quote', {
+                items: selectedItems.map(item => ({ product_id: item.id, quantity: item.quantity }))
+            });
+            setQuote(response.data);
+            return response.data;
+        } catch (error) {
+            console.error('Quote error:', error);
+            toast.error('Some items in your cart are no longer available.');
+            return null;
+        }
+    };
+
+    // Re-quote only when the cart contents change, not on every new array
+    const cartKey = selectedItems.map(item => `${item.id}:${item.quantity}`).join(',');
+    useEffect(() => {
+        fetchQuote();
+    }, [cartKey]);
+
+    // Server quote once loaded; the local cart total until then
+    const subtotal = quote ? quote.subtotal : cartTotal;
+    const gst = quote ? quote.gst : Math.round(cartTotal * 0.18);
+    const shipping = quote ? quote.shipping : 0; // Free shipping logic
+    const totalAmount = quote ? quote.grand_total : subtotal + gst + shipping;
+    const linePrices = quote ? Object.fromEntries(quote.lines.map(line => [line.product_id, line.line_total])) : {};
+    const unavailable = quote ? quote.lines.filter(line => !line.available) : [];
 
     const handleInputChange = (e) => {
         setAddress({ ...address, [e.target.name]: e.target.value });
@@ -72,18 +98,29 @@ const Checkout = () => {
             return;
         }
 
+        if (unavailable.length > 0) {
+            toast.error(`Only ${unavailable[0].stock} left of ${unavailable[0].title}.`);
+            return;
+        }
+
         setLoading(true);
         try {
             const user = JSON.parse(localStorage.getItem('tronix_user'));
             const email = address.email || (user ? user.email : "guest@example.com");
 
+            // Quotes expire; get a fresh one if the page has been open a while
+            const current = quote && quote.quote_token ? quote : await fetchQuote();
+            if (!current || !current.quote_token) {
+                setLoading(false);
+                return;
+            }
+
             // 1. Get PayU params and hash from backend
             const response = await client.post('/payment/initiate', {
-                amount: totalAmount,
+                quote_token: current.quote_token,
                 firstname: address.fullName,
                 email: email,
                 productinfo: `Order for ${selectedItems.length} items`,
-                items: selectedItems.map(item => ({ product_id: item.id, quantity: item.quantity })),
                 phone: address.mobile,
                 address_line: address.addressLine,
                 city: address.city,
@@ -92,6 +129,8 @@ const Checkout = () => {
             });
 
             const data = response.data;
+            // A token places one order; coming back to pay again needs a fresh quote
+            setQuote({ ...current, quote_token: null });
 
             // 2. Create hidden form and submit to PayU
             const form = document.createElement('form');
@@ -125,6 +164,9 @@ const Checkout = () => {
 
         } catch (error) {
             console.error('Checkout error:', error);
+            if (error.response?.status === 400) {
+                fetchQuote(); // Expired, used or out-of-stock quote; the next attempt uses a fresh one
+            }
             toast.error('Payment initiation failed. Try again.');
             setLoading(false);
         }
@@ -261,7 +303,7 @@ const Checkout = () => {
                                             <p className="text-sm text-gray-300 truncate">{item.title}</p>
                                             <p className="text-xs text-gray-500">Qty: {item.quantity}</p>
                                         </div>
-                                        <p className="text-sm font-medium text-white">₹{item.price * item.quantity}</p>
+                                        <p className="text-sm font-medium text-white">₹{linePrices[item.id] ?? item.price * item.quantity}</p>
                                     </div>
                                 ))}
                             </div>
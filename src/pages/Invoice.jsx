@@ -6,14 +6,15 @@ import toast from 'react-hot-toast';
 const Invoice = () => {
     const { id } = useParams();
     const navigate = useNavigate();
-    const [order, setOrder] = useState(null);
+    const [invoice, setInvoice] = useState(null);
     const [loading, setLoading] = useState(true);
 
     useEffect(() => {
-        const fetchOrder = async () => {
+        const fetchInvoice = async () => {
             try {
-                const res = await client.get(`/orders/${id}`);
-                setOrder(res.data);
+                // Figures come from the server, same as the confirmation email
+                const res = await client.get(`/orders/${id}/invoice`);
+                setInvoice(res.data);
 
                 // Print dialog automatically when data is loaded
                 setTimeout(() => window.print(), 500);
@@ -26,29 +27,25 @@ const Invoice = () => {
             }
         };
 
-        fetchOrder();
+        fetchInvoice();
     }, [id, navigate]);
 
     if (loading) {
         return <div className="min-h-screen flex items-center justify-center text-gray-500">Loading invoice...</div>;
     }
 
-    if (!order) {
+    if (!invoice) {
         return <div className="min-h-screen flex items-center justify-center text-red-500 font-bold">Invoice not found</div>;
     }
 
-    const orderDate = new Date(order.created_at).toLocaleDateString('en-IN', {
-        day: 'numeric', month: 'long', year: 'numeric'
-    });
-
     return (
         <div className="min-h-screen bg-white text-black p-8 md:p-16 max-w-4xl mx-auto font-sans">
             {/* Header */}
             <div className="flex justify-between items-start border-b-2 border-gray-200 pb-8 mb-8">
                 <div>
                     <h1 className="text-4xl font-extrabold text-violet-700 tracking-tight">TRONIX<span className="text-gray-900">365</span></h1>
-                    <p className="text-gray-500 text-sm mt-1">Order #order_tronix_{String(order.id).padStart(4, '0')}</p>
-                    <p className="text-gray-500 text-sm">Date: {orderDate}</p>
+                    <p className="text-gray-500 text-sm mt-1">Order {invoice.order_number}</p>
+                    <p className="text-gray-500 text-sm">Date: {invoice.date_str}</p>
                 </div>
                 <div className="text-right">
                     <h2 className="text-2xl font-bold text-gray-800 uppercase tracking-widest">INVOICE</h2>
@@ -62,20 +59,20 @@ const Invoice = () => {
             <div className="grid grid-cols-2 gap-8 mb-12">
                 <div>
                     <h3 className="text-gray-500 text-xs font-bold uppercase tracking-wider mb-2">Billed To / Shipped To:</h3>
-                    <p className="font-bold text-gray-800">{order.full_name || order.customer_email}</p>
-                    {order.address_line && (
+                    <p className="font-bold text-gray-800">{invoice.full_name || invoice.customer_email}</p>
+                    {invoice.address_line && (
                         <p className="text-gray-600 mt-1">
-                            {order.address_line}<br />
-                            {order.city}, {order.state} {order.pincode}<br />
-                            Ph: {order.phone}
+                            {invoice.address_line}<br />
+                            {invoice.city}, {invoice.state} {invoice.pincode}<br />
+                            Ph: {invoice.phone}
                         </p>
                     )}
                 </div>
                 <div className="text-right">
                     <h3 className="text-gray-500 text-xs font-bold uppercase tracking-wider mb-2">Payment Details</h3>
-                    <p className="font-bold text-gray-800">Status: {order.status === 'confirmed' ? 'Paid' : 'Pending'}</p>
+                    <p className="font-bold text-gray-800">Status: {invoice.status === 'confirmed' ? 'Paid' : 'Pending'}</p>
                     <p className="text-gray-600 mt-1">Method: Online (PayU)</p>
-                    <p className="text-gray-600">Txn ID: {order.txnid || 'N/A'}</p>
+                    <p className="text-gray-600">Txn ID: {invoice.txnid || 'N/A'}</p>
                 </div>
             </div>
 
@@ -90,20 +87,14 @@ const Invoice = () => {
                     </tr>
                 </thead>
                 <tbody className="text-gray-700">
-                    {order.items.map((item, index) => {
-                        const unitPrice = item.price_at_purchase || (item.product ? (item.product.sale_price || item.product.price) : 0);
-                        const rowTotal = unitPrice * item.quantity;
-                        return (
-                            <tr key={index} className="border-b border-gray-200">
-                                <td className="py-4 font-medium">
-                                    {item.product ? item.product.title : `Product ID: ${item.product_id}`}
-                                </td>
-                                <td className="py-4 text-center">{item.quantity}</td>
-                                <td className="py-4 text-right">₹{unitPrice.toFixed(2)}</td>
-                                <td className="py-4 text-right font-bold text-gray-900">₹{rowTotal.toFixed(2)}</td>
-                            </tr>
-                        );
-                    })}
+                    {invoice.lines.map((line, index) => (
+                        <tr key={index} className="border-b border-gray-200">
+                            <td className="py-4 font-medium">{line.title}</td>
+                            <td className="py-4 text-center">{line.quantity}</td>
+                            <td className="py-4 text-right">₹{line.unit_price.toFixed(2)}</td>
+                            <td className="py-4 text-right font-bold text-gray-900">₹{line.line_total.toFixed(2)}</td>
+                        </tr>
+                    ))}
                 </tbody>
             </table>
 
@@ -112,7 +103,11 @@ const Invoice = () => {
                 <div className="w-1/2 md:w-1/3">
                     <div className="flex justify-between py-2 border-b border-gray-200 text-gray-600">
                         <span>Subtotal:</span>
-                        <span>₹{order.total_amount.toFixed(2)}</span>
+                        <span>₹{invoice.subtotal.toFixed(2)}</span>
+                    </div>
+                    <div className="flex justify-between py-2 border-b border-gray-200 text-gray-600">
+                        <span>GST (18%):</span>
+                        <span>₹{invoice.gst.toFixed(2)}</span>
                     </div>
                     <div className="flex justify-between py-2 border-b border-gray-200 text-gray-600">
                         <span>Shipping:</span>
@@ -120,7 +115,7 @@ const Invoice = () => {
                     </div>
                     <div className="flex justify-between py-4 text-xl font-bold border-b-2 border-gray-800 text-gray-900">
                         <span>Total:</span>
-                        <span>₹{order.total_amount.toFixed(2)}</span>
+                        <span>₹{invoice.grand_total.toFixed(2)}</span>
                     </div>
                 </div>
             </div>
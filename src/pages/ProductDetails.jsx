@@ -246,7 +246,7 @@ const ProductDetails = () => {
                                 )}
                             </div>
                         ) : (
-                            <ReviewSection productId={product.id} />
+                            <ReviewSection productId={product.id} reviewCount={product.review_count} averageRating={product.average_rating} />
                         )}
                     </div>
                 </div>
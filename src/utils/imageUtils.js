@@ -20,3 +20,18 @@ export const getImageUrl = (imagePath) => {
     }
     return `${backendUrl}/${imagePath}`;
 };
+
+/**
+ * Converts a backend srcset ("/uploads/variants/a-thumb.webp 160w, ...") into
+ * absolute URLs. Returns undefined when the product has no generated variants.
+ */
+export const getImageSrcSet = (srcset) => {
+    if (!srcset) return undefined;
+    return srcset
+        .split(',')
+        .map(entry => {
+            const [path, descriptor] = entry.trim().split(/\s+/);
+            return `${getImageUrl(path)} ${descriptor}`;
+        })
+        .join(', ');
+};